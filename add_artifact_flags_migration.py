@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Migration script to add artifact presence flags to Project model
+"""
+
+from app import app, db
+import logging
+import os
+
+def run_migration():
+    """Add has_processed_data/has_video and fill them from the filesystem once"""
+    with app.app_context():
+        try:
+            from sqlalchemy import text
+
+            # Check if has_video column exists
+            result = db.session.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='project' AND column_name='has_video'
+            """)).fetchone()
+
+            if not result:
+                print("Adding artifact flags to Project table...")
+
+                db.session.execute(text("""
+                    ALTER TABLE project
+                    ADD COLUMN has_processed_data BOOLEAN DEFAULT FALSE,
+                    ADD COLUMN has_video BOOLEAN DEFAULT FALSE
+                """))
+                db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS ix_project_has_processed_data ON project (has_processed_data)
+                """))
+                db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS ix_project_has_video ON project (has_video)
+                """))
+                db.session.commit()
+
+                # Backfill existing projects (raw SQL: columns added by later
+                # migrations may not exist yet)
+                rows = db.session.execute(text("""
+                    SELECT id, folder_number, csv_file, video_file FROM project
+                """)).fetchall()
+                for project_id, folder_number, csv_file, video_file in rows:
+                    has_processed_data = bool(csv_file) and os.path.exists(
+                        os.path.join('processed_data', f'project_{folder_number}_{csv_file}'))
+                    has_video = bool(video_file) and os.path.exists(os.path.join('videos', video_file))
+                    db.session.execute(text("""
+                        UPDATE project SET has_processed_data = :has_processed_data, has_video = :has_video
+                        WHERE id = :id
+                    """), {'has_processed_data': has_processed_data, 'has_video': has_video, 'id': project_id})
+                db.session.commit()
+                print("Successfully added artifact flags to Project")
+            else:
+                print("Project table already has the artifact flags")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            logging.error(f"Migration error: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the content store (deduplicated uploads)
+"""
+
+from app import app, db
+from models import StoredFile
+import logging
+
+def run_migration():
+    """Add content_hash to Project and create the stored_file table"""
+    with app.app_context():
+        try:
+            from sqlalchemy import text
+
+            # stored_file is a new table
+            StoredFile.__table__.create(db.engine, checkfirst=True)
+
+            # Check if content_hash column exists
+            result = db.session.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='project' AND column_name='content_hash'
+            """)).fetchone()
+
+            if not result:
+                print("Adding content_hash to Project table...")
+
+                db.session.execute(text("""
+                    ALTER TABLE project
+                    ADD COLUMN content_hash VARCHAR(64)
+                """))
+                db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS ix_project_content_hash ON project (content_hash)
+                """))
+
+                db.session.commit()
+                print("Successfully added content store fields")
+            else:
+                print("Project table already has the content_hash field")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            logging.error(f"Migration error: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the folder number counter
+"""
+
+from app import app, db
+from models import Project, FolderNumberCounter
+import logging
+
+def run_migration():
+    """Create the folder_number_counter table and seed it with the highest number in use"""
+    with app.app_context():
+        try:
+            from sqlalchemy import text
+
+            # folder_number_counter is a new table
+            FolderNumberCounter.__table__.create(db.engine, checkfirst=True)
+
+            result = db.session.execute(text("""
+                SELECT last_value FROM folder_number_counter WHERE id = 1
+            """)).fetchone()
+
+            if not result:
+                # Numbers left behind in frames/ by deleted projects count as used
+                highest = Project.highest_folder_number_in_use()
+                print(f"Seeding folder number counter with {highest}...")
+
+                db.session.execute(text("""
+                    INSERT INTO folder_number_counter (id, last_value) VALUES (1, :highest)
+                """), {'highest': highest})
+
+                db.session.commit()
+                print("Successfully added folder number counter")
+            else:
+                print(f"Folder number counter already exists (last value {result[0]})")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            logging.error(f"Migration error: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Migration script to add a unique index on Project.folder_number
+"""
+
+from app import app, db
+import logging
+
+def run_migration():
+    """Add unique index used by the folder number allocator"""
+    with app.app_context():
+        try:
+            from sqlalchemy import text
+
+            # Folder numbers used to be reused; make sure there are no duplicates left
+            duplicates = db.session.execute(text("""
+                SELECT folder_number, COUNT(*)
+                FROM project
+                WHERE folder_number IS NOT NULL
+                GROUP BY folder_number
+                HAVING COUNT(*) > 1
+            """)).fetchall()
+
+            if duplicates:
+                print(f"Duplicate folder numbers found: {[row[0] for row in duplicates]}")
+                print("Resolve them before running this migration")
+                return
+
+            print("Adding unique index on project.folder_number...")
+            db.session.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS ix_project_folder_number ON project (folder_number)
+            """))
+
+            db.session.commit()
+            print("Successfully added folder number index")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            logging.error(f"Migration error: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
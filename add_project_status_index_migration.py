@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Migration script to add a (user_id, status) index on Project
+"""
+
+from app import app, db
+import logging
+
+def run_migration():
+    """Add index used by the bulk project status endpoint"""
+    with app.app_context():
+        try:
+            from sqlalchemy import text
+
+            print("Adding index on project (user_id, status)...")
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_project_user_status ON project (user_id, status)
+            """))
+
+            db.session.commit()
+            print("Successfully added project status index")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            logging.error(f"Migration error: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Migration script to add pipeline timing stats to Project model
+"""
+
+from app import app, db
+import logging
+
+def run_migration():
+    """Add timing_stats field to Project table"""
+    with app.app_context():
+        try:
+            from sqlalchemy import text
+
+            # Check if timing_stats column exists
+            result = db.session.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='project' AND column_name='timing_stats'
+            """)).fetchone()
+
+            if not result:
+                print("Adding timing_stats to Project table...")
+
+                db.session.execute(text("""
+                    ALTER TABLE project
+                    ADD COLUMN timing_stats TEXT
+                """))
+
+                db.session.commit()
+                print("Successfully added timing_stats to Project")
+            else:
+                print("Project table already has the timing_stats field")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            logging.error(f"Migration error: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
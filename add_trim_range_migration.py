@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Migration script to add trim range fields to Project
+"""
+
+from app import app, db
+import logging
+
+def run_migration():
+    """Add trim_start and trim_end fields to Project table"""
+    with app.app_context():
+        try:
+            from sqlalchemy import text
+
+            for column in ['trim_start', 'trim_end']:
+                # Check if the column exists
+                result = db.session.execute(text("""
+                    SELECT column_name
+                    FROM information_schema.columns
+                    WHERE table_name='project' AND column_name=:column
+                """), {'column': column}).fetchone()
+
+                if not result:
+                    print(f"Adding {column} to Project table...")
+                    db.session.execute(text(f"""
+                        ALTER TABLE project
+                        ADD COLUMN {column} DOUBLE PRECISION
+                    """))
+                else:
+                    print(f"Project table already has the {column} field")
+
+            db.session.commit()
+            print("Successfully added trim range fields to Project")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+            logging.error(f"Migration error: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
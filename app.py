@@ -1,39 +1,58 @@
 import os
+import io
 import logging
 import random
 import re
 import shutil
 import threading
 import time
-import json
 import tempfile
+import json
+import hashlib
 from datetime import datetime, timedelta
 from collections import defaultdict
 from functools import wraps
 
 import psutil
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from flask import (Flask, render_template, request, jsonify, send_file, 
-                  url_for, send_from_directory, flash, redirect, abort)
+                  url_for, send_from_directory, flash, redirect, abort, make_response)
 from flask_migrate import Migrate
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 from flask_babel import Babel, gettext as _, get_locale
 from extensions import db
-from utils.csv_processor import process_csv_file, detect_csv_type
+from utils.csv_processor import process_csv_file, detect_csv_type, apply_trim
 from utils.image_generator import generate_frames, create_preview_frame, clear_icon_cache
 from utils.video_creator import create_video
-from utils.background_processor import process_project, stop_project_processing
+from utils.background_processor import process_project, stop_project_processing, running_processes
 from utils.env_setup import setup_env_variables
 from utils.email_sender import send_email, test_smtp_connection
+from utils.chart_payload import (build_columnar_payload, payload_to_json, encode_binary,
+                                 encode_msgpack, compress_body, BINARY_MIME_TYPE, MSGPACK_MIME_TYPE)
+from utils.downsampling import clamp_points, time_range_slice, downsample_indices
+from utils.analytics_stream import analyze_csv_stream, InvalidCSVFormat
+from utils.batch_analytics import save_batch_files, prune_summary_cache, BatchAnalyticsError
+from utils.telemetry_pyramid import build_pyramid, query_pyramid, remove_pyramid, get_pyramid_dir
+from utils.system_metrics import MetricsCollector
+from utils.render_cache import render_cache_stats
+from utils.hardware_detection import probe_encoders, VIDEO_CODECS
+from utils.project_status import (status_versions, status_snapshots, project_status_payload,
+                                  DEFAULT_RETRY_AFTER_MS, STATUS_RECHECK_SECONDS, STATUS_LONG_POLL_MAX_SECONDS)
+from utils.content_store import (hash_stream, get_raw_path, save_raw, commit_raw, link_file,
+                                 link_processed, publish_processed, acquire_content,
+                                 release_content, reconcile_content_store,
+                                 remove_unreferenced_content, get_store_dir)
 from forms import (LoginForm, RegistrationForm, ProfileForm, 
                   ChangePasswordForm, ForgotPasswordForm, ResetPasswordForm, DeleteAccountForm, 
                   NewsForm, EmailCampaignForm, ResendConfirmationForm, EmailTestForm, AchievementForm, 
                   generate_math_captcha)
-from models import User, Project, EmailCampaign, News, Preset, RegistrationAttempt, Achievement
+from models import User, Project, EmailCampaign, News, Preset, RegistrationAttempt, Achievement, StoredFile
 import markdown
 from sqlalchemy import desc
+from sqlalchemy.orm import joinedload
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -119,15 +138,173 @@ def validate_project_name(name):
     # with length between 1 and 7 characters
     return bool(re.match(r'^[\w\d-]{1,7}$', name))
 
-def cleanup_project_files(project):
-    """Delete all files associated with a project"""
+def make_chart_response(payload, meta=None):
+    """
+    Build a chart data response in the format requested by the client
+
+    The format is taken from the 'format' request value ('json', 'binary' or
+    'msgpack') or from the Accept header. JSON responses carry the columnar
+    payload under 'csv_data' next to the meta fields; binary and MessagePack
+    responses embed the meta fields in the payload itself. The body is
+    compressed with brotli or gzip when the client accepts it.
+    """
+    meta = meta or {}
+    requested = (request.values.get('format') or '').lower()
+    accept = request.headers.get('Accept', '')
+
+    body = None
+    mimetype = 'application/json'
+    if requested == 'binary' or (not requested and BINARY_MIME_TYPE in accept):
+        body = encode_binary(payload, meta)
+        mimetype = BINARY_MIME_TYPE
+    elif requested == 'msgpack' or (not requested and MSGPACK_MIME_TYPE in accept):
+        body = encode_msgpack(payload, meta)
+        if body is not None:
+            mimetype = MSGPACK_MIME_TYPE
+
+    if body is None:
+        data = dict(meta)
+        data['csv_data'] = payload_to_json(payload)
+        body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    body, content_encoding = compress_body(body, request.headers.get('Accept-Encoding'))
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    return response
+
+def _optional_float(value):
+    """Parse an optional numeric request value, returning None if missing or invalid"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def get_downsample_params(params):
+    """Read chart downsampling parameters (points, mode, start, end) from request values"""
+    return {
+        'points': clamp_points(params.get('points')),
+        'mode': params.get('mode') or 'minmax',
+        'start': _optional_float(params.get('start')),
+        'end': _optional_float(params.get('end'))
+    }
+
+def clamp_to_trim(start, end, trim_range):
+    """Narrow an optional [start, end] window to a (start, end) trim range"""
+    trim_start, trim_end = trim_range
+    if trim_start is not None:
+        start = trim_start if start is None else max(start, trim_start)
+    if trim_end is not None:
+        end = trim_end if end is None else min(end, trim_end)
+    return start, end
+
+def build_speed_chart_data(df, params):
+    """
+    Build downsampled speed/PWM chart data for the trim UI
+
+    Only rows inside the optional [start, end] window are considered, so the
+    client can re-query a zoomed sub-range at full detail.
+    """
+    if not df['timestamp'].is_monotonic_increasing:
+        df = df.sort_values('timestamp')
+
+    options = get_downsample_params(params)
+    timestamps = df['timestamp'].to_numpy()
+    lo, hi = time_range_slice(timestamps, options['start'], options['end'])
+    timestamps = timestamps[lo:hi]
+    speed_values = df['speed'].to_numpy()[lo:hi]
+    pwm_values = df['pwm'].to_numpy()[lo:hi]
+
+    indices = downsample_indices(timestamps, {'speed': speed_values, 'pwm': pwm_values},
+                                 options['points'], options['mode'])
+
+    return {
+        'timestamps': timestamps[indices].tolist(),
+        'speed_values': speed_values[indices].tolist(),
+        'pwm_values': pwm_values[indices].tolist(),
+        'source_rows': int(hi - lo),
+        'points': int(len(indices)),
+        'downsample_mode': options['mode']
+    }
+
+def downsample_processed_data(processed_data, params):
+    """Downsample every column of processed Telemetry for charting (min/max keeps peaks of all metrics)"""
+    options = get_downsample_params(params)
+    window = processed_data.sorted().between(options['start'], options['end'])
+    metrics = {name: values for name, values in window.items() if name != 'timestamp'}
+    indices = downsample_indices(window.timestamps, metrics, options['points'], options['mode'])
+    return window.take(indices)
+
+def evaluate_achievements(analytics_vars, active_achievements):
+    """Evaluate achievement formulas against ride analytics variables"""
+    achievements = []
+    for achievement in active_achievements:
+        try:
+            # Evaluate achievement formula with analytics variables
+            if eval(achievement.formula, {"__builtins__": {}}, analytics_vars):
+                achievements.append({
+                    'id': achievement.achievement_id,
+                    'title': achievement.title,
+                    'description': achievement.description,
+                    'icon': achievement.icon
+                })
+        except Exception as e:
+            logging.warning(f"Error evaluating achievement formula for {achievement.achievement_id}: {str(e)}")
+            continue
+    return achievements
+
+def remove_upload(csv_file, exclude_ids=()):
+    """
+    Delete uploads/<csv_file> unless another project still uses it
+
+    Identical re-uploads under the same name share the path. exclude_ids
+    are projects being deleted along with this one.
+    """
+    if not csv_file:
+        return
+    shared = Project.query.filter(Project.csv_file == csv_file,
+                                  Project.id.notin_(list(exclude_ids))).count()
+    csv_path = os.path.join(app.config['UPLOAD_FOLDER'], csv_file)
+    if shared:
+        logging.info(f"Keeping CSV file used by {shared} other project(s): {csv_path}")
+    elif os.path.exists(csv_path):
+        os.remove(csv_path)
+        logging.info(f"Deleted CSV file: {csv_path}")
+
+def remove_video(project):
+    """Delete a project's video and clear its has_video flag"""
+    if project.video_file:
+        video_path = os.path.join('videos', project.video_file)
+        if os.path.exists(video_path):
+            os.remove(video_path)
+            logging.info(f"Deleted video file: {video_path}")
+    project.has_video = False
+
+def remove_processed_data(project):
+    """Delete a project's processed CSV with its zoom pyramid and clear has_processed_data"""
+    if project.csv_file:
+        processed_csv = os.path.join('processed_data', f'project_{project.folder_number}_{project.csv_file}')
+        if os.path.exists(processed_csv):
+            os.remove(processed_csv)
+            logging.info(f"Deleted processed CSV file: {processed_csv}")
+        remove_pyramid(processed_csv)
+    project.has_processed_data = False
+
+def cleanup_project_files(project, released):
+    """
+    Delete all files associated with a project
+
+    The project's content store reference is dropped in the session; hashes
+    of entries nothing uses any more are appended to released, for
+    remove_unreferenced_content() once the deletion is committed.
+    """
     try:
         # Delete CSV file
-        if project.csv_file:
-            csv_path = os.path.join('uploads', project.csv_file)
-            if os.path.exists(csv_path):
-                os.remove(csv_path)
-                logging.info(f"Deleted CSV file: {csv_path}")
+        remove_upload(project.csv_file, [project.id])
 
         # Delete preview file
         preview_path = os.path.join('previews', f'{project.id}_preview.png')
@@ -136,11 +313,7 @@ def cleanup_project_files(project):
             logging.info(f"Deleted preview file: {preview_path}")
 
         # Delete video file
-        if project.video_file:
-            video_path = os.path.join('videos', project.video_file)
-            if os.path.exists(video_path):
-                os.remove(video_path)
-                logging.info(f"Deleted video file: {video_path}")
+        remove_video(project)
 
         # Delete PNG archive file
         if project.png_archive_file:
@@ -156,11 +329,12 @@ def cleanup_project_files(project):
             logging.info(f"Deleted frames directory: {frames_dir}")
 
         # Delete processed CSV file
-        if project.csv_file:
-            processed_csv = os.path.join('processed_data', f'project_{project.folder_number}_{project.csv_file}')
-            if os.path.exists(processed_csv):
-                os.remove(processed_csv)
-                logging.info(f"Deleted processed CSV file: {processed_csv}")
+        remove_processed_data(project)
+
+        # Drop the project's reference to the shared upload
+        digest = release_content(project.content_hash)
+        if digest:
+            released.append(digest)
 
         return True
     except Exception as e:
@@ -177,11 +351,12 @@ def cleanup_expired_projects():
                     Project.expiry_date <= datetime.utcnow()
                 ).all()
 
+                released = []
                 for project in expired_projects:
                     logging.info(f"Cleaning up expired project {project.id}")
 
                     # Delete associated files
-                    if cleanup_project_files(project):
+                    if cleanup_project_files(project, released):
                         # Delete project from database
                         db.session.delete(project)
                         logging.info(f"Deleted expired project {project.id} from database")
@@ -189,6 +364,10 @@ def cleanup_expired_projects():
                         logging.error(f"Failed to clean up files for project {project.id}")
 
                 db.session.commit()
+                remove_unreferenced_content(released)
+
+            # Keep the batch analytics cache within its age and size limits
+            prune_summary_cache()
 
         except Exception as e:
             logging.error(f"Error in cleanup task: {str(e)}")
@@ -249,61 +428,12 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Add this new route before the app.context_processor
-def get_system_stats():
-    """Get system resource usage statistics"""
-    cpu_percent = psutil.cpu_percent()
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
-
-    # GPU stats - return 0 if not available
-    gpu_percent = 0
-    try:
-        import GPUtil
-        gpus = GPUtil.getGPUs()
-        if gpus:
-            gpu_percent = gpus[0].load * 100
-    except:
-        pass
-
-    return {
-        'cpu_percent': cpu_percent,
-        'memory_percent': memory.percent,
-        'disk_percent': disk.percent,
-        'gpu_percent': gpu_percent
-    }
-
-
-# Global variable for storing statistics
-system_stats_history = {
-    'cpu': defaultdict(list),
-    'memory': defaultdict(list),
-    'disk': defaultdict(list),
-    'gpu': defaultdict(list)
-}
-
-stats_lock = threading.Lock()
-
-def collect_system_stats():
-    """Background thread to collect system statistics"""
-    while True:
-        stats = get_system_stats()
-        current_time = datetime.utcnow()
-
-        with stats_lock:
-            # Store stats with timestamp
-            for resource in ['cpu', 'memory', 'disk', 'gpu']:
-                system_stats_history[resource][current_time.strftime('%Y-%m-%d %H:%M')] = stats[f'{resource}_percent']
+# System and job metrics, sampled by a background thread into ring buffers
+metrics_collector = MetricsCollector(queue_depth=lambda: len(running_processes))
 
-            # Clean up old data (keep last 24 hours)
-            cleanup_time = current_time - timedelta(hours=24)
-            for resource in system_stats_history:
-                system_stats_history[resource] = {
-                    k: v for k, v in system_stats_history[resource].items()
-                    if datetime.strptime(k, '%Y-%m-%d %H:%M') > cleanup_time
-                }
-
-        time.sleep(60)  # Collect stats every minute
+def get_system_stats():
+    """Get the latest sampled system resource usage and job statistics"""
+    return metrics_collector.latest()
 
 @app.route('/admin')
 @login_required
@@ -314,7 +444,8 @@ def admin_dashboard():
 
     # Get paginated projects
     project_page = request.args.get('project_page', 1, type=int)
-    projects = Project.query.order_by(Project.created_at.desc())\
+    projects = Project.query.options(joinedload(Project.user))\
+        .order_by(Project.created_at.desc())\
         .paginate(page=project_page, per_page=20, error_out=False)
 
     # Get paginated recent users (registered in the last 30 days)
@@ -328,6 +459,7 @@ def admin_dashboard():
                          projects=projects,
                          users=users,
                          today=today,
+                         render_caches=render_cache_stats(),
                          **stats)
 
 @app.route('/admin/stats')
@@ -337,18 +469,22 @@ def admin_stats():
     """API endpoint to get updated system stats"""
     current_stats = get_system_stats()
 
-    # Add historical data
-    with stats_lock:
-        history = {
-            resource: list(system_stats_history[resource].items())
-            for resource in system_stats_history
-        }
+    # Add historical data (optionally only the last 'seconds' seconds)
+    seconds = request.args.get('seconds', type=float)
+    history = metrics_collector.history(since=time.time() - seconds if seconds else None)
 
     return jsonify({
         'current': current_stats,
-        'history': history
+        'history': history,
+        # Render caches of the worker answering this request
+        'render_caches': render_cache_stats()
     })
 
+# Short-lived cache for /admin/lists: {(project_page, user_page): (monotonic time, payload)}
+ADMIN_LISTS_CACHE_TTL = 5  # seconds
+admin_lists_cache = {}
+admin_lists_lock = threading.Lock()
+
 @app.route('/admin/lists')
 @login_required
 @admin_required
@@ -358,8 +494,16 @@ def admin_lists():
     user_page = request.args.get('user_page', 1, type=int)
     today = datetime.utcnow().date()
 
-    # Get paginated projects
-    projects = Project.query.order_by(Project.created_at.desc())\
+    # The dashboard polls this endpoint; serve repeated requests from a short-lived cache
+    cache_key = (project_page, user_page)
+    with admin_lists_lock:
+        cached = admin_lists_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < ADMIN_LISTS_CACHE_TTL:
+            return jsonify(cached[1])
+
+    # Get paginated projects (owners loaded in the same query)
+    projects = Project.query.options(joinedload(Project.user))\
+        .order_by(Project.created_at.desc())\
         .paginate(page=project_page, per_page=20, error_out=False)
 
     # Get paginated users (all users, not just recent ones)
@@ -390,13 +534,14 @@ def admin_lists():
         'duration': p.get_duration_str(),  # Add duration
         'time_until_expiry': p.time_until_expiry(),  # Add expiry time
         'processing_time': p.get_processing_time_str(),  # Add processing time
+        'timing_summary': p.get_timing_summary_str(),  # Per-stage pipeline timings
         'fps': f"{p.fps:.2f}" if p.fps else '-',  # Add FPS
         'resolution': p.resolution or '-',  # Add resolution
-        'has_csv': bool(p.csv_file and os.path.exists(os.path.join('processed_data', f'project_{p.folder_number}_{p.csv_file}'))),
-        'has_video': bool(p.video_file and os.path.exists(os.path.join('videos', p.video_file)))
+        'has_csv': bool(p.has_processed_data),
+        'has_video': bool(p.has_video)
     } for p in projects.items]
 
-    return jsonify({
+    payload = {
         'projects': {
             'items': projects_data,
             'has_next': projects.has_next,
@@ -413,6 +558,24 @@ def admin_lists():
             'pages': users.pages,
             'total': users.total
         }
+    }
+    with admin_lists_lock:
+        # Drop expired pages so the cache stays small
+        now = time.monotonic()
+        for key in [k for k, v in admin_lists_cache.items() if now - v[0] >= ADMIN_LISTS_CACHE_TTL]:
+            del admin_lists_cache[key]
+        admin_lists_cache[cache_key] = (now, payload)
+    return jsonify(payload)
+
+@app.route('/admin/project/<int:project_id>/timing')
+@login_required
+@admin_required
+def admin_project_timing(project_id):
+    """API endpoint to get the pipeline stage timings of a project"""
+    project = Project.query.get_or_404(project_id)
+    return jsonify({
+        'project_id': project.id,
+        'timing': project.get_timing_stats()
     })
 
 # Add context processor for datetime
@@ -421,7 +584,7 @@ def inject_now():
     return {'now': datetime.utcnow()}
 
 # Create required directories with proper error handling
-for directory in ['uploads', 'frames', 'videos', 'processed_data', 'previews', 'archives']:
+for directory in ['uploads', 'frames', 'videos', 'processed_data', 'previews', 'archives', 'content_store']:
     try:
         os.makedirs(directory, exist_ok=True)
         logging.info(f"Ensuring directory exists: {directory}")
@@ -721,22 +884,18 @@ def delete_account():
         if current_user.check_password(form.password.data):
             # Delete all user's projects first
             projects = Project.query.filter_by(user_id=current_user.id).all()
+            project_ids = [project.id for project in projects]
+            released = []
             for project in projects:
                 # Delete project files
-                if project.csv_file:
-                    csv_path = os.path.join(app.config['UPLOAD_FOLDER'], project.csv_file)
-                    if os.path.exists(csv_path):
-                        os.remove(csv_path)
+                remove_upload(project.csv_file, project_ids)
 
                 # Delete preview file
                 preview_path = os.path.join('previews', f'{project.id}_preview.png')
                 if os.path.exists(preview_path):
                     os.remove(preview_path)
 
-                if project.video_file:
-                    video_path = os.path.join('videos', project.video_file)
-                    if os.path.exists(video_path):
-                        os.remove(video_path)
+                remove_video(project)
 
                 # Delete frames directory
                 frames_dir = f'frames/project_{project.folder_number}'
@@ -744,10 +903,11 @@ def delete_account():
                     shutil.rmtree(frames_dir)
 
                 # Delete processed CSV file
-                if project.csv_file:
-                    processed_csv = os.path.join('processed_data', f'project_{project.folder_number}_{project.csv_file}')
-                    if os.path.exists(processed_csv):
-                        os.remove(processed_csv)
+                remove_processed_data(project)
+
+                digest = release_content(project.content_hash)
+                if digest:
+                    released.append(digest)
 
             # Delete all projects from database
             Project.query.filter_by(user_id=current_user.id).delete()
@@ -755,6 +915,7 @@ def delete_account():
             # Деактивировать пользователя вместо физического удаления
             current_user.is_active = False
             db.session.commit()
+            remove_unreferenced_content(released)
             
             # Выход из системы
             logout_user()
@@ -800,44 +961,59 @@ def upload_file():
         project_name = generate_project_name()
 
     try:
-        filename = secure_filename(file.filename)
+        # Identical logs are stored once and shared between projects
+        content_hash = hash_stream(file.stream)
+        # Prefixed with the content hash: different logs with the same name get their own path
+        filename = f'{content_hash[:12]}_{secure_filename(file.filename)}'
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        stored_file = StoredFile.query.filter_by(sha256=content_hash).first()
+        if stored_file and os.path.exists(get_raw_path(content_hash)):
+            csv_type = stored_file.csv_type
+            logging.info(f"Upload matches stored content {content_hash[:12]}, skipping validation")
+        else:
+            csv_type = None
+            raw_tmp_path = save_raw(file, content_hash)
 
-        # Try to detect CSV type and validate format
-        try:
-            import pandas as pd
-            # Try reading with different encodings
+        # Try to detect CSV type and validate format (new content only)
+        if csv_type is None:
             try:
-                df = pd.read_csv(file_path, encoding='utf-8')
-            except UnicodeDecodeError:
+                import pandas as pd
+                # Try reading with different encodings
                 try:
-                    df = pd.read_csv(file_path, encoding='latin1')
-                except:
-                    os.remove(file_path)
-                    return jsonify({'error': 'Invalid file encoding. Please ensure your CSV file is properly encoded.'}), 400
+                    df = pd.read_csv(raw_tmp_path, encoding='utf-8')
+                except UnicodeDecodeError:
+                    try:
+                        df = pd.read_csv(raw_tmp_path, encoding='latin1')
+                    except:
+                        os.remove(raw_tmp_path)
+                        return jsonify({'error': 'Invalid file encoding. Please ensure your CSV file is properly encoded.'}), 400
+
+                # Check for DarknessBot format
+                darkness_bot_columns = {'Date', 'Speed', 'GPS Speed', 'Voltage', 'Temperature', 
+                                          'Current', 'Battery level', 'Total mileage', 'PWM', 'Power'}
+                # Check for WheelLog format
+                wheellog_columns = {'date', 'speed', 'gps_speed', 'voltage', 'system_temp',
+                                      'current', 'battery_level', 'totaldistance', 'pwm', 'power'}
+
+                df_columns = set(df.columns)
+                is_darkness_bot = len(darkness_bot_columns.intersection(df_columns)) >= len(darkness_bot_columns) * 0.8
+                is_wheellog = len(wheellog_columns.intersection(df_columns)) >= len(wheellog_columns) * 0.8
 
-            # Check for DarknessBot format
-            darkness_bot_columns = {'Date', 'Speed', 'GPS Speed', 'Voltage', 'Temperature', 
-                                      'Current', 'Battery level', 'Total mileage', 'PWM', 'Power'}
-            # Check for WheelLog format
-            wheellog_columns = {'date', 'speed', 'gps_speed', 'voltage', 'system_temp',
-                                  'current', 'battery_level', 'totaldistance', 'pwm', 'power'}
+                if not (is_darkness_bot or is_wheellog):
+                    os.remove(raw_tmp_path)
+                    return jsonify({'error': 'Invalid CSV format. Please upload a CSV file from DarknessBot or WheelLog.'}), 400
 
-            df_columns = set(df.columns)
-            is_darkness_bot = len(darkness_bot_columns.intersection(df_columns)) >= len(darkness_bot_columns) * 0.8
-            is_wheellog = len(wheellog_columns.intersection(df_columns)) >= len(wheellog_columns) * 0.8
+                csv_type = 'darnkessbot' if is_darkness_bot else 'wheellog'
 
-            if not (is_darkness_bot or is_wheellog):
-                os.remove(file_path)
-                return jsonify({'error': 'Invalid CSV format. Please upload a CSV file from DarknessBot or WheelLog.'}), 400
+            except Exception as e:
+                logging.error(f"Error validating CSV format: {str(e)}")
+                os.remove(raw_tmp_path)
+                return jsonify({'error': 'Invalid CSV file. Please upload a CSV file from DarknessBot or WheelLog.'}), 400
 
-            csv_type = 'darnkessbot' if is_darkness_bot else 'wheellog'
+            commit_raw(raw_tmp_path, content_hash)
 
-        except Exception as e:
-            logging.error(f"Error validating CSV format: {str(e)}")
-            os.remove(file_path)
-            return jsonify({'error': 'Invalid CSV file. Please upload a CSV file from DarknessBot or WheelLog.'}), 400
+        link_file(get_raw_path(content_hash), file_path)
+        acquire_content(content_hash, csv_type, os.path.getsize(file_path))
 
         # Create project with detected type and user_id
         project = Project(
@@ -847,11 +1023,14 @@ def upload_file():
             created_at=datetime.now(),
             expiry_date=datetime.now() + timedelta(hours=48),
             status='pending',
-            folder_number=Project.get_next_folder_number(),
-            user_id=current_user.id
+            user_id=current_user.id,
+            content_hash=content_hash
         )
-        db.session.add(project)
-        db.session.commit()
+        project.save_with_folder_number()
+
+        # Same log uploaded before: reuse its processed data instead of parsing it again
+        processed_csv_path = os.path.join('processed_data', f'project_{project.folder_number}_{project.csv_file}')
+        reused = link_processed(content_hash, processed_csv_path)
 
         # Create initial preview with default settings
         default_settings = {
@@ -889,6 +1068,10 @@ def upload_file():
             'fullhd',
             default_settings
         )
+        if not reused:
+            publish_processed(content_hash, processed_csv_path)
+        project.has_processed_data = os.path.exists(processed_csv_path)
+        db.session.commit()
 
         return jsonify({
             'success': True,
@@ -898,8 +1081,9 @@ def upload_file():
     except Exception as e:
         logging.error(f"Error processing upload: {str(e)}")
         # Clean up file if it was saved
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
+        db.session.rollback()
+        if 'filename' in locals():
+            remove_upload(filename)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/generate_frames/<int:project_id>', methods=['POST'])
@@ -915,6 +1099,8 @@ def generate_project_frames(project_id):
         resolution = data.get('resolution', 'fullhd')
         fps = float(data.get('fps', 29.97))
         codec = data.get('codec', 'h264')
+        if codec not in VIDEO_CODECS:
+            return jsonify({'error': 'Unsupported codec'}), 400
         interpolate_values = data.get('interpolate_values', True)
 
         # Get text display settings with explicit defaults
@@ -965,8 +1151,12 @@ def generate_project_frames(project_id):
         # Get user's preferred locale
         user_locale = 'ru' if current_user.is_authenticated and hasattr(current_user, 'locale') and current_user.locale == 'ru' else 'en'
 
+        # Admins can profile a job ('cprofile' or 'pyinstrument')
+        profile = data.get('profile') if current_user.is_admin else None
+
         # Start background processing with text settings, interpolation flag and locale
-        process_project(project_id, resolution, fps, codec, text_settings, interpolate_values, locale=user_locale)
+        process_project(project_id, resolution, fps, codec, text_settings, interpolate_values, locale=user_locale,
+                        profile=profile)
 
         return jsonify({'success': True, 'message': 'Processing started'})
     except Exception as e:
@@ -976,17 +1166,65 @@ def generate_project_frames(project_id):
 @app.route('/project_status/<int:project_id>')
 @login_required
 def project_status(project_id):
+    """
+    Status of one project; retry_after_ms tells the client when to poll again
+
+    Jobs running in this process are answered from the in-memory snapshot
+    published by the background processor, without a database read.
+    """
+    snapshot = status_snapshots.get(project_id)
+    if snapshot:
+        user_id, payload = snapshot
+        if user_id != current_user.id:
+            return jsonify({'error': 'Unauthorized'}), 403
+        return jsonify(payload)
+
     project = Project.query.get_or_404(project_id)
     if project.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
-    return jsonify({
-        'status': project.status,
-        'frame_count': project.frame_count,
-        'video_file': project.video_file,
-        'error_message': project.error_message,
-        'progress': project.progress,  # Add progress to the response
-        'processing_time': project.get_processing_time_str()
-    })
+    payload = project_status_payload(project)
+    payload['retry_after_ms'] = DEFAULT_RETRY_AFTER_MS.get(project.status)
+    return jsonify(payload)
+
+@app.route('/project_statuses')
+@login_required
+def project_statuses():
+    """
+    Statuses of several projects of the current user in one query
+
+    ?ids=1,2,3 selects projects (default: all pending and processing ones).
+    The response has an ETag; with a matching If-None-Match header and
+    ?wait=<seconds> the request is held until a status changes or the wait
+    ends (304 Not Modified).
+    """
+    ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip().isdigit()]
+    wait = min(request.args.get('wait', 0, type=float), STATUS_LONG_POLL_MAX_SECONDS)
+    user_id = current_user.id
+    deadline = time.monotonic() + max(wait, 0)
+
+    while True:
+        # Taken before the query so a change committed in between is not missed
+        version = status_versions.version(user_id)
+        query = Project.query.filter(Project.user_id == user_id)
+        if ids:
+            query = query.filter(Project.id.in_(ids))
+        else:
+            query = query.filter(Project.status.in_(['pending', 'processing']))
+        statuses = {str(project.id): project_status_payload(project) for project in query.all()}
+        body = json.dumps({'projects': statuses}, sort_keys=True)
+        etag = hashlib.sha1(body.encode()).hexdigest()
+
+        remaining = deadline - time.monotonic()
+        if etag not in request.if_none_match or remaining <= 0:
+            break
+        # Give the connection back to the pool while waiting
+        db.session.rollback()
+        status_versions.wait(user_id, version, min(STATUS_RECHECK_SECONDS, remaining))
+
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/check_processing_projects', methods=['GET'])
 @login_required
@@ -1048,7 +1286,13 @@ def download_file(project_id, type):
     elif type == 'processed_csv':
         processed_csv = os.path.join('processed_data', f'project_{project.folder_number}_{project.csv_file}')
         if os.path.exists(processed_csv):
-            return send_file(processed_csv, as_attachment=True)
+            trim_range = project.get_trim_range()
+            if trim_range == (None, None):
+                return send_file(processed_csv, as_attachment=True)
+            _, telemetry = process_csv_file(os.path.join(app.config['UPLOAD_FOLDER'], project.csv_file), project.folder_number)
+            trimmed_csv = apply_trim(telemetry, trim_range).to_frame().to_csv(index=False)
+            return send_file(io.BytesIO(trimmed_csv.encode('utf-8')), mimetype='text/csv',
+                             as_attachment=True, download_name=os.path.basename(processed_csv))
 
     return jsonify({'error': 'File not found'}), 404
 
@@ -1061,20 +1305,14 @@ def delete_project(project_id):
 
     try:
         # Delete associated files if they exist
-        if project.csv_file:
-            csv_path = os.path.join(app.config['UPLOAD_FOLDER'], project.csv_file)
-            if os.path.exists(csv_path):
-                os.remove(csv_path)
+        remove_upload(project.csv_file, [project.id])
 
         # Delete preview file if exists
         preview_path = os.path.join('previews', f'{project_id}_preview.png')
         if os.path.exists(preview_path):
             os.remove(preview_path)
 
-        if project.video_file:
-            video_path = os.path.join('videos', project.video_file)
-            if os.path.exists(video_path):
-                os.remove(video_path)
+        remove_video(project)
 
         # Delete PNG archive file if exists
         if project.png_archive_file:
@@ -1088,78 +1326,122 @@ def delete_project(project_id):
             shutil.rmtree(frames_dir)
 
         # Delete processed CSV file if exists
-        if project.csv_file:
-            processed_csv = os.path.join('processed_data', f'project_{project.folder_number}_{project.csv_file}')
-            if os.path.exists(processed_csv):
-                os.remove(processed_csv)
+        remove_processed_data(project)
+
+        released = release_content(project.content_hash)
 
         # Delete project from database
         db.session.delete(project)
         db.session.commit()
+        if released:
+            remove_unreferenced_content([released])
 
         return jsonify({'success': True})
     except Exception as e:
         logging.error(f"Error deleting project: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def load_project_telemetry(project):
+    """Processed Telemetry of a project (sorted by time), or None without processed data"""
+    processed_csv_path = os.path.join('processed_data', f'project_{project.folder_number}_{os.path.basename(project.csv_file)}')
+    if not os.path.exists(processed_csv_path):
+        return None
+    _, telemetry = process_csv_file(os.path.join(app.config['UPLOAD_FOLDER'], project.csv_file), project.folder_number)
+    return telemetry.sorted()
+
+def build_time_range_response(project, telemetry, params):
+    """
+    Time range data for the trim UI
+
+    min/max cover the whole ride so a trim can be widened or undone;
+    trim_start/trim_end and total_rows describe the trimmed part.
+    """
+    trimmed = apply_trim(telemetry, project.get_trim_range())
+    min_timestamp = float(telemetry.timestamps[0])
+    max_timestamp = float(telemetry.timestamps[-1])
+
+    return {
+        'success': True,
+        'min_timestamp': min_timestamp,
+        'max_timestamp': max_timestamp,
+        'min_date': datetime.fromtimestamp(min_timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+        'max_date': datetime.fromtimestamp(max_timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+        'trim_start': float(trimmed.timestamps[0]) if len(trimmed) else min_timestamp,
+        'trim_end': float(trimmed.timestamps[-1]) if len(trimmed) else max_timestamp,
+        'total_rows': len(trimmed),
+        # Downsampled speed and PWM data for the chart
+        'chart_data': build_speed_chart_data(telemetry.to_frame(), params)
+    }
+
 @app.route('/get_csv_timerange/<int:project_id>', methods=['GET'])
 @login_required
 def get_csv_timerange(project_id):
-    """Get the minimum and maximum timestamps of the CSV file"""
+    """Get the time range of the processed ride and of its trimmed part"""
     try:
-        import pandas as pd
+        project = Project.query.get_or_404(project_id)
+        if project.user_id != current_user.id:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        telemetry = load_project_telemetry(project)
+        if telemetry is None or len(telemetry) == 0:
+            return jsonify({'error': 'Processed CSV file not found'}), 404
+
+        return jsonify(build_time_range_response(project, telemetry, request.args))
         
+    except Exception as e:
+        logging.error(f"Error getting CSV time range: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/telemetry/<int:project_id>', methods=['GET'])
+@login_required
+def get_telemetry(project_id):
+    """Zoomable telemetry window served from the multi-resolution pyramid"""
+    try:
         project = Project.query.get_or_404(project_id)
         if project.user_id != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
+        if not project.csv_file:
+            return jsonify({'error': 'Processed CSV file not found'}), 404
 
-        # Get processed file path
         processed_csv_path = os.path.join('processed_data', f'project_{project.folder_number}_{os.path.basename(project.csv_file)}')
-        
         if not os.path.exists(processed_csv_path):
             return jsonify({'error': 'Processed CSV file not found'}), 404
-        
-        # Load the data and get min/max timestamps
-        df = pd.read_csv(processed_csv_path)
-        min_timestamp = float(df['timestamp'].min())
-        max_timestamp = float(df['timestamp'].max())
-        
-        # Format timestamps as human-readable date strings
-        min_date = datetime.fromtimestamp(min_timestamp).strftime('%Y-%m-%d %H:%M:%S')
-        max_date = datetime.fromtimestamp(max_timestamp).strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Count total rows
-        total_rows = len(df)
-        
-        # Get speed and PWM data for the chart
-        chart_data = {
-            'timestamps': df['timestamp'].tolist(),
-            'speed_values': df['speed'].tolist(),
-            'pwm_values': df['pwm'].tolist()
-        }
-        
-        return jsonify({
-            'success': True, 
+
+        options = get_downsample_params(request.args)
+        # Only the trimmed part of the ride is served
+        start, end = clamp_to_trim(options['start'], options['end'], project.get_trim_range())
+        result = query_pyramid(processed_csv_path, start, end, options['points'])
+        if result is None:
+            # Projects processed before pyramids existed: build it once on first request
+            build_pyramid(pd.read_csv(processed_csv_path), processed_csv_path)
+            result = query_pyramid(processed_csv_path, start, end, options['points'])
+        min_timestamp, max_timestamp = clamp_to_trim(result['min_timestamp'], result['max_timestamp'],
+                                                     project.get_trim_range())
+
+        return make_chart_response(build_columnar_payload(result['data']), {
+            'success': True,
+            'level': result['level'],
+            'bucket_size': result['bucket_size'],
             'min_timestamp': min_timestamp,
-            'max_timestamp': max_timestamp,
-            'min_date': min_date,
-            'max_date': max_date,
-            'total_rows': total_rows,
-            'chart_data': chart_data
+            'max_timestamp': max_timestamp
         })
-        
+
     except Exception as e:
-        logging.error(f"Error getting CSV time range: {str(e)}")
+        logging.error(f"Error getting telemetry window: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/trim_csv/<int:project_id>', methods=['POST'])
 @login_required
 def trim_csv(project_id):
-    """Trim CSV file to the specified time range"""
+    """
+    Set the time range of the ride used for previews, frames and exports
+
+    Only the range is stored on the project; the processed data is kept
+    whole, so a trim can be widened or undone without reprocessing.
+    """
     try:
-        from utils.csv_processor import trim_csv_data
-        
         project = Project.query.get_or_404(project_id)
         if project.user_id != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
@@ -1172,13 +1454,21 @@ def trim_csv(project_id):
         if start_timestamp >= end_timestamp:
             return jsonify({'error': 'Start timestamp must be less than end timestamp'}), 400
         
-        # Trim the CSV data
-        trim_csv_data(
-            os.path.join(app.config['UPLOAD_FOLDER'], project.csv_file),
-            project.folder_number,
-            start_timestamp,
-            end_timestamp
-        )
+        telemetry = load_project_telemetry(project)
+        if telemetry is None or len(telemetry) == 0:
+            return jsonify({'error': 'Processed CSV file not found'}), 404
+
+        if len(telemetry.between(start_timestamp, end_timestamp)) == 0:
+            return jsonify({'error': 'No data remains after trimming. Choose a wider time range.'}), 400
+
+        # A range covering the whole ride removes the trim
+        if start_timestamp <= telemetry.timestamps[0] and end_timestamp >= telemetry.timestamps[-1]:
+            project.trim_start = None
+            project.trim_end = None
+        else:
+            project.trim_start = start_timestamp
+            project.trim_end = end_timestamp
+        db.session.commit()
         
         # Get settings from request for preview update
         resolution = data.get('resolution', 'fullhd')
@@ -1228,29 +1518,9 @@ def trim_csv(project_id):
             locale=user_locale
         )
         
-        # Get updated time range
-        import pandas as pd
-        processed_csv_path = os.path.join('processed_data', f'project_{project.folder_number}_{os.path.basename(project.csv_file)}')
-        df = pd.read_csv(processed_csv_path)
-        min_timestamp = float(df['timestamp'].min())
-        max_timestamp = float(df['timestamp'].max())
-        total_rows = len(df)
-        
-        # Get speed and PWM data for the chart
-        chart_data = {
-            'timestamps': df['timestamp'].tolist(),
-            'speed_values': df['speed'].tolist(),
-            'pwm_values': df['pwm'].tolist()
-        }
-        
-        return jsonify({
-            'success': True, 
-            'preview_url': url_for('serve_preview', filename=f'{project.id}_preview.png'),
-            'min_timestamp': min_timestamp,
-            'max_timestamp': max_timestamp,
-            'total_rows': total_rows,
-            'chart_data': chart_data
-        })
+        response = build_time_range_response(project, telemetry, data)
+        response['preview_url'] = url_for('serve_preview', filename=f'{project.id}_preview.png')
+        return jsonify(response)
         
     except Exception as e:
         logging.error(f"Error trimming CSV file: {str(e)}")
@@ -1470,8 +1740,9 @@ def delete_admin_user(user_id):
     try:
         # Delete all user's projects first
         projects = Project.query.filter_by(user_id=user.id).all()
+        released = []
         for project in projects:
-            if not cleanup_project_files(project):
+            if not cleanup_project_files(project, released):
                 return jsonify({'error': f'Failed to clean up files for project {project.id}'}), 500
             db.session.delete(project)
 
@@ -1480,6 +1751,7 @@ def delete_admin_user(user_id):
         # Сохраняем запись о деактивации
         logging.info(f"User {user.id} ({user.email}) deactivated by admin")
         db.session.commit()
+        remove_unreferenced_content(released)
 
         return jsonify({'success': True})
 
@@ -1529,6 +1801,7 @@ def bulk_delete_users():
             return jsonify({'error': 'No user IDs provided'}), 400
             
         deleted_count = 0
+        released = []
         
         for user_id in user_ids:
             user = User.query.get(user_id)
@@ -1536,7 +1809,7 @@ def bulk_delete_users():
                 # Delete all user's projects and files first
                 projects = Project.query.filter_by(user_id=user.id).all()
                 for project in projects:
-                    cleanup_project_files(project)
+                    cleanup_project_files(project, released)
                     db.session.delete(project)
                 
                 # Delete all user's presets
@@ -1555,6 +1828,7 @@ def bulk_delete_users():
                 logging.info(f"Admin deleted user {user.id} ({user.email}) via bulk delete")
         
         db.session.commit()
+        remove_unreferenced_content(released)
         
         return jsonify({
             'success': True,
@@ -1578,12 +1852,14 @@ def cleanup_storage():
         projects = Project.query.all()
         used_files = set()
         used_folders = set()  # Define used_folders set
+        content_refs = defaultdict(int)  # content hash -> number of projects using it
 
         # Collect all files that are used by projects
         for project in projects:
             if project.csv_file:
                 used_files.add(project.csv_file)  # uploads directory
                 used_files.add(f'project_{project.folder_number}_{project.csv_file}')  # processed_data directory
+                used_files.add(get_pyramid_dir(f'project_{project.folder_number}_{project.csv_file}'))  # zoom pyramid
             if project.video_file:
                 used_files.add(project.video_file)  # videos directory
             if project.png_archive_file:
@@ -1591,6 +1867,8 @@ def cleanup_storage():
             used_files.add(f'{project.id}_preview.png')  # previews directory
             # frames directory is handled by folder name
             used_folders.add(f'project_{project.folder_number}')  # frames directory
+            if project.content_hash:
+                content_refs[project.content_hash] += 1
 
         deleted_files = []
         deleted_count = 0
@@ -1636,7 +1914,10 @@ def cleanup_storage():
             if filename not in used_files:
                 file_path = os.path.join('processed_data', filename)
                 try:
-                    os.remove(file_path)
+                    if os.path.isdir(file_path):
+                        shutil.rmtree(file_path)
+                    else:
+                        os.remove(file_path)
                     deleted_files.append(f'processed_data/{filename}')
                     deleted_count += 1
                     logging.info(f"Deleted unused file: {file_path}")
@@ -1669,6 +1950,31 @@ def cleanup_storage():
                     except Exception as e:
                         logging.error(f"Error deleting archive {file_path}: {str(e)}")
 
+        # Prune the batch analytics summary cache
+        for file_path in prune_summary_cache():
+            deleted_files.append(file_path)
+            deleted_count += 1
+
+        # Clear artifact flags of files that no longer exist
+        for project in projects:
+            if project.has_processed_data and not os.path.exists(
+                    os.path.join('processed_data', f'project_{project.folder_number}_{project.csv_file}')):
+                project.has_processed_data = False
+            if project.has_video and not (project.video_file and os.path.exists(os.path.join('videos', project.video_file))):
+                project.has_video = False
+
+        # Check content store (also fixes reference counts)
+        try:
+            unreferenced = reconcile_content_store(content_refs)
+            db.session.commit()
+            remove_unreferenced_content(unreferenced)
+            for digest in unreferenced:
+                deleted_files.append(get_store_dir(digest))
+                deleted_count += 1
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error cleaning up content store: {str(e)}")
+
         return jsonify({
             'success': True,
             'deleted_count': deleted_count,
@@ -1831,9 +2137,13 @@ with app.app_context():
     db.create_all()
 
 # Start collecting stats when the app starts
-stats_thread = threading.Thread(target=collect_system_stats, daemon=True)
+stats_thread = threading.Thread(target=metrics_collector.run, daemon=True)
 stats_thread.start()
 
+# Detect working video encoders once, off the request path
+encoder_probe_thread = threading.Thread(target=probe_encoders, daemon=True)
+encoder_probe_thread.start()
+
 # Start cleanup thread when app starts
 cleanup_thread = threading.Thread(target=cleanup_expired_projects, daemon=True)
 cleanup_thread.start()
@@ -2105,383 +2415,29 @@ def analyze_csv():
     if file.filename == '':
         return jsonify({'error': gettext('No file selected')}), 400
     
-    # Check file size - limit to 50MB to prevent memory issues
-    # Read only beginning of the file to get size
-    file.seek(0, os.SEEK_END)
-    file_size = file.tell()
-    file.seek(0)  # Reset file pointer to beginning
-    
-    # 50MB = 50 * 1024 * 1024 bytes
-    if file_size > 50 * 1024 * 1024:
-        return jsonify({'error': gettext('File is too large. Please upload a CSV file smaller than 50MB.')}), 400
-        
-    temp_dir = None
-    temp_file_path = None
-    
     try:
-        # Create a temporary file to store the uploaded CSV
-        temp_dir = tempfile.mkdtemp()
-        temp_file_path = os.path.join(temp_dir, secure_filename(file.filename))
-        file.save(temp_file_path)
-        
-        # Log file size for debugging
-        file_size_mb = os.path.getsize(temp_file_path) / (1024 * 1024)
-        logging.info(f"Saved CSV file for analytics, size: {file_size_mb:.2f} MB")
-        
-        # Read and validate CSV file
+        # Parse straight from the upload stream; raw rows are discarded chunk by chunk
         try:
-            # Try reading with different encodings
-            try:
-                df = pd.read_csv(temp_file_path, encoding='utf-8')
-            except UnicodeDecodeError:
-                try:
-                    df = pd.read_csv(temp_file_path, encoding='latin1')
-                except UnicodeDecodeError:
-                    return jsonify({'error': gettext('Invalid file encoding. Please ensure your CSV file is properly encoded.')}), 400
-            
-            # Detect CSV type
-            try:
-                csv_type = detect_csv_type(df)
-                logging.info(f"Detected CSV type: {csv_type}")
-            except ValueError:
-                # Check for DarknessBot format
-                darkness_bot_columns = {'Date', 'Speed', 'GPS Speed', 'Voltage', 'Temperature', 
-                                    'Current', 'Battery level', 'Total mileage', 'PWM', 'Power'}
-                
-                # Check for WheelLog format - core columns (gps_speed is optional)
-                wheellog_core_columns = {'date', 'speed', 'voltage', 'system_temp',
-                                'current', 'battery_level', 'totaldistance', 'pwm', 'power'}
-                wheellog_all_columns = wheellog_core_columns.union({'gps_speed'})
-
-                df_columns = set(df.columns)
-                is_darkness_bot = len(darkness_bot_columns.intersection(df_columns)) >= len(darkness_bot_columns) * 0.8
-                is_wheellog = len(wheellog_core_columns.intersection(df_columns)) >= len(wheellog_core_columns) * 0.9
-
-                if not (is_darkness_bot or is_wheellog):
-                    return jsonify({'error': gettext('Invalid CSV format. Please upload a CSV file from DarknessBot or WheelLog.')}), 400
-
-                csv_type = 'darnkessbot' if is_darkness_bot else 'wheellog'
-            
-            # Process the CSV file to get standardized data
-            csv_type, processed_data = process_csv_file(temp_file_path, interpolate_values=True)
-            
-            # Log the type of processed_data for debugging
-            logging.info(f"Processed data type: {type(processed_data)}")
-            if isinstance(processed_data, dict):
-                logging.info(f"Dict keys: {list(processed_data.keys())}")
-                if 'timestamp' in processed_data:
-                    logging.info(f"Timestamp data type: {type(processed_data['timestamp'])}")
-                    logging.info(f"Number of timestamps: {len(processed_data['timestamp'])}")
-            
-            # Convert processed data to a list of dictionaries for JSON serialization
-            serializable_data = []
-            
-            # Check if processed_data is a dict or DataFrame and handle accordingly
-            if isinstance(processed_data, pd.DataFrame):
-                # For DataFrame format
-                for _, row in processed_data.iterrows():
-                    row_dict = {}
-                    for col in processed_data.columns:
-                        value = row[col]
-                        # Handle special data types
-                        if pd.isna(value):
-                            row_dict[col] = None
-                        else:
-                            row_dict[col] = float(value) if isinstance(value, (int, float)) else str(value)
-                    serializable_data.append(row_dict)
-            elif isinstance(processed_data, dict):
-                # For dictionary format 
-                # Process structure like {'timestamp': [...], 'speed': [...], ...}
-                if 'timestamp' in processed_data and isinstance(processed_data['timestamp'], (list, tuple)):
-                    # Get the number of data points
-                    num_points = len(processed_data['timestamp'])
-                    
-                    # Create a record for each data point
-                    for i in range(num_points):
-                        record = {}
-                        for key, values in processed_data.items():
-                            if i < len(values):
-                                value = values[i]
-                                # Handle special data types
-                                if pd.isna(value):
-                                    record[key] = None
-                                else:
-                                    record[key] = float(value) if isinstance(value, (int, float)) else str(value)
-                            else:
-                                record[key] = None
-                        serializable_data.append(record)
-                else:
-                    # Handle other dictionary formats if needed
-                    logging.warning("Unrecognized dictionary data format")
-            
-            # Calculate achievements using database-driven system
-            achievements = []
-            
-            # Calculate analytics variables for achievement formulas
-            analytics_vars = {}
-            
-            # Calculate max speed
-            max_speed = 0
-            if isinstance(processed_data, dict) and 'speed' in processed_data:
-                speed_values = [float(val) for val in processed_data['speed'] if not pd.isna(val)]
-                max_speed = max(speed_values, default=0)
-            elif isinstance(processed_data, pd.DataFrame):
-                max_speed = processed_data['speed'].max()
-            analytics_vars['max_speed'] = max_speed
-            
-            # Calculate daily travel distance
-            max_daily_distance = 0
-            if isinstance(processed_data, dict) and 'timestamp' in processed_data and 'mileage' in processed_data:
-                # Convert timestamps to date strings
-                dates = [datetime.utcfromtimestamp(float(ts)).strftime('%Y-%m-%d') 
-                      for ts in processed_data['timestamp'] if not pd.isna(ts)]
-                
-                # Get mileage values
-                mileage_values = [float(val) for val in processed_data['mileage'] if not pd.isna(val)]
-                
-                # Create a DataFrame to group by date
-                if len(dates) == len(mileage_values) and len(dates) > 0:
-                    mileage_df = pd.DataFrame({
-                        'date': dates,
-                        'mileage': mileage_values
-                    })
-                    
-                    # Calculate mileage difference by date
-                    mileage_by_date = mileage_df.groupby('date').agg({
-                        'mileage': lambda x: max(x) - min(x)
-                    })
-                    
-                    # Get the maximum daily distance
-                    max_daily_distance = mileage_by_date['mileage'].max()
-            analytics_vars['max_daily_distance'] = max_daily_distance
-            
-            # Calculate power values
-            max_power = 0
-            min_power = 0
-            if isinstance(processed_data, dict) and 'power' in processed_data:
-                power_values = [float(val) for val in processed_data['power'] if not pd.isna(val)]
-                if power_values:
-                    max_power = max(power_values)
-                    min_power = min(power_values)
-            analytics_vars['max_power'] = max_power
-            analytics_vars['min_power'] = min_power
-            
-            # Calculate average speed difference (Clown achievement)
-            avg_speed_diff = 0
-            if isinstance(processed_data, dict) and 'speed' in processed_data and 'gps' in processed_data:
-                speed_pairs = []
-                for i in range(len(processed_data['speed'])):
-                    if (i < len(processed_data['gps']) and 
-                        not pd.isna(processed_data['speed'][i]) and 
-                        not pd.isna(processed_data['gps'][i])):
-                        
-                        speed = float(processed_data['speed'][i])
-                        gps_speed = float(processed_data['gps'][i])
-                        
-                        if gps_speed > 0:
-                            speed_pairs.append((speed, gps_speed))
-                
-                if speed_pairs:
-                    differences = [abs(pair[0] - pair[1]) for pair in speed_pairs]
-                    avg_speed_diff = sum(differences) / len(differences)
-            analytics_vars['avg_speed_diff'] = avg_speed_diff
-            
-            # Calculate PWM-related achievements
-            pwm_100_survived = False
-            pwm_100_dead = False
-            if isinstance(processed_data, dict) and 'pwm' in processed_data and 'speed' in processed_data and 'timestamp' in processed_data:
-                if (len(processed_data['pwm']) > 0 and 
-                    len(processed_data['speed']) > 0 and 
-                    len(processed_data['timestamp']) > 0):
-                    
-                    # Find all instances of 100% PWM
-                    max_pwm_indices = []
-                    for i in range(len(processed_data['pwm'])):
-                        if (not pd.isna(processed_data['pwm'][i]) and 
-                            float(processed_data['pwm'][i]) >= 100):
-                            max_pwm_indices.append(i)
-                    
-                    if max_pwm_indices:
-                        last_max_pwm_index = max_pwm_indices[-1]
-                        last_max_pwm_timestamp = float(processed_data['timestamp'][last_max_pwm_index])
-                        
-                        # Check all speed values in the 10 seconds after last 100% PWM
-                        suicidal = True
-                        dead = False
-                        
-                        for i in range(len(processed_data['timestamp'])):
-                            if (not pd.isna(processed_data['timestamp'][i]) and 
-                                not pd.isna(processed_data['speed'][i])):
-                                
-                                timestamp = float(processed_data['timestamp'][i])
-                                speed = float(processed_data['speed'][i])
-                                
-                                if (timestamp > last_max_pwm_timestamp and 
-                                    timestamp <= last_max_pwm_timestamp + 10):
-                                    
-                                    if speed < 5:
-                                        suicidal = False
-                                        
-                                    if speed < 2:
-                                        dead = True
-                        
-                        pwm_100_survived = suicidal
-                        pwm_100_dead = dead
-            
-            analytics_vars['pwm_100_survived'] = pwm_100_survived
-            analytics_vars['pwm_100_dead'] = pwm_100_dead
-            
-            # Calculate complex Dead achievement condition
-            dead_condition_met = False
-            if isinstance(processed_data, dict) and all(key in processed_data for key in ['speed', 'pwm', 'timestamp']):
-                if (len(processed_data['speed']) > 0 and 
-                    len(processed_data['pwm']) > 0 and 
-                    len(processed_data['timestamp']) > 0):
-                    
-                    logging.debug("Starting Dead achievement analysis...")
-                    
-                    # Find periods where speed > 30 km/h for at least 3 seconds with PWM = 100
-                    high_speed_periods = []
-                    
-                    # First pass: identify high speed periods with PWM 100
-                    i = 0
-                    while i < len(processed_data['timestamp']):
-                        if (not pd.isna(processed_data['timestamp'][i]) and 
-                            not pd.isna(processed_data['speed'][i])):
-                            
-                            timestamp = float(processed_data['timestamp'][i])
-                            speed = float(processed_data['speed'][i])
-                            
-                            if speed > 30:
-                                # Start of potential high speed period
-                                period_start = timestamp
-                                period_end = timestamp
-                                has_pwm_100 = False
-                                
-                                # Check PWM at start
-                                if (i < len(processed_data['pwm']) and 
-                                    not pd.isna(processed_data['pwm'][i]) and 
-                                    float(processed_data['pwm'][i]) == 100):
-                                    has_pwm_100 = True
-                                
-                                # Continue through the high speed period
-                                j = i + 1
-                                while j < len(processed_data['timestamp']):
-                                    if (not pd.isna(processed_data['timestamp'][j]) and 
-                                        not pd.isna(processed_data['speed'][j])):
-                                        
-                                        next_timestamp = float(processed_data['timestamp'][j])
-                                        next_speed = float(processed_data['speed'][j])
-                                        
-                                        if next_speed > 30:
-                                            period_end = next_timestamp
-                                            # Check for PWM 100 in this period
-                                            if (j < len(processed_data['pwm']) and 
-                                                not pd.isna(processed_data['pwm'][j]) and 
-                                                float(processed_data['pwm'][j]) == 100):
-                                                has_pwm_100 = True
-                                                logging.debug(f"Found PWM=100 at timestamp {next_timestamp} during high speed period")
-                                        else:
-                                            break
-                                    j += 1
-                                
-                                # Check if period duration >= 3 seconds and has PWM 100
-                                period_duration = period_end - period_start
-                                if period_duration >= 3 and has_pwm_100:
-                                    high_speed_periods.append((period_start, period_end))
-                                    logging.debug(f"Found high speed period: {period_start} to {period_end} (duration: {period_duration}s)")
-                                
-                                # Move to end of this period
-                                i = j
-                            else:
-                                i += 1
-                        else:
-                            i += 1
-                    
-                    logging.debug(f"Found {len(high_speed_periods)} high speed periods with PWM 100")
-                    
-                    # Check for PWM failure after high speed periods
-                    for period_start, period_end in high_speed_periods:
-                        logging.debug(f"Checking PWM failure after period ending at {period_end}")
-                        
-                        # Look for PWM = 0 within 5 seconds after the period
-                        check_until = period_end + 5
-                        
-                        pwm_zero_found = False
-                        pwm_zero_timestamp = None
-                        
-                        for i in range(len(processed_data['timestamp'])):
-                            if (not pd.isna(processed_data['timestamp'][i]) and 
-                                not pd.isna(processed_data['pwm'][i])):
-                                
-                                timestamp = float(processed_data['timestamp'][i])
-                                pwm = float(processed_data['pwm'][i])
-                                
-                                if (timestamp > period_end and 
-                                    timestamp <= check_until and 
-                                    pwm == 0):
-                                    pwm_zero_found = True
-                                    pwm_zero_timestamp = timestamp
-                                    logging.debug(f"Found PWM=0 at {pwm_zero_timestamp}")
-                                    break
-                        
-                        # If PWM = 0 found, check if it stays < 3 for 5 seconds
-                        if pwm_zero_found:
-                            pwm_stays_low = True
-                            check_until_low = pwm_zero_timestamp + 5
-                            
-                            for i in range(len(processed_data['timestamp'])):
-                                if (not pd.isna(processed_data['timestamp'][i]) and 
-                                    not pd.isna(processed_data['pwm'][i])):
-                                    
-                                    timestamp = float(processed_data['timestamp'][i])
-                                    pwm = float(processed_data['pwm'][i])
-                                    
-                                    if (timestamp > pwm_zero_timestamp and 
-                                        timestamp <= check_until_low and 
-                                        pwm >= 3):
-                                        pwm_stays_low = False
-                                        logging.debug(f"PWM went above 3 at {timestamp}, value: {pwm}")
-                                        break
-                            
-                            if pwm_stays_low:
-                                dead_condition_met = True
-                                logging.debug("Dead condition MET!")
-                                break
-                            else:
-                                logging.debug("PWM did not stay low enough")
-                        else:
-                            logging.debug("No PWM=0 found within 5 seconds after high speed period")
-                    
-                    logging.debug(f"Final dead_condition_met: {dead_condition_met}")
+            csv_type, processed_data, analytics_vars = analyze_csv_stream(file.stream)
+            logging.info(f"Analyzed {csv_type} CSV, {len(processed_data['timestamp'])} rows kept for charts")
             
-            analytics_vars['dead_condition_met'] = dead_condition_met
+            # Pack processed data into a columnar payload (one array per metric)
+            chart_payload = build_columnar_payload(downsample_processed_data(processed_data, request.form))
             
             # Get all active achievements from database and evaluate them
-            active_achievements = Achievement.query.filter_by(is_active=True).all()
-            
-            for achievement in active_achievements:
-                try:
-                    # Evaluate achievement formula with analytics variables
-                    if eval(achievement.formula, {"__builtins__": {}}, analytics_vars):
-                        achievements.append({
-                            'id': achievement.achievement_id,
-                            'title': achievement.title,
-                            'description': achievement.description,
-                            'icon': achievement.icon
-                        })
-                except Exception as e:
-                    logging.warning(f"Error evaluating achievement formula for {achievement.achievement_id}: {str(e)}")
-                    continue
+            achievements = evaluate_achievements(analytics_vars, Achievement.query.filter_by(is_active=True).all())
             
             # Return the processed data with achievements for visualization
-            return jsonify({
+            return make_chart_response(chart_payload, {
                 'success': True,
                 'csv_type': csv_type,
-                'csv_data': json.dumps(serializable_data),
                 'achievements': achievements
             })
             
+        except UnicodeDecodeError:
+            return jsonify({'error': gettext('Invalid file encoding. Please ensure your CSV file is properly encoded.')}), 400
+        except InvalidCSVFormat:
+            return jsonify({'error': gettext('Invalid CSV format. Please upload a CSV file from DarknessBot or WheelLog.')}), 400
         except MemoryError:
             # Special handling for memory errors
             logging.error("Memory error while processing CSV file - file may be too large")
@@ -2497,15 +2453,65 @@ def analyze_csv():
     except Exception as e:
         logging.error(f"Error in analyze_csv: {str(e)}")
         return jsonify({'error': gettext('An unexpected error occurred')}), 500
-    finally:
-        # Clean up temporary files
-        try:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-            if temp_dir and os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
-        except Exception as e:
-            logging.error(f"Error cleaning up temporary files: {str(e)}")
+
+@app.route('/analyze_csv_batch', methods=['POST'])
+@login_required
+def analyze_csv_batch():
+    """
+    Start season statistics across many CSV logs (or zip archives of logs)
+
+    The logs are saved to a temporary directory and analysed by a background
+    task; poll /analyze_csv_batch/<task_id> for its progress and result.
+    """
+    from flask_babel import gettext
+    from utils.background_tasks import task_manager
+    
+    files = request.files.getlist('files')
+    if not any(file.filename for file in files):
+        return jsonify({'error': gettext('No file provided')}), 400
+    
+    directory = tempfile.mkdtemp(prefix='batch_analytics_')
+    try:
+        logs = save_batch_files(files, directory)
+        if not logs:
+            shutil.rmtree(directory, ignore_errors=True)
+            return jsonify({'error': gettext('No CSV files found in the upload')}), 400
+        
+        task_manager.cleanup_old_tasks()
+        task_id = task_manager.add_task('batch_analytics', {
+            'user_id': current_user.id,
+            'directory': directory,
+            'logs': logs
+        })
+        return jsonify({'success': True, 'task_id': task_id}), 202
+    
+    except BatchAnalyticsError as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        logging.error(f"Error in analyze_csv_batch: {str(e)}")
+        return jsonify({'error': gettext('An unexpected error occurred')}), 500
+
+@app.route('/analyze_csv_batch/<task_id>', methods=['GET'])
+@login_required
+def analyze_csv_batch_status(task_id):
+    """Progress of a batch analytics task, with the report once it is completed"""
+    from flask_babel import gettext
+    from utils.background_tasks import task_manager
+    
+    task = task_manager.tasks.get(task_id)
+    if task is None or task.type != 'batch_analytics' or task.data.get('user_id') != current_user.id:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    status = task_manager.get_task_status(task_id)
+    response = {'status': status['status'], 'progress': status['progress']}
+    if status['status'] == 'completed':
+        response.update(status['result'], success=True)
+    elif status['status'] == 'failed':
+        response['error'] = gettext('An unexpected error occurred')
+    return jsonify(response)
+
 # Add markdown preview route
 @app.route('/markdown-preview', methods=['POST'])
 def markdown_preview():
@@ -0,0 +1,83 @@
+"""
+Synthetic DarknessBot and WheelLog logs for benchmarks.
+
+The generated rides are deterministic for a given seed: speed follows a
+bounded random walk, the other channels are derived from it, so the CSV
+processor and the frame renderer see realistic value ranges. Rows are
+200 ms apart like in real logs.
+"""
+import numpy as np
+import pandas as pd
+
+ROW_INTERVAL_MS = 200
+START_TIME = '2025-05-01 10:00:00'
+
+SIZES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1M': 1_000_000
+}
+
+
+def _ride(rows, seed):
+    rng = np.random.default_rng(seed)
+    speed = np.clip(30 + np.cumsum(rng.normal(0, 0.4, rows)), 0, 90)
+    return {
+        'timestamps': pd.Timestamp(START_TIME) + pd.to_timedelta(np.arange(rows) * ROW_INTERVAL_MS, unit='ms'),
+        'speed': speed.round(1),
+        'gps_speed': (speed + rng.normal(0, 1, rows)).clip(0).round(1),
+        'voltage': np.linspace(100.8, 84.0, rows).round(1),
+        'temperature': (35 + speed / 10).round(),
+        'current': (speed / 3 + rng.normal(0, 2, rows)).round(1),
+        'battery': np.linspace(100, 15, rows).round(),
+        'distance_km': np.cumsum(speed / 3.6 * ROW_INTERVAL_MS / 1000) / 1000,
+        'pwm': np.clip(speed * 1.1, 0, 100).round(),
+        'power': (speed * 40 + rng.normal(0, 150, rows)).round()
+    }
+
+
+def darknessbot_dataframe(rows, seed=0):
+    """DarknessBot log with 'rows' rows"""
+    ride = _ride(rows, seed)
+    return pd.DataFrame({
+        'Date': ride['timestamps'].strftime('%d.%m.%Y %H:%M:%S.%f').str[:-3],
+        'Speed': ride['speed'],
+        'GPS Speed': ride['gps_speed'],
+        'Voltage': ride['voltage'],
+        'Temperature': ride['temperature'],
+        'Current': ride['current'],
+        'Battery level': ride['battery'],
+        'Total mileage': (1000 + ride['distance_km']).round(2),
+        'PWM': ride['pwm'],
+        'Power': ride['power']
+    })
+
+
+def wheellog_dataframe(rows, seed=0):
+    """WheelLog log with 'rows' rows (mileage in meters)"""
+    ride = _ride(rows, seed)
+    return pd.DataFrame({
+        'date': ride['timestamps'].strftime('%Y-%m-%d'),
+        'time': ride['timestamps'].strftime('%H:%M:%S.%f').str[:-3],
+        'speed': ride['speed'],
+        'gps_speed': ride['gps_speed'],
+        'voltage': ride['voltage'],
+        'system_temp': ride['temperature'],
+        'current': ride['current'],
+        'battery_level': ride['battery'],
+        'totaldistance': (1_000_000 + ride['distance_km'] * 1000).round(),
+        'pwm': ride['pwm'],
+        'power': ride['power']
+    })
+
+
+def write_log(path, csv_type, rows, seed=0):
+    """Write a synthetic 'darknessbot' or 'wheellog' log to path"""
+    if csv_type == 'darknessbot':
+        df = darknessbot_dataframe(rows, seed)
+    elif csv_type == 'wheellog':
+        df = wheellog_dataframe(rows, seed)
+    else:
+        raise ValueError(f"Unknown log type: {csv_type}")
+    df.to_csv(path, index=False)
+    return path
@@ -0,0 +1,274 @@
+"""
+Benchmarks for the render pipeline.
+
+Runs without network or database access. Run it from the repository root:
+
+    python -m benchmarks.run                       # everything, all sizes
+    python -m benchmarks.run --sizes 10k,100k --only csv,sampling
+    python -m benchmarks.run --compare benchmarks/results/<previous>.json
+
+Groups:
+    csv        process_csv_file on synthetic DarknessBot and WheelLog logs
+    sampling   find_nearest_values over the ride timeline
+    frame      create_frame with a compiled layout (draw) and PNG encoding, fullhd/4k, icons on/off
+    indicator  create_speed_indicator, fullhd/4k
+    video      create_video on rendered frames (skipped without ffmpeg)
+
+Results are written as JSON to benchmarks/results/ (or --output), together
+with the git commit, so runs from different commits can be compared.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+GROUPS = ['csv', 'sampling', 'frame', 'indicator', 'video']
+LOG_TYPES = ['darknessbot', 'wheellog']
+
+SAMPLED_FRAMES = 1000  # Timeline positions sampled per log
+FRAME_REPEATS = 10
+INDICATOR_REPEATS = 50
+VIDEO_FRAMES = 90
+BENCHMARK_FOLDER = 'benchmark'  # frames/project_benchmark, videos/project_benchmark.mp4
+
+TEXT_SETTINGS = {
+    'show_speed': True, 'show_max_speed': True, 'show_voltage': True, 'show_temp': True,
+    'show_battery': True, 'show_mileage': True, 'show_pwm': True, 'show_power': True,
+    'show_current': True, 'show_gps': True, 'show_time': True, 'show_bottom_elements': True
+}
+
+
+def measure(func, repeats=1):
+    """Run func 'repeats' times; return timing stats in seconds"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        'repeats': repeats,
+        'median': statistics.median(times),
+        'min': min(times),
+        'max': max(times)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _processed_frame(telemetry):
+    """Sorted DataFrame as used by generate_frames"""
+    return telemetry.sorted().to_frame()
+
+
+def bench_csv(logs, results):
+    from utils.csv_processor import process_csv_file
+    processed = {}
+    for (csv_type, size), path in logs.items():
+        holder = {}
+
+        def run():
+            holder['data'] = process_csv_file(path)[1]
+
+        stats = measure(run)
+        processed[(csv_type, size)] = holder['data']
+        results.append({'name': 'process_csv_file', 'params': {'type': csv_type, 'size': size}, **stats})
+        logging.warning(f"process_csv_file {csv_type} {size}: {stats['median']:.2f}s")
+    return processed
+
+
+def bench_sampling(processed, results):
+    from utils.image_generator import find_nearest_values
+    for (csv_type, size), data in processed.items():
+        df = _processed_frame(data)
+        timestamps = np.linspace(df['timestamp'].min(), df['timestamp'].max(), SAMPLED_FRAMES)
+
+        def run():
+            for timestamp in timestamps:
+                find_nearest_values(df, timestamp, interpolate=True)
+
+        stats = measure(run)
+        stats['per_frame_ms'] = stats['median'] / SAMPLED_FRAMES * 1000
+        results.append({'name': 'find_nearest_values', 'params': {'type': csv_type, 'size': size}, **stats})
+        logging.warning(f"find_nearest_values {csv_type} {size}: {stats['per_frame_ms']:.3f}ms/frame")
+
+
+def _sample_values():
+    from benchmarks.generators import darknessbot_dataframe
+    from utils.csv_processor import process_csv_file
+    from utils.image_generator import find_nearest_values
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'values.csv')
+        darknessbot_dataframe(200).to_csv(path, index=False)
+        df = _processed_frame(process_csv_file(path)[1])
+    return find_nearest_values(df, df['timestamp'].iloc[100], interpolate=True)
+
+
+def bench_frame(results):
+    from utils.image_generator import create_frame, encode_frame_png
+    from utils.overlay_widgets import compile_layout
+    values = _sample_values()
+    for resolution in ['fullhd', '4k']:
+        for use_icons in [False, True]:
+            settings = dict(TEXT_SETTINGS, use_icons=use_icons)
+            params = {'resolution': resolution, 'icons': use_icons}
+            # Compiled once per job, like generate_frames does
+            plan = compile_layout(settings, resolution, inputs=values)
+            create_frame(values, plan=plan)  # Warm font/icon caches
+
+            holder = {}
+
+            def draw():
+                holder['frame'] = create_frame(values, plan=plan)
+
+            stats = measure(draw, FRAME_REPEATS)
+            results.append({'name': 'create_frame', 'params': params, **stats})
+            encode = measure(lambda: encode_frame_png(holder['frame']), FRAME_REPEATS)
+            results.append({'name': 'encode_frame_png', 'params': params, **encode})
+            logging.warning(f"create_frame {resolution} icons={use_icons}: draw {stats['median'] * 1000:.1f}ms, "
+                            f"encode {encode['median'] * 1000:.1f}ms")
+
+
+def bench_indicator(results):
+    from utils.image_processor import create_speed_indicator
+    speeds = np.linspace(0, 100, INDICATOR_REPEATS)
+    for resolution, size in [('fullhd', 500), ('4k', 1000)]:
+        position = iter(range(len(speeds) * 2))
+
+        def run():
+            create_speed_indicator(float(speeds[next(position) % len(speeds)]), size=size, resolution=resolution)
+
+        stats = measure(run, INDICATOR_REPEATS)
+        results.append({'name': 'create_speed_indicator', 'params': {'resolution': resolution}, **stats})
+        logging.warning(f"create_speed_indicator {resolution}: {stats['median'] * 1000:.1f}ms")
+
+
+def bench_video(results):
+    if shutil.which('ffmpeg') is None:
+        results.append({'name': 'create_video', 'params': {}, 'skipped': 'ffmpeg not found'})
+        logging.warning("create_video: skipped (ffmpeg not found)")
+        return
+
+    from utils.image_generator import create_frame
+    from utils.video_creator import create_video
+    values = _sample_values()
+    frames_dir = os.path.join('frames', f'project_{BENCHMARK_FOLDER}')
+    video_path = os.path.join('videos', f'project_{BENCHMARK_FOLDER}.mp4')
+    try:
+        for resolution in ['fullhd', '4k']:
+            if os.path.exists(frames_dir):
+                shutil.rmtree(frames_dir)
+            os.makedirs(frames_dir)
+            for i in range(VIDEO_FRAMES):
+                values = dict(values, speed=int(i * 100 / VIDEO_FRAMES))
+                create_frame(values, resolution, os.path.join(frames_dir, f'frame_{i:06d}.png'), TEXT_SETTINGS)
+
+            stats = measure(lambda: create_video(BENCHMARK_FOLDER, 29.97, 'h264', resolution))
+            stats['encode_fps'] = VIDEO_FRAMES / stats['median']
+            results.append({'name': 'create_video', 'params': {'resolution': resolution, 'frames': VIDEO_FRAMES},
+                            **stats})
+            logging.warning(f"create_video {resolution}: {stats['encode_fps']:.1f} fps")
+    finally:
+        if os.path.exists(frames_dir):
+            shutil.rmtree(frames_dir)
+        if os.path.exists(video_path):
+            os.remove(video_path)
+
+
+def _result_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(previous_path, results):
+    """Print the median time change against a previous results file"""
+    with open(previous_path) as f:
+        previous = {_result_key(r): r for r in json.load(f)['results'] if 'median' in r}
+    print(f"\nCompared with {previous_path}:")
+    for result in results:
+        old = previous.get(_result_key(result))
+        if not old or 'median' not in result:
+            continue
+        change = (result['median'] / old['median'] - 1) * 100 if old['median'] else 0
+        print(f"  {result['name']:<24} {json.dumps(result['params'], sort_keys=True):<50} "
+              f"{old['median'] * 1000:10.2f}ms -> {result['median'] * 1000:10.2f}ms ({change:+.1f}%)")
+
+
+def main(argv=None):
+    from benchmarks.generators import SIZES, write_log
+
+    parser = argparse.ArgumentParser(description='Render pipeline benchmarks')
+    parser.add_argument('--sizes', default=','.join(SIZES), help='Log sizes: ' + ', '.join(SIZES))
+    parser.add_argument('--only', default=','.join(GROUPS), help='Groups: ' + ', '.join(GROUPS))
+    parser.add_argument('--output', help='Results JSON path (default: benchmarks/results/<time>_<commit>.json)')
+    parser.add_argument('--compare', help='Previous results JSON to compare with')
+    args = parser.parse_args(argv)
+
+    sizes = [size for size in args.sizes.split(',') if size]
+    groups = [group for group in args.only.split(',') if group]
+    for size in sizes:
+        if size not in SIZES:
+            parser.error(f"unknown size {size}")
+    for group in groups:
+        if group not in GROUPS:
+            parser.error(f"unknown group {group}")
+
+    # Fonts, icons and output directories are relative to the repository root
+    os.chdir(REPO_ROOT)
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        processed = {}
+        if 'csv' in groups or 'sampling' in groups:
+            logs = {(csv_type, size): write_log(os.path.join(tmp, f'{csv_type}_{size}.csv'), csv_type, SIZES[size])
+                    for csv_type in LOG_TYPES for size in sizes}
+            processed = bench_csv(logs, results if 'csv' in groups else [])
+        if 'sampling' in groups:
+            bench_sampling(processed, results)
+    if 'frame' in groups:
+        bench_frame(results)
+    if 'indicator' in groups:
+        bench_indicator(results)
+    if 'video' in groups:
+        bench_video(results)
+
+    commit = git_commit()
+    report = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.utcnow():%Y%m%d_%H%M%S}_{commit or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(results)} results to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 from extensions import db
+import os
 from datetime import datetime, timedelta
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
 import secrets
 import markdown
 import json
@@ -67,11 +69,41 @@ class Project(db.Model):
     video_duration = db.Column(db.Float)  # Duration in seconds
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, error
     error_message = db.Column(db.Text)
-    folder_number = db.Column(db.Integer)  # Field for storing unique folder number
+    folder_number = db.Column(db.Integer, unique=True, index=True)  # Field for storing unique folder number
     processing_started_at = db.Column(db.DateTime)  # When processing started
     processing_completed_at = db.Column(db.DateTime)  # When processing completed
     progress = db.Column(db.Float, default=0)  # Progress percentage from 0 to 100
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the uploaded CSV (StoredFile)
+    has_processed_data = db.Column(db.Boolean, default=False, index=True)  # Processed CSV written by upload
+    has_video = db.Column(db.Boolean, default=False, index=True)  # Video written by the background processor
+    timing_stats = db.Column(db.Text)  # JSON summary of pipeline stage timings (PipelineTimer)
+    trim_start = db.Column(db.Float)  # Trimmed ride start timestamp (None: from the first row)
+    trim_end = db.Column(db.Float)  # Trimmed ride end timestamp (None: to the last row)
+
+    # Active projects of a user, polled by the projects page (/project_statuses)
+    __table_args__ = (db.Index('ix_project_user_status', 'user_id', 'status'),)
+
+    def get_trim_range(self):
+        """(start, end) timestamps the project is trimmed to; None for an open side"""
+        return self.trim_start, self.trim_end
+
+    def get_timing_stats(self):
+        """Return the stored pipeline timing summary as a dictionary"""
+        return json.loads(self.timing_stats) if self.timing_stats else None
+
+    def get_timing_summary_str(self):
+        """Return a one-line stage timing summary (e.g. 'ingest 1.2s, render 40.1s, ...')"""
+        stats = self.get_timing_stats()
+        if not stats:
+            return ''
+        parts = [f"{stage} {seconds:.1f}s" for stage, seconds in stats['stages'].items()]
+        draw = stats['frames'].get('draw')
+        if draw:
+            parts.append(f"draw p50 {draw['p50_ms']:.0f}ms p99 {draw['p99_ms']:.0f}ms")
+        if stats.get('worker_utilization') is not None:
+            parts.append(f"workers {stats['worker_utilization'] * 100:.0f}% busy")
+        return ', '.join(parts)
 
     def days_until_expiry(self):
         """DEPRECATED: Use time_until_expiry instead"""
@@ -113,28 +145,68 @@ class Project(db.Model):
         return f"{minutes}:{seconds:02d}"
 
     @classmethod
-    def get_next_folder_number(cls):
-        """Find the next available folder number"""
-        import os
-        # Get all existing folder numbers from the frames directory
-        existing_folders = set()
+    def highest_folder_number_in_use(cls):
+        """Highest folder number of any project or of a project_N folder left in frames/"""
+        highest = db.session.query(db.func.max(cls.folder_number)).scalar() or 0
         if os.path.exists('frames'):
             for folder in os.listdir('frames'):
                 if folder.startswith('project_') and folder[8:].isdigit():
-                    existing_folders.add(int(folder[8:]))
-
-        # Get all folder numbers from the database
-        db_folders = set(p.folder_number for p in cls.query.all() if p.folder_number is not None)
+                    highest = max(highest, int(folder[8:]))
+        return highest
 
-        # Combine both sets
-        all_used_numbers = existing_folders.union(db_folders)
+    @classmethod
+    def get_next_folder_number(cls):
+        """
+        Allocate the next folder number from the FolderNumberCounter row
+
+        The counter only grows, so the numbers of deleted projects (even the
+        highest one) are never handed out again. Its UPDATE locks the row
+        until the caller commits, so concurrent uploads take turns.
+        """
+        number = db.session.execute(
+            db.update(FolderNumberCounter)
+            .where(FolderNumberCounter.id == 1)
+            .values(last_value=FolderNumberCounter.last_value + 1)
+            .returning(FolderNumberCounter.last_value)
+        ).scalar()
+        if number is None:
+            # Database created without add_folder_counter_migration.py
+            number = cls.highest_folder_number_in_use() + 1
+            db.session.add(FolderNumberCounter(id=1, last_value=number))
+            db.session.flush()
+        return number
+
+    def save_with_folder_number(self, retries=5):
+        """
+        Add the project and commit it with a freshly allocated folder number
+
+        Two first uploads on a database without a counter row may both try
+        to create it; the loser retries and then finds the row.
+        """
+        for attempt in range(retries):
+            try:
+                with db.session.begin_nested():
+                    self.folder_number = self.get_next_folder_number()
+                    db.session.add(self)
+                break
+            except IntegrityError:
+                if attempt == retries - 1:
+                    raise
+        db.session.commit()
 
-        # Find the first available number
-        next_number = 1
-        while next_number in all_used_numbers:
-            next_number += 1
+class FolderNumberCounter(db.Model):
+    """Single row (id 1) holding the last folder number given to a project"""
+    id = db.Column(db.Integer, primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
 
-        return next_number
+class StoredFile(db.Model):
+    """Uploaded CSV content shared by projects, addressed by its SHA-256"""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    csv_type = db.Column(db.String(20), nullable=False)
+    size = db.Column(db.BigInteger)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Projects using this content
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class EmailCampaign(db.Model):
     id = db.Column(db.Integer, primary_key=True)
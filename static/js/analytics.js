@@ -83,22 +83,96 @@ document.addEventListener('DOMContentLoaded', function() {
         return `${day}.${month}.${year} ${hours}:${minutes}:${secs}.${ms}`;
     }
 
+    // Read a chart response: binary typed-array container or JSON
+    function readChartResponse(response) {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (contentType.indexOf('application/octet-stream') !== -1) {
+            return response.arrayBuffer().then(parseBinaryPayload);
+        }
+        return response.json();
+    }
+
+    // Parse the binary container produced by utils/chart_payload.encode_binary
+    function parseBinaryPayload(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+        if (magic !== 'EUCT') {
+            throw new Error(window.gettext('Received invalid data format from server'));
+        }
+        const headerLength = view.getUint32(8, true);
+        const header = JSON.parse(new TextDecoder('utf-8').decode(new Uint8Array(buffer, 12, headerLength)));
+        const dataStart = 12 + headerLength; // Always aligned to 8 bytes by the server
+
+        const arrays = {};
+        header.arrays.forEach(entry => {
+            const ArrayType = entry.dtype === 'int32' ? Int32Array : Float64Array;
+            arrays[entry.name] = new ArrayType(buffer, dataStart + entry.offset, entry.length);
+        });
+
+        const columns = {};
+        Object.keys(arrays).forEach(name => {
+            if (name !== 'timestamp_deltas') columns[name] = arrays[name];
+        });
+
+        const result = Object.assign({}, header.meta || {});
+        result.csv_data = {
+            format: header.format,
+            rows: header.rows,
+            timestamp_start: header.timestamp_start,
+            timestamp_deltas: arrays.timestamp_deltas,
+            columns: columns
+        };
+        return result;
+    }
+
+    // Expand a columnar payload into timestamps, plain value arrays and per-column min/max
+    function unpackColumnarData(payload) {
+        const rows = payload.timestamp_deltas.length;
+        const timestamps = new Array(rows);
+        let elapsedMs = 0;
+        for (let i = 0; i < rows; i++) {
+            elapsedMs += payload.timestamp_deltas[i];
+            timestamps[i] = payload.timestamp_start + elapsedMs / 1000;
+        }
+
+        const columns = {};
+        const stats = {};
+        Object.keys(payload.columns).forEach(name => {
+            const source = payload.columns[name];
+            const values = new Array(rows);
+            let min = Infinity;
+            let max = -Infinity;
+            for (let i = 0; i < rows; i++) {
+                const value = Number.isFinite(source[i]) ? source[i] : 0;
+                values[i] = value;
+                if (value < min) min = value;
+                if (value > max) max = value;
+            }
+            columns[name] = values;
+            stats[name] = rows > 0 ? { min: min, max: max } : { min: 0, max: 0 };
+        });
+
+        return {
+            timestamps: timestamps,
+            columns: columns,
+            stats: stats,
+            minTimestamp: rows > 0 ? timestamps[0] : 0,
+            maxTimestamp: rows > 0 ? timestamps[rows - 1] : 0
+        };
+    }
+
     // Normalize values for adaptive scale
     function normalizeValueForAdaptiveScale(value, columnName) {
         if (!isAdaptiveChart) return value;
         columnName = columnName.toLowerCase();
+        if (!csvData) return value; // No data yet
+        const stats = csvData.stats;
         
-        if (columnName === 'power') {
-            // For power, find the min and max values in current data to calculate dynamic scaling
+        if (columnName === 'power' && stats.power && stats.pwm) {
             // Min power should be 0%, max power should match the max PWM value
-            if (!csvData) return value; // No data yet
-            
-            // Find min power value and max PWM value in current data
-            const powerValues = csvData.map(row => parseFloat(row.power) || 0);
-            const pwmValues = csvData.map(row => parseFloat(row.pwm) || 0);
-            const minPower = Math.min(...powerValues);
-            const maxPower = Math.max(...powerValues);
-            const maxPwm = Math.max(...pwmValues);
+            const minPower = stats.power.min;
+            const maxPower = stats.power.max;
+            const maxPwm = stats.pwm.max;
             
             // Scale from min power to max power, but limit to max PWM value
             if (maxPower === minPower) return 50; // Prevent division by zero, return middle value
@@ -110,16 +184,11 @@ document.addEventListener('DOMContentLoaded', function() {
             return normalizedValue * (maxPwm / 100);
         }
         
-        if (columnName === 'current') {
+        if (columnName === 'current' && stats.current && stats.pwm) {
             // Для тока используем ту же логику нормализации, что и для мощности
-            if (!csvData) return value; // Нет данных
-            
-            // Находим минимальное значение тока и максимальное значение PWM
-            const currentValues = csvData.map(row => parseFloat(row.current) || 0);
-            const pwmValues = csvData.map(row => parseFloat(row.pwm) || 0);
-            const minCurrent = Math.min(...currentValues);
-            const maxCurrent = Math.max(...currentValues);
-            const maxPwm = Math.max(...pwmValues);
+            const minCurrent = stats.current.min;
+            const maxCurrent = stats.current.max;
+            const maxPwm = stats.pwm.max;
             
             // Нормализуем от минимального до максимального, но ограничиваем максимальным PWM
             if (maxCurrent === minCurrent) return 50; // Предотвращаем деление на ноль
@@ -131,17 +200,12 @@ document.addEventListener('DOMContentLoaded', function() {
             return normalizedValue * (maxPwm / 100);
         }
         
-        if (columnName === 'voltage') {
-            // Для напряжения используем новую логику нормализации
-            if (!csvData) return value; // Нет данных
-            
-            // Находим минимальные и максимальные значения напряжения и заряда батареи
-            const voltageValues = csvData.map(row => parseFloat(row.voltage) || 0);
-            const batteryValues = csvData.map(row => parseFloat(row.battery) || 0);
-            const maxVoltage = Math.max(...voltageValues);
-            const minVoltage = Math.min(...voltageValues);
-            const maxBattery = Math.max(...batteryValues);
-            const minBattery = Math.min(...batteryValues);
+        if (columnName === 'voltage' && stats.voltage && stats.battery) {
+            // Минимальные и максимальные значения напряжения и заряда батареи
+            const maxVoltage = stats.voltage.max;
+            const minVoltage = stats.voltage.min;
+            const maxBattery = stats.battery.max;
+            const minBattery = stats.battery.min;
             
             // Если нет разницы между мин. и макс. напряжением, возвращаем среднее значение батареи
             if (maxVoltage === minVoltage) return (minBattery + maxBattery) / 2;
@@ -184,8 +248,8 @@ document.addEventListener('DOMContentLoaded', function() {
     function createMultiChart(labels, datasets) {
         if (chartInstance) chartInstance.destroy(); // Destroy old chart if it exists
         const ctx = dataChart.getContext('2d');
-        const minTimestamp = Math.min(...labels); // Minimum X-axis value
-        const maxTimestamp = Math.max(...labels); // Maximum X-axis value
+        const minTimestamp = csvData.minTimestamp; // Minimum X-axis value
+        const maxTimestamp = csvData.maxTimestamp; // Maximum X-axis value
         const fullRange = maxTimestamp - minTimestamp; // Full X-axis length
 
         chartInstance = new Chart(ctx, {
@@ -339,19 +403,16 @@ document.addEventListener('DOMContentLoaded', function() {
     // Function to plot chart based on all data columns
     function plotAllColumns(data) {
         if (!data) return;
-        const timestamps = data.map(row => row.timestamp); // Extract timestamps
-        const columns = Object.keys(data[0]).filter(col => col.toLowerCase() !== 'timestamp' && data.some(row => !isNaN(parseFloat(row[col]))));
-        const datasets = columns.map((column) => {
-            const originalValues = data.map(row => parseFloat(row[column]) || 0); // Original values
-            const normalizedValues = originalValues.map(value => normalizeValueForAdaptiveScale(value, column)); // Normalized values
+        const datasets = Object.keys(data.columns).map((column) => {
+            const originalValues = data.columns[column]; // Original values
             return {
                 originalColumn: column, // Store original technical column name
                 label: window.gettext(column),
-                data: isAdaptiveChart ? normalizedValues : originalValues, // Select data based on mode
+                data: isAdaptiveChart ? originalValues.map(value => normalizeValueForAdaptiveScale(value, column)) : originalValues,
                 originalData: originalValues // Save original data for tooltips
             };
         });
-        createMultiChart(timestamps, datasets); // Create chart
+        createMultiChart(data.timestamps, datasets); // Create chart
         setupManualPanning(); // Setup manual panning
     }
 
@@ -414,8 +475,8 @@ document.addEventListener('DOMContentLoaded', function() {
         resetZoomButton.addEventListener('click', function() {
             if (chartInstance) {
                 // Get original minimum and maximum timestamps
-                const minTimestamp = Math.min(...chartInstance.data.labels);
-                const maxTimestamp = Math.max(...chartInstance.data.labels);
+                const minTimestamp = csvData.minTimestamp;
+                const maxTimestamp = csvData.maxTimestamp;
                 
                 // Reset chart boundaries
                 chartInstance.options.scales.x.min = minTimestamp;
@@ -434,13 +495,15 @@ document.addEventListener('DOMContentLoaded', function() {
             loadingIndicator.style.display = 'block';
             
             // Fetch CSV data
-            fetch(`/analyze_csv?file=${encodeURIComponent(fileParam)}`)
+            fetch(`/analyze_csv?file=${encodeURIComponent(fileParam)}`, {
+                headers: { 'Accept': 'application/octet-stream, application/json' }
+            })
                 .then(response => {
                     if (!response.ok) {
                         showError(window.gettext('Could not load the specified file'));
                         return null;
                     }
-                    return response.json();
+                    return readChartResponse(response);
                 })
                 .then(data => {
                     if (data && data.success && data.csv_data) {
@@ -448,8 +511,8 @@ document.addEventListener('DOMContentLoaded', function() {
                         loadingIndicator.style.display = 'none';
                         analysisResults.style.display = 'block';
                         
-                        // Parse data and create chart
-                        csvData = JSON.parse(data.csv_data);
+                        // Unpack columnar data and create chart
+                        csvData = unpackColumnarData(data.csv_data);
                         
                         // Display achievements if available
                         if (data.achievements) {
@@ -484,6 +547,8 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         formData.append('file', file);
+        // Ask for about two points per horizontal pixel of the chart
+        formData.append('points', Math.max(500, Math.min(4000, Math.round((dataChart.parentElement.clientWidth || 1000) * 2))));
         
         // Show loading indicator
         loadingIndicator.style.display = 'block';
@@ -492,6 +557,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Send request to the server
         fetch('/analyze_csv', {
             method: 'POST',
+            headers: { 'Accept': 'application/octet-stream, application/json' },
             body: formData
         })
         .then(response => {
@@ -500,13 +566,13 @@ document.addEventListener('DOMContentLoaded', function() {
                     throw new Error(err.error || 'Server error');
                 });
             }
-            return response.json();
+            return readChartResponse(response);
         })
         .then(data => {
-            // Parse JSON data from the server
+            // Unpack columnar data from the server
             if (data && data.success && data.csv_data) {
                 try {
-                    csvData = JSON.parse(data.csv_data);
+                    csvData = unpackColumnarData(data.csv_data);
                     
                     // Hide loading, show results
                     loadingIndicator.style.display = "none";
@@ -548,6 +614,133 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Season statistics across several logs
+    const batchForm = document.getElementById('batchForm');
+    const batchFilesInput = document.getElementById('batchFiles');
+    const batchResults = document.getElementById('batchResults');
+
+    function formatRideDate(timestamp) {
+        return timestamp ? new Date(timestamp * 1000).toLocaleDateString() : '-';
+    }
+
+    function appendCells(row, values) {
+        values.forEach(value => {
+            const cell = document.createElement('td');
+            cell.textContent = value;
+            row.appendChild(cell);
+        });
+    }
+
+    function displayBatchResults(data) {
+        const summary = data.summary;
+        const summaryContainer = document.getElementById('batchSummary');
+        summaryContainer.innerHTML = '';
+        if (summary) {
+            [
+                [window.gettext('Rides'), summary.ride_count],
+                [window.gettext('Max speed'), Math.round(summary.max_speed)],
+                [window.gettext('Best day distance'), `${Math.round(summary.best_day.distance)} (${summary.best_day.date || '-'})`],
+                [window.gettext('Total distance'), Math.round(summary.total_distance)]
+            ].forEach(([label, value]) => {
+                const col = document.createElement('div');
+                col.className = 'col-6 col-md-3';
+                const valueEl = document.createElement('div');
+                valueEl.className = 'fs-4 fw-bold';
+                valueEl.textContent = value;
+                const labelEl = document.createElement('div');
+                labelEl.className = 'small text-muted';
+                labelEl.textContent = label;
+                col.appendChild(valueEl);
+                col.appendChild(labelEl);
+                summaryContainer.appendChild(col);
+            });
+        }
+
+        const achievementsBody = document.getElementById('batchAchievements');
+        achievementsBody.innerHTML = '';
+        data.achievements.forEach(achievement => {
+            const row = document.createElement('tr');
+            appendCells(row, [achievement.title, formatRideDate(achievement.unlocked_at), achievement.rides]);
+            achievementsBody.appendChild(row);
+        });
+
+        const ridesBody = document.getElementById('batchRides');
+        ridesBody.innerHTML = '';
+        data.rides.forEach(ride => {
+            const row = document.createElement('tr');
+            if (ride.error) {
+                appendCells(row, [ride.name, window.gettext('Error processing CSV file: ') + ride.error, '', '']);
+            } else {
+                appendCells(row, [ride.name, formatRideDate(ride.start_timestamp),
+                                  Math.round(ride.analytics_vars.max_speed),
+                                  Math.round(ride.analytics_vars.max_daily_distance)]);
+            }
+            ridesBody.appendChild(row);
+        });
+
+        batchResults.style.display = 'block';
+    }
+
+    const BATCH_POLL_INTERVAL_MS = 1000;
+
+    function readBatchResponse(response) {
+        return response.json().then(data => {
+            if (!response.ok) {
+                throw new Error(data.error || 'Server error');
+            }
+            return data;
+        });
+    }
+
+    // The batch runs as a background task; poll until its report is ready
+    function waitForBatch(taskId) {
+        return new Promise((resolve, reject) => {
+            function poll() {
+                fetch(`/analyze_csv_batch/${taskId}`)
+                    .then(readBatchResponse)
+                    .then(data => {
+                        if (data.status === 'completed') {
+                            resolve(data);
+                        } else if (data.status === 'failed') {
+                            reject(new Error(data.error));
+                        } else {
+                            setTimeout(poll, BATCH_POLL_INTERVAL_MS);
+                        }
+                    })
+                    .catch(reject);
+            }
+            poll();
+        });
+    }
+
+    batchForm.addEventListener('submit', function(e) {
+        e.preventDefault();
+        hideError();
+
+        if (!batchFilesInput.files.length) {
+            showError(window.gettext('Please select a CSV file'));
+            return;
+        }
+
+        const formData = new FormData();
+        Array.from(batchFilesInput.files).forEach(file => formData.append('files', file));
+
+        loadingIndicator.style.display = 'block';
+        batchResults.style.display = 'none';
+
+        fetch('/analyze_csv_batch', { method: 'POST', body: formData })
+            .then(readBatchResponse)
+            .then(data => waitForBatch(data.task_id))
+            .then(displayBatchResults)
+            .catch(error => {
+                showError(error.message || window.gettext('An error occurred while processing the file'));
+                console.error('Error:', error);
+            })
+            .finally(() => {
+                loadingIndicator.style.display = 'none';
+            });
+    });
+
     // Process URL parameters on page load
     processUrlParams();
 });
@@ -38,49 +38,79 @@ function deleteProject(projectId) {
     }
 }
 
-function updateProjectStatuses() {
-    // Find all project status badges
-    document.querySelectorAll('[data-project-status]').forEach(statusBadge => {
-        const projectId = statusBadge.dataset.projectId;
-        const currentStatus = statusBadge.dataset.projectStatus;
+// ETag of the last /project_statuses response, sent back so the server can
+// hold the request until a status changes
+let projectStatusesEtag = null;
 
-        // Only check status for processing projects
-        if (currentStatus === 'processing' || currentStatus === 'pending') {
-            fetch(`/project_status/${projectId}`)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.status !== currentStatus) {
-                        // Update the badge class and text based on new status
-                        statusBadge.className = 'badge text-bg-' + 
-                            (data.status === 'completed' ? 'success' : 
-                             data.status === 'processing' ? 'warning' : 
-                             data.status === 'error' ? 'danger' : 
-                             data.status === 'stopped' ? 'secondary' : 'secondary');
+function applyProjectStatus(statusBadge, data) {
+    const currentStatus = statusBadge.dataset.projectStatus;
+    if (data.status !== currentStatus) {
+        // Update the badge class and text based on new status
+        statusBadge.className = 'badge text-bg-' + 
+            (data.status === 'completed' ? 'success' : 
+             data.status === 'processing' ? 'warning' : 
+             data.status === 'error' ? 'danger' : 
+             data.status === 'stopped' ? 'secondary' : 'secondary');
 
-                        // Use translated status with first letter capitalized
-                        statusBadge.textContent = gettext(data.status.charAt(0).toUpperCase() + data.status.slice(1));
-                        statusBadge.dataset.projectStatus = data.status;
+        // Use translated status with first letter capitalized
+        statusBadge.textContent = gettext(data.status.charAt(0).toUpperCase() + data.status.slice(1));
+        statusBadge.dataset.projectStatus = data.status;
 
-                        // If project completed or errored, add/update error message tooltip
-                        if ((data.status === 'error' || data.status === 'stopped') && data.error_message) {
-                            statusBadge.title = data.error_message;
-                        }
+        // If project completed or errored, add/update error message tooltip
+        if ((data.status === 'error' || data.status === 'stopped') && data.error_message) {
+            statusBadge.title = data.error_message;
+        }
 
-                        // Refresh the page if status changed to completed to show new download buttons
-                        if (data.status === 'completed') {
-                            setTimeout(() => location.reload(), 1000);
-                        }
-                    }
+        // Refresh the page if status changed to completed to show new download buttons
+        if (data.status === 'completed') {
+            setTimeout(() => location.reload(), 1000);
+        }
+    }
+
+    // Update progress if processing
+    if (data.status === 'processing' && data.progress !== undefined) {
+        statusBadge.textContent = `${gettext(data.status.charAt(0).toUpperCase() + data.status.slice(1))} (${Math.round(data.progress)}%)`;
+    }
+}
+
+function updateProjectStatuses() {
+    // Only check status for processing projects
+    const badges = Array.from(document.querySelectorAll('[data-project-status]')).filter(statusBadge =>
+        statusBadge.dataset.projectStatus === 'processing' || statusBadge.dataset.projectStatus === 'pending');
+    if (badges.length === 0) {
+        return;
+    }
 
-                    // Update progress if processing
-                    if (data.status === 'processing' && data.progress !== undefined) {
-                        statusBadge.textContent = `${gettext(data.status.charAt(0).toUpperCase() + data.status.slice(1))} (${Math.round(data.progress)}%)`;
+    // One request for all rows; the server answers when something changed
+    // (or with 304 after 25 seconds)
+    const ids = badges.map(statusBadge => statusBadge.dataset.projectId).join(',');
+    const headers = projectStatusesEtag ? {'If-None-Match': projectStatusesEtag} : {};
+    fetch(`/project_statuses?ids=${ids}&wait=25`, {headers: headers, cache: 'no-store'})
+        .then(response => {
+            if (response.status === 304) {
+                return null;
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            projectStatusesEtag = response.headers.get('ETag');
+            return response.json();
+        })
+        .then(data => {
+            if (data) {
+                badges.forEach(statusBadge => {
+                    const status = data.projects[statusBadge.dataset.projectId];
+                    if (status) {
+                        applyProjectStatus(statusBadge, status);
                     }
-                })
-                .catch(error => console.error('Error updating status:', error));
-        }
-    });
+                });
+            }
+            setTimeout(updateProjectStatuses, 0);
+        })
+        .catch(error => {
+            console.error('Error updating status:', error);
+            setTimeout(updateProjectStatuses, 5000);
+        });
 }
 
-// Start periodic status updates every 2 seconds
-setInterval(updateProjectStatuses, 2000);
\ No newline at end of file
+updateProjectStatuses();
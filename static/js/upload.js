@@ -495,11 +495,18 @@ function createSpeedChart(timestamps, speedValues, pwmValues) {
     return speedChart;
 }
 
+// Number of chart points to request from the server (about two per horizontal pixel)
+function getChartPointCount(canvasId) {
+    const canvas = document.getElementById(canvasId);
+    const width = canvas && canvas.parentElement ? canvas.parentElement.clientWidth : 0;
+    return Math.max(500, Math.min(4000, Math.round((width || 1000) * 2)));
+}
+
 // Function to initialize CSV trimmer after upload
 function initCsvTrimmer(projectId) {
     console.log('Initializing CSV trimmer for project ID:', projectId);
     
-    fetch(`/get_csv_timerange/${projectId}`)
+    fetch(`/get_csv_timerange/${projectId}?points=${getChartPointCount('speed-chart')}`)
         .then(response => {
             console.log('CSV timerange response status:', response.status);
             return response.json();
@@ -515,8 +522,8 @@ function initCsvTrimmer(projectId) {
             // Store time range data
             csvTimeRange.min = data.min_timestamp;
             csvTimeRange.max = data.max_timestamp;
-            csvTimeRange.start = data.min_timestamp;
-            csvTimeRange.end = data.max_timestamp;
+            csvTimeRange.start = data.trim_start;
+            csvTimeRange.end = data.trim_end;
             csvTimeRange.totalRows = data.total_rows;
             
             // Update UI elements
@@ -670,6 +677,14 @@ function setupTrimmerHandlers() {
         currentHandle = null;
     });
     
+    // Undo trim: select the whole ride and apply it
+    document.getElementById('resetTrimButton').addEventListener('click', function() {
+        csvTimeRange.start = csvTimeRange.min;
+        csvTimeRange.end = csvTimeRange.max;
+        updateTrimmerUI();
+        document.getElementById('trimCsvButton').click();
+    });
+    
     // Add trim button handler
     document.getElementById('trimCsvButton').addEventListener('click', function() {
         const projectId = document.getElementById('startProcessButton').dataset.projectId;
@@ -711,7 +726,8 @@ function setupTrimmerHandlers() {
             icon_vertical_offset: document.getElementById('iconVerticalOffset').value,
             icon_horizontal_spacing: document.getElementById('iconHorizontalSpacing').value,
             start_timestamp: csvTimeRange.start,
-            end_timestamp: csvTimeRange.end
+            end_timestamp: csvTimeRange.end,
+            points: getChartPointCount('speed-chart')
         };
         
         // Send request to trim CSV
@@ -729,8 +745,8 @@ function setupTrimmerHandlers() {
             // Update time range data
             csvTimeRange.min = data.min_timestamp;
             csvTimeRange.max = data.max_timestamp;
-            csvTimeRange.start = data.min_timestamp;
-            csvTimeRange.end = data.max_timestamp;
+            csvTimeRange.start = data.trim_start;
+            csvTimeRange.end = data.trim_end;
             csvTimeRange.totalRows = data.total_rows;
             
             // Update UI elements
@@ -1242,15 +1258,19 @@ document.getElementById('startProcessButton').addEventListener('click', async fu
                     switch(statusData.status) {
                         case 'processing':
                             const progress = statusData.progress || 0;
-                            progressTitle.textContent = progress <= 50 ? 
-                                gettext('Creating frames...') : 
-                                gettext('Encoding video...');
+                            // Frames and video segments can be in progress at the same time;
+                            // the server reports the stage that paces the job
+                            const encoding = statusData.stage ? statusData.stage === 'video' : progress > 50;
+                            progressTitle.textContent = encoding ? 
+                                gettext('Encoding video...') : 
+                                gettext('Creating frames...');
                             progressBar.style.width = `${progress}%`;
                             progressBar.textContent = `${progress.toFixed(1)}%`;
                             // Show processing stage below the main message
                             videoProcessingInfo.textContent = gettext('You can close your browser and come back later - the video processing will continue in the background.') + ' ' +
                                 gettext('Alternatively, you can go to the Projects section to monitor the progress there.');
-                            setTimeout(checkStatus, progress <= 50 ? 200 : 1000);
+                            // The server suggests the next poll from the job's frame rate
+                            setTimeout(checkStatus, statusData.retry_after_ms || 1000);
                             break;
 
                         case 'completed':
@@ -1266,7 +1286,7 @@ document.getElementById('startProcessButton').addEventListener('click', async fu
                         case 'pending':
                             progressTitle.textContent = gettext('Waiting to start...');
                             videoProcessingInfo.textContent = gettext('You can close your browser and come back later - the video processing will continue in the background.');
-                            setTimeout(checkStatus, 500);
+                            setTimeout(checkStatus, statusData.retry_after_ms || 500);
                             break;
 
                         case 'error':
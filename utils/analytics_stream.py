@@ -0,0 +1,359 @@
+"""
+Streaming CSV analytics for the analytics page.
+
+Uploaded ride logs are parsed straight from the request stream in chunks.
+Every chunk is standardized by csv_processor.CSVStandardizer, the same code
+process_csv_file() runs on whole files (timestamps, interpolation, integer
+cleaning, mileage offset, consecutive duplicate removal), and folded into
+running achievement metrics; then only the compact standardized columns are
+kept for the chart. Raw rows are discarded as soon as a chunk is processed, and
+the retained columns are thinned with min/max decimation once they grow
+past MAX_RETAINED_ROWS, so memory stays bounded for any file size.
+"""
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utils.csv_processor import (CSVStandardizer, DUPLICATE_CHECK_COLUMNS as METRIC_COLUMNS,
+                                 detect_csv_type, wall_clock_days)
+from utils.downsampling import minmax_indices
+from utils.telemetry import Telemetry
+
+ANALYTICS_CHUNK_ROWS = 100000
+
+# Upper bound of standardized rows kept in memory for charting
+MAX_RETAINED_ROWS = 1000000
+
+# Loose format check used when detect_csv_type() rejects a file
+DARKNESS_BOT_COLUMNS = {'Date', 'Speed', 'GPS Speed', 'Voltage', 'Temperature',
+                        'Current', 'Battery level', 'Total mileage', 'PWM', 'Power'}
+WHEELLOG_CORE_COLUMNS = {'date', 'speed', 'voltage', 'system_temp',
+                         'current', 'battery_level', 'totaldistance', 'pwm', 'power'}
+
+
+class InvalidCSVFormat(ValueError):
+    """Raised when an uploaded file is neither a DarknessBot nor a WheelLog log"""
+
+
+def detect_stream_csv_type(df):
+    """Detect the CSV type from the first chunk of a stream"""
+    try:
+        return detect_csv_type(df)
+    except ValueError:
+        columns = set(df.columns)
+        if len(DARKNESS_BOT_COLUMNS & columns) >= len(DARKNESS_BOT_COLUMNS) * 0.8:
+            return 'darnkessbot'
+        if len(WHEELLOG_CORE_COLUMNS & columns) >= len(WHEELLOG_CORE_COLUMNS) * 0.9:
+            return 'wheellog'
+        raise InvalidCSVFormat("CSV format not recognized")
+
+
+class RideMetrics:
+    """
+    Achievement variables computed incrementally over standardized rows
+
+    Produces the same variables the achievement formulas use: max_speed,
+    max_daily_distance, max_power, min_power, avg_speed_diff,
+    pwm_100_survived, pwm_100_dead and dead_condition_met. Rows must be fed
+    in file order.
+    """
+
+    def __init__(self):
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.max_speed = 0
+        self.max_power = None
+        self.min_power = None
+        self.daily_mileage = {}  # Local day (see wall_clock_days()) -> [min mileage, max mileage]
+        self.speed_diff_sum = 0.0
+        self.speed_diff_count = 0
+
+        # Last 100% PWM moment and the lowest speed in the 10 seconds after it
+        self.last_pwm_100_timestamp = None
+        self.min_speed_after_pwm_100 = np.inf
+
+        # Dead condition: open high speed period and periods awaiting a PWM drop
+        self.dead_condition_met = False
+        self._open_period = None
+        self._pending_periods = []
+
+    def update(self, timestamps, columns):
+        """Fold a chunk of standardized rows into the running metrics"""
+        if len(timestamps) == 0:
+            return
+
+        speed = columns['speed']
+        pwm = columns['pwm']
+
+        if self.first_timestamp is None:
+            self.first_timestamp = float(timestamps[0])
+        self.last_timestamp = float(timestamps[-1])
+
+        self.max_speed = max(self.max_speed, float(speed.max()))
+
+        power = columns['power']
+        chunk_max, chunk_min = float(power.max()), float(power.min())
+        self.max_power = chunk_max if self.max_power is None else max(self.max_power, chunk_max)
+        self.min_power = chunk_min if self.min_power is None else min(self.min_power, chunk_min)
+
+        days = pd.Series(columns['mileage']).groupby(wall_clock_days(timestamps))
+        bounds_by_day = days.agg(['min', 'max'])
+        for day, lo, hi in bounds_by_day.itertuples():
+            bounds = self.daily_mileage.setdefault(int(day), [lo, hi])
+            bounds[0] = min(bounds[0], lo)
+            bounds[1] = max(bounds[1], hi)
+
+        gps = columns['gps']
+        has_gps = gps > 0
+        self.speed_diff_sum += float(np.abs(speed[has_gps] - gps[has_gps]).sum())
+        self.speed_diff_count += int(has_gps.sum())
+
+        self._update_pwm_100(timestamps, speed, pwm)
+        if not self.dead_condition_met:
+            self._update_dead_condition(timestamps, speed, pwm)
+
+    def _update_pwm_100(self, timestamps, speed, pwm):
+        max_pwm = np.flatnonzero(pwm >= 100)
+        if len(max_pwm):
+            last = max_pwm[-1]
+            self.last_pwm_100_timestamp = float(timestamps[last])
+            self.min_speed_after_pwm_100 = np.inf
+            timestamps, speed = timestamps[last + 1:], speed[last + 1:]
+
+        if self.last_pwm_100_timestamp is not None:
+            start = self.last_pwm_100_timestamp
+            window = (timestamps > start) & (timestamps <= start + 10)
+            if window.any():
+                self.min_speed_after_pwm_100 = min(self.min_speed_after_pwm_100,
+                                                   float(speed[window].min()))
+
+    def _close_period(self, period):
+        start, end, has_pwm_100 = period
+        if end - start >= 3 and has_pwm_100:
+            logging.debug(f"Found high speed period: {start} to {end}")
+            self._pending_periods.append({'end': end, 'pwm_zero': None})
+
+    def _update_dead_condition(self, timestamps, speed, pwm):
+        n = len(timestamps)
+
+        # Periods of speed > 30 km/h with PWM = 100 somewhere inside, lasting 3+ seconds
+        high = np.concatenate(([False], speed > 30, [False])).astype(np.int8)
+        edges = np.diff(high)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+
+        if self._open_period is not None and (len(starts) == 0 or starts[0] != 0):
+            self._close_period(self._open_period)
+            self._open_period = None
+
+        for start, end in zip(starts, ends):
+            period = [float(timestamps[start]), float(timestamps[end - 1]),
+                      bool((pwm[start:end] == 100).any())]
+            if start == 0 and self._open_period is not None:
+                period[0] = self._open_period[0]
+                period[2] = period[2] or self._open_period[2]
+                self._open_period = None
+            if end == n:
+                # The period may continue in the next chunk
+                self._open_period = period
+            else:
+                self._close_period(period)
+
+        # After a period: PWM = 0 within 5 seconds, then PWM < 3 for 5 more seconds
+        last_timestamp = timestamps[-1]
+        remaining = []
+        for check in self._pending_periods:
+            if check['pwm_zero'] is None:
+                end = check['end']
+                zero = np.flatnonzero((timestamps > end) & (timestamps <= end + 5) & (pwm == 0))
+                if len(zero):
+                    check['pwm_zero'] = float(timestamps[zero[0]])
+                elif last_timestamp > end + 5:
+                    continue
+                else:
+                    remaining.append(check)
+                    continue
+
+            zero_timestamp = check['pwm_zero']
+            window = (timestamps > zero_timestamp) & (timestamps <= zero_timestamp + 5)
+            if (pwm[window] >= 3).any():
+                continue
+            if last_timestamp > zero_timestamp + 5:
+                self.dead_condition_met = True
+                self._pending_periods = []
+                return
+            remaining.append(check)
+        self._pending_periods = remaining
+
+    def daily_distances(self):
+        """Distance per calendar day of the log in server time ('YYYY-MM-DD' -> mileage units)"""
+        return {datetime.fromtimestamp(day * 86400, timezone.utc).strftime('%Y-%m-%d'): float(hi - lo)
+                for day, (lo, hi) in sorted(self.daily_mileage.items())}
+
+    def finish(self):
+        """Return the achievement variables for the whole ride"""
+        if not self.dead_condition_met:
+            if self._open_period is not None:
+                self._close_period(self._open_period)
+                self._open_period = None
+            # A PWM drop that stays low until the end of the log counts as well
+            self.dead_condition_met = any(check['pwm_zero'] is not None
+                                          for check in self._pending_periods)
+
+        if self.last_pwm_100_timestamp is None:
+            pwm_100_survived = pwm_100_dead = False
+        else:
+            pwm_100_survived = not self.min_speed_after_pwm_100 < 5
+            pwm_100_dead = self.min_speed_after_pwm_100 < 2
+
+        return {
+            'max_speed': float(self.max_speed),
+            'max_daily_distance': max(self.daily_distances().values(), default=0),
+            'max_power': float(self.max_power or 0),
+            'min_power': float(self.min_power or 0),
+            'avg_speed_diff': (self.speed_diff_sum / self.speed_diff_count
+                               if self.speed_diff_count else 0),
+            'pwm_100_survived': pwm_100_survived,
+            'pwm_100_dead': pwm_100_dead,
+            'dead_condition_met': self.dead_condition_met
+        }
+
+
+class StreamingCSVAnalyzer:
+    """
+    Standardizes CSV chunks and keeps compact chart columns plus ride metrics
+
+    Usage:
+        analyzer = StreamingCSVAnalyzer()
+        for chunk in pd.read_csv(stream, chunksize=ANALYTICS_CHUNK_ROWS):
+            analyzer.feed(chunk)
+        csv_type, processed_data, analytics_vars = analyzer.finish()
+
+    Rows are standardized by CSVStandardizer exactly as process_csv_file()
+    does, and do not depend on the chunk size.
+    """
+
+    def __init__(self, interpolate_values=True, max_rows=MAX_RETAINED_ROWS,
+                 max_deferred_rows=ANALYTICS_CHUNK_ROWS, keep_rows=True):
+        self.interpolate_values = interpolate_values
+        self.keep_rows = keep_rows
+        self.max_rows = max_rows
+        self.max_deferred_rows = max_deferred_rows
+        self.csv_type = None
+        self.metrics = RideMetrics()
+        self.rows_read = 0
+
+        self._standardizer = None
+        self._timestamps = []
+        self._values = []
+        self._retained = 0
+
+    def feed(self, chunk):
+        """Process one chunk of raw CSV rows"""
+        if self.csv_type is None:
+            self.csv_type = detect_stream_csv_type(chunk)
+            logging.info(f"Detected CSV type: {self.csv_type}")
+            self._standardizer = CSVStandardizer(self.csv_type, self.interpolate_values,
+                                                 self.max_deferred_rows)
+        self.rows_read += len(chunk)
+        self._process(*self._standardizer.feed(chunk))
+
+    def _process(self, timestamps, values):
+        if len(timestamps) == 0:
+            return
+
+        self.metrics.update(timestamps, {col: values[:, i] for i, col in enumerate(METRIC_COLUMNS)})
+        if not self.keep_rows:
+            return
+
+        self._timestamps.append(timestamps)
+        self._values.append(values.astype(np.float32))
+        self._retained += len(timestamps)
+        if self._retained > self.max_rows:
+            self._compact()
+
+    def _compact(self):
+        """Thin retained rows with min/max decimation so peaks survive"""
+        timestamps = np.concatenate(self._timestamps)
+        values = np.concatenate(self._values)
+        indices = minmax_indices([values[:, i] for i in range(values.shape[1])], self.max_rows // 2)
+        logging.info(f"Compacted analytics rows from {len(timestamps)} to {len(indices)}")
+        self._timestamps = [timestamps[indices]]
+        self._values = [values[indices]]
+        self._retained = len(indices)
+
+    def finish(self):
+        """
+        Returns:
+            tuple: (csv_type, processed_data, analytics_vars) where processed_data
+            is a Telemetry like process_csv_file() output
+        """
+        if self.csv_type is None:
+            raise InvalidCSVFormat("CSV file is empty")
+
+        self._process(*self._standardizer.finish())
+
+        timestamps = np.concatenate(self._timestamps) if self._timestamps else np.zeros(0)
+        values = (np.concatenate(self._values) if self._values
+                  else np.zeros((0, len(METRIC_COLUMNS)), dtype=np.float32))
+
+        columns = {'timestamp': timestamps}
+        for i, col in enumerate(METRIC_COLUMNS):
+            columns[col] = values[:, i]
+        processed_data = Telemetry(columns)
+
+        csv_type = 'darnkessbot' if self.csv_type == 'processed' else self.csv_type
+        logging.info(f"Streamed {self.rows_read} CSV rows, kept {len(timestamps)} for charts")
+        return csv_type, processed_data, self.metrics.finish()
+
+
+def _stream_into_analyzer(stream, chunk_rows, **options):
+    """Feed a binary CSV stream into a new analyzer, retrying latin-1 on decode errors"""
+    for encoding in ('utf-8', 'latin1'):
+        analyzer = StreamingCSVAnalyzer(**options)
+        try:
+            for chunk in pd.read_csv(stream, chunksize=chunk_rows, encoding=encoding):
+                analyzer.feed(chunk)
+            return analyzer
+        except UnicodeDecodeError:
+            if encoding == 'latin1' or not stream.seekable():
+                raise
+            logging.info("CSV stream is not UTF-8, retrying with latin-1")
+            stream.seek(0)
+
+
+def analyze_csv_stream(stream, chunk_rows=ANALYTICS_CHUNK_ROWS, interpolate_values=True):
+    """
+    Analyze a CSV file from a binary stream without saving it to disk
+
+    Tries UTF-8 first and falls back to latin-1 (the stream must be seekable
+    for the fallback, which uploaded files are).
+
+    Returns:
+        tuple: (csv_type, processed_data, analytics_vars)
+    """
+    analyzer = _stream_into_analyzer(stream, chunk_rows, interpolate_values=interpolate_values)
+    return analyzer.finish()
+
+
+def summarize_csv_stream(stream, chunk_rows=ANALYTICS_CHUNK_ROWS):
+    """
+    Ride summary for batch analytics; no chart rows are kept
+
+    Returns:
+        dict: csv_type, rows, start/end timestamps, analytics_vars and
+        daily_distances ('YYYY-MM-DD' -> distance). Plain JSON types only.
+    """
+    analyzer = _stream_into_analyzer(stream, chunk_rows, keep_rows=False)
+    csv_type, _, analytics_vars = analyzer.finish()
+    return {
+        'csv_type': csv_type,
+        'rows': int(analyzer.rows_read),
+        'start_timestamp': analyzer.metrics.first_timestamp,
+        'end_timestamp': analyzer.metrics.last_timestamp,
+        'analytics_vars': {key: (bool(value) if isinstance(value, (bool, np.bool_)) else float(value))
+                           for key, value in analytics_vars.items()},
+        'daily_distances': analyzer.metrics.daily_distances()
+    }
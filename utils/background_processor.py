@@ -1,30 +1,70 @@
 import threading
 import logging
+import json
 import shutil
 from datetime import datetime
 import os
 import signal
 import psutil
 import time
+from utils.system_metrics import job_rates
+from utils.pipeline_timing import PipelineTimer, profile_job
+from utils.project_status import status_versions, status_snapshots
+
+# Encode video segments while frames are still rendering (see PipelinedVideoEncoder)
+PIPELINED_ENCODING = os.environ.get('PIPELINED_ENCODING', '1') == '1'
 
 # Dictionary to store running process information
 running_processes = {}
 stop_flags = {}
 
-def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', text_settings=None, interpolate_values=True, locale='en'):
-    """Process project in background thread"""
+def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', text_settings=None, interpolate_values=True, locale='en', profile=None):
+    """
+    Process project in background thread
+
+    Stage timings are stored in Project.timing_stats. profile may be
+    'cprofile' or 'pyinstrument' to also write a profile of the job.
+    """
     from app import app, db
     from models import Project
     from utils.csv_processor import process_csv_file
     from utils.image_generator import generate_frames
-    from utils.video_creator import create_video
-    from utils.hardware_detection import get_hardware_info
+    from utils.video_creator import create_video, PipelinedVideoEncoder
+    from utils.hardware_detection import get_hardware_info, is_alpha_codec
 
     stop_flags[project_id] = False
     project_text_settings = text_settings if text_settings is not None else {}
+    timer = PipelineTimer()
 
     def _process():
+        with profile_job(project_id, profile):
+            _run()
+        _save_timing()
+
+    def _save_timing():
+        try:
+            summary = timer.summary()
+            logging.info(f"Timing for project {project_id}: {summary['stages']}")
+            with app.app_context():
+                project = db.session.get(Project, project_id)
+                if project:
+                    project.timing_stats = json.dumps(summary)
+                    db.session.commit()
+        except Exception as e:
+            logging.error(f"Error saving timing for project {project_id}: {e}")
+
+    def _run():
         folder_number = None
+        encoder = None
+        user_id = None
+
+        def notify_status():
+            # The job has ended: status reads go to the database again, and
+            # long-polling /project_statuses requests of the owner wake up
+            status_snapshots.discard(project_id)
+            if user_id is not None:
+                status_versions.notify(user_id)
+
         try:
             logging.info(f"Starting processing for project {project_id}")
 
@@ -36,6 +76,8 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
                     return
 
                 folder_number = project.folder_number
+                user_id = project.user_id
+                trim_range = project.get_trim_range()
                 csv_file = os.path.join('uploads', project.csv_file)
 
                 hardware_info = get_hardware_info()
@@ -49,15 +91,20 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
                 project.processing_started_at = datetime.now()
                 project.progress = 0
                 db.session.commit()
+                status_snapshots.publish(project, stage='frames')
 
             running_processes[project_id] = {
                 'pid': os.getpid(),
                 'stage': 'frames'
             }
 
-            def update_progress(current, total, stage='frames'):
+            stage_done = {'frames': 0.0, 'video': 0.0}
+            progress_lock = threading.Lock()
+
+            def update_progress(current, total, stage='frames', rate=None):
                 if stop_flags.get(project_id, False):
                     raise InterruptedError("Processing was stopped by user")
+                job_rates.update(project_id, stage, current, rate)
 
                 try:
                     with app.app_context():
@@ -65,13 +112,14 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
                         if project and project.status == 'stopped':
                             raise InterruptedError("Processing was stopped by user")
                         if project:
-                            # Для стадии frames прогресс идёт от 0 до 50%
-                            # Для video прогресс идёт от 50 до 100%
-                            base_progress = 0 if stage == 'frames' else 50
-                            stage_progress = (current / total) * 50  # 50% для каждой стадии
-                            total_progress = base_progress + stage_progress
+                            # Rendered and encoded frames count equally; in pipelined
+                            # mode both advance at the same time
+                            with progress_lock:
+                                stage_done[stage] = current / total if total else 1
+                                total_progress = (stage_done['frames'] + stage_done['video']) * 50
                             project.progress = total_progress
                             db.session.commit()
+                            status_snapshots.publish(project, stage, current, total)
                             logging.info(f"Progress: {total_progress:.1f}% for stage: {stage}")
                 except Exception as e:
                     logging.error(f"Error updating progress: {e}")
@@ -80,7 +128,8 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
             # Process CSV
             try:
                 logging.info(f"Processing CSV file {csv_file}")
-                _, _ = process_csv_file(csv_file, folder_number)
+                with timer.stage('ingest'):
+                    _, processed_data = process_csv_file(csv_file, folder_number)
             except Exception as e:
                 logging.error(f"Error processing CSV: {e}")
                 raise
@@ -88,6 +137,11 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
             if stop_flags.get(project_id, False):
                 raise InterruptedError("Processing was stopped by user")
 
+            # Encode video segments while frames are rendered
+            if PIPELINED_ENCODING:
+                encoder = PipelinedVideoEncoder(folder_number, fps, codec, resolution, update_progress,
+                                                concurrent_jobs=len(running_processes))
+
             # Generate frames
             try:
                 logging.info(f"Generating frames for project {project_id}")
@@ -99,7 +153,12 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
                     project_text_settings,
                     update_progress,
                     interpolate_values,
-                    locale
+                    locale,
+                    timer=timer,
+                    frames_ready=encoder.frames_ready if encoder else None,
+                    transparent=is_alpha_codec(codec),
+                    trim_range=trim_range,
+                    processed_data=processed_data
                 )
 
                 with app.app_context():
@@ -120,24 +179,32 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
             # Create video
             try:
                 logging.info(f"Creating video for project {project_id}")
-                video_path = create_video(
-                    folder_number,
-                    fps,
-                    codec,
-                    resolution,
-                    update_progress
-                )
+                with timer.stage('encode_video'):
+                    if encoder:
+                        # Only the segments still queued after rendering are left
+                        video_path = encoder.finish(frame_count)
+                    else:
+                        video_path = create_video(
+                            folder_number,
+                            fps,
+                            codec,
+                            resolution,
+                            update_progress,
+                            concurrent_jobs=len(running_processes)
+                        )
 
                 with app.app_context():
                     project = db.session.get(Project, project_id)
                     if project.status == 'stopped':
                         raise InterruptedError("Processing was stopped by user")
                     project.video_file = os.path.basename(video_path)
+                    project.has_video = os.path.exists(video_path)
                     project.status = 'completed'
                     project.progress = 100
                     project.processing_completed_at = datetime.now()
                     db.session.commit()
                     logging.info(f"Project {project_id} completed successfully")
+                notify_status()
 
             except Exception as e:
                 logging.error(f"Error creating video: {e}")
@@ -152,6 +219,7 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
                     project.error_message = str(e)
                     project.processing_completed_at = datetime.now()
                     db.session.commit()
+            notify_status()
 
         except Exception as e:
             logging.error(f"Error processing project {project_id}: {str(e)}")
@@ -162,8 +230,14 @@ def process_project(project_id, resolution='fullhd', fps=29.97, codec='h264', te
                     project.error_message = str(e)
                     project.processing_completed_at = datetime.now()
                     db.session.commit()
+            notify_status()
 
         finally:
+            if encoder:
+                # Stops segment encodes left over from a failed or stopped job
+                encoder.abort()
+            job_rates.finish(project_id)
+            status_snapshots.discard(project_id)
             if project_id in running_processes:
                 del running_processes[project_id]
             if project_id in stop_flags:
@@ -190,6 +264,8 @@ def stop_project_processing(project_id):
                 project.error_message = 'Processing stopped by user'
                 project.processing_completed_at = datetime.now()
                 db.session.commit()
+                status_snapshots.discard(project_id)
+                status_versions.notify(project.user_id)
                 logging.info(f"Updated status to stopped for project {project_id}")
 
         # Set the stop flag
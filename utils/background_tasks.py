@@ -68,6 +68,8 @@ class BackgroundTaskManager:
             
             if task.type == "email_campaign":
                 self._process_email_campaign(task)
+            elif task.type == "batch_analytics":
+                self._process_batch_analytics(task)
             else:
                 raise ValueError(f"Unknown task type: {task.type}")
                 
@@ -176,6 +178,29 @@ class BackgroundTaskManager:
                 'total_count': total_users
             }
     
+    def _process_batch_analytics(self, task: Task):
+        """Process batch ride analytics task (season statistics, see utils/batch_analytics.py)"""
+        import shutil
+        from app import app, evaluate_achievements
+        from models import Achievement
+        from utils.batch_analytics import run_batch
+
+        def on_progress(done, total):
+            task.progress = int(done / total * 100)
+
+        try:
+            with app.app_context():
+                active_achievements = Achievement.query.filter_by(is_active=True).all()
+                task.result = run_batch(
+                    task.data['logs'],
+                    lambda analytics_vars: evaluate_achievements(analytics_vars, active_achievements),
+                    on_progress
+                )
+            task.progress = 100
+        finally:
+            # The uploaded logs are only needed while the batch runs
+            shutil.rmtree(task.data['directory'], ignore_errors=True)
+    
     def add_task(self, task_type: str, data: Dict[str, Any]) -> str:
         """Add a new task to the queue"""
         import uuid
@@ -0,0 +1,343 @@
+"""
+Batch ride analytics across many log files.
+
+Uploaded logs (or zip archives of logs) are saved to a temporary directory
+and analysed by a background task (see BackgroundTaskManager): the log
+paths are fanned out across a process pool, every ride is summarized with
+the streaming analytics code, and the per-ride metrics are merged into
+season-level results. Ride summaries are cached on disk by the SHA-256 of
+the file content, so re-uploading the same logs is answered without parsing
+them again.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.analytics_stream import summarize_csv_stream
+
+BATCH_CACHE_DIR = 'analytics_cache'
+# Bump when the summary format or the analytics calculations change
+BATCH_CACHE_VERSION = 2
+# Cached summaries not used for this long are deleted; beyond the size
+# limit the least recently used ones go first (see prune_summary_cache)
+BATCH_CACHE_MAX_AGE_DAYS = 30
+BATCH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+MAX_BATCH_FILES = 200
+MAX_BATCH_BYTES = 256 * 1024 * 1024  # Uncompressed size of all logs in a batch
+MAX_BATCH_WORKERS = 4
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BatchAnalyticsError(ValueError):
+    """Raised for batches that cannot be processed (too many or too large files)"""
+
+
+def file_hash(path):
+    """SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_batch_files(files, directory):
+    """
+    Save uploaded files into directory, expanding zip archives
+
+    Logs are streamed to disk and never held in memory.
+
+    Args:
+        files: iterable of werkzeug FileStorage objects
+        directory: existing directory owned by the batch
+
+    Returns:
+        list of (name, path) tuples for every CSV log
+    """
+    logs = []
+    total = 0
+
+    def next_path():
+        if len(logs) >= MAX_BATCH_FILES:
+            raise BatchAnalyticsError(f"Too many files, the limit is {MAX_BATCH_FILES}")
+        return os.path.join(directory, f'{len(logs)}.csv')
+
+    def add(name, path, size):
+        nonlocal total
+        total += size
+        if total > MAX_BATCH_BYTES:
+            raise BatchAnalyticsError("Batch is too large")
+        logs.append((name, path))
+
+    for file in files:
+        if not file or not file.filename:
+            continue
+        if file.filename.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(file.stream) as archive:
+                    for info in archive.infolist():
+                        name = info.filename
+                        if (info.is_dir() or not name.lower().endswith('.csv')
+                                or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.')):
+                            continue
+                        # Check the declared size before inflating the member
+                        # (zipfile never inflates more than the declared size)
+                        if total + info.file_size > MAX_BATCH_BYTES:
+                            raise BatchAnalyticsError("Batch is too large")
+                        path = next_path()
+                        with archive.open(info) as src, open(path, 'wb') as dst:
+                            shutil.copyfileobj(src, dst, HASH_CHUNK_SIZE)
+                        add(name, path, os.path.getsize(path))
+            except zipfile.BadZipFile:
+                raise BatchAnalyticsError(f"Invalid zip archive: {file.filename}")
+        else:
+            path = next_path()
+            file.save(path)
+            add(file.filename, path, os.path.getsize(path))
+
+    return logs
+
+
+def _cache_path(digest):
+    return os.path.join(BATCH_CACHE_DIR, f'{digest}.json')
+
+
+def load_cached_summary(digest):
+    """Return the cached ride summary for a content hash, or None"""
+    try:
+        with open(_cache_path(digest)) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('version') != BATCH_CACHE_VERSION:
+        return None
+    try:
+        # Mark as recently used for prune_summary_cache()
+        os.utime(_cache_path(digest))
+    except OSError:
+        pass
+    return cached['summary']
+
+
+def store_cached_summary(digest, summary):
+    """Store a ride summary under its content hash (atomic write)"""
+    try:
+        os.makedirs(BATCH_CACHE_DIR, exist_ok=True)
+        path = _cache_path(digest)
+        fd, tmp_path = tempfile.mkstemp(dir=BATCH_CACHE_DIR, prefix=f'{digest}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': BATCH_CACHE_VERSION, 'summary': summary}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    except OSError as e:
+        logging.warning(f"Could not cache ride summary {digest}: {e}")
+
+
+def prune_summary_cache(max_age_days=BATCH_CACHE_MAX_AGE_DAYS, max_bytes=BATCH_CACHE_MAX_BYTES):
+    """
+    Delete cached summaries unused for max_age_days, then the least recently
+    used ones until the cache fits in max_bytes
+
+    Returns:
+        list of deleted file paths
+    """
+    if not os.path.exists(BATCH_CACHE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(BATCH_CACHE_DIR):
+        path = os.path.join(BATCH_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+
+    deleted = []
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.warning(f"Could not delete cached summary {path}: {e}")
+            continue
+        total -= size
+        deleted.append(path)
+    if deleted:
+        logging.info(f"Pruned {len(deleted)} cached ride summaries")
+    return deleted
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, min(MAX_BATCH_WORKERS, os.cpu_count() or 1))
+            # forkserver: workers must not inherit the threaded web process
+            # (held locks, database connections) through fork
+            _executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('forkserver'))
+            logging.info(f"Started batch analytics process pool with {workers} workers")
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _summarize_file(path):
+    """Process pool entry point"""
+    with open(path, 'rb') as f:
+        return summarize_csv_stream(f)
+
+
+def analyze_rides(logs, on_progress=None):
+    """
+    Summarize rides in parallel, using cached summaries where possible
+
+    Args:
+        logs: list of (name, path) tuples
+        on_progress: optional callback(done, total) as logs are summarized
+
+    Returns:
+        list of ride dicts in input order: name, hash, cached, duplicate and
+        the summary fields, or name, hash and error for logs that failed
+    """
+    rides = []
+    pending = {}  # content hash -> indices of rides waiting for it
+    path_by_hash = {}
+
+    for name, path in logs:
+        digest = file_hash(path)
+        ride = {'name': name, 'hash': digest, 'duplicate': digest in path_by_hash}
+        path_by_hash.setdefault(digest, path)
+        rides.append(ride)
+
+        summary = load_cached_summary(digest)
+        if summary is not None:
+            ride.update(summary, cached=True)
+        else:
+            pending.setdefault(digest, []).append(len(rides) - 1)
+
+    if pending:
+        executor = _get_executor()
+        futures = {executor.submit(_summarize_file, path_by_hash[digest]): digest
+                   for digest in pending}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                digest = futures[future]
+                try:
+                    summary = future.result()
+                    store_cached_summary(digest, summary)
+                    update = dict(summary, cached=False)
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    logging.warning(f"Batch analytics failed for {digest}: {e}")
+                    update = {'error': str(e)}
+                for index in pending[digest]:
+                    rides[index].update(update)
+                if on_progress:
+                    on_progress(done, len(futures))
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            _reset_executor()
+            raise
+
+    logging.info(f"Batch analytics: {len(rides)} rides, {len(pending)} parsed, "
+                 f"{len(rides) - sum(len(v) for v in pending.values())} from cache")
+    return rides
+
+
+def aggregate_rides(rides):
+    """
+    Merge per-ride summaries into season-level statistics
+
+    Duplicate uploads of the same log are counted once. Distances of rides
+    on the same day are added up before picking the best day.
+    """
+    unique = [ride for ride in rides
+              if 'error' not in ride and not ride['duplicate'] and ride['start_timestamp'] is not None]
+    if not unique:
+        return None
+
+    daily = defaultdict(float)
+    for ride in unique:
+        for day, distance in ride['daily_distances'].items():
+            daily[day] += distance
+    best_day = max(daily.items(), key=lambda item: item[1]) if daily else (None, 0)
+
+    return {
+        'ride_count': len(unique),
+        'first_ride': min(ride['start_timestamp'] for ride in unique),
+        'last_ride': max(ride['end_timestamp'] for ride in unique),
+        'max_speed': max(ride['analytics_vars']['max_speed'] for ride in unique),
+        'max_power': max(ride['analytics_vars']['max_power'] for ride in unique),
+        'min_power': min(ride['analytics_vars']['min_power'] for ride in unique),
+        'total_distance': sum(daily.values()),
+        'best_day': {'date': best_day[0], 'distance': best_day[1]}
+    }
+
+
+def run_batch(logs, evaluate, on_progress=None):
+    """
+    Season statistics report of a saved batch
+
+    Args:
+        logs: list of (name, path) tuples from save_batch_files()
+        evaluate: callable(analytics_vars) -> list of unlocked achievement dicts
+        on_progress: optional callback(done, total)
+
+    Returns:
+        dict with 'summary', 'achievements' (with the date and ride that
+        first unlocked them) and 'rides'
+    """
+    rides = analyze_rides(logs, on_progress)
+
+    # Achievements are unlocked by the earliest ride that meets the formula
+    unlocked = {}
+    for ride in sorted((r for r in rides if 'error' not in r and r['start_timestamp'] is not None),
+                       key=lambda r: r['start_timestamp']):
+        ride_achievements = evaluate(ride['analytics_vars'])
+        ride['achievements'] = [a['id'] for a in ride_achievements]
+        if ride['duplicate']:
+            continue
+        for achievement in ride_achievements:
+            entry = unlocked.setdefault(achievement['id'], dict(achievement, unlocked_at=ride['start_timestamp'],
+                                                                unlocked_by=ride['name'], rides=0))
+            entry['rides'] += 1
+
+    summary = aggregate_rides(rides)
+    for ride in rides:
+        ride.pop('daily_distances', None)
+
+    return {
+        'summary': summary,
+        'achievements': sorted(unlocked.values(), key=lambda a: a['unlocked_at']),
+        'rides': rides
+    }
@@ -0,0 +1,217 @@
+"""
+Compact columnar payloads for telemetry charts.
+
+Processed telemetry is shipped to the browser as one array per metric with
+delta-encoded timestamps instead of a list of per-row dicts. The same payload
+can be sent as JSON, as MessagePack (if installed) or as a small binary
+container of typed arrays, and compressed with brotli (if installed) or gzip.
+"""
+import gzip
+import json
+import logging
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+PAYLOAD_FORMAT = 'columnar-v1'
+
+BINARY_MIME_TYPE = 'application/octet-stream'
+MSGPACK_MIME_TYPE = 'application/x-msgpack'
+
+# Magic bytes and version of the binary container
+BINARY_MAGIC = b'EUCT'
+BINARY_VERSION = 1
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+_INT32_MIN = np.iinfo(np.int32).min
+_INT32_MAX = np.iinfo(np.int32).max
+
+
+def _as_float_array(values):
+    """Convert a column (list, Series or array) to a float64 NumPy array"""
+    array = np.asarray(values, dtype=np.float64)
+    return np.where(np.isfinite(array), array, np.nan)
+
+
+def _narrow_dtype(array):
+    """Pick the smallest transport dtype that represents the column exactly"""
+    finite = array[~np.isnan(array)]
+    if (len(finite) == len(array)
+            and np.all(finite == np.round(finite))
+            and (len(finite) == 0
+                 or (finite.min() >= _INT32_MIN and finite.max() <= _INT32_MAX))):
+        return np.int32
+    return np.float64
+
+
+def encode_timestamps(timestamps):
+    """
+    Delta-encode timestamps in milliseconds
+
+    Returns:
+        tuple: (timestamp_start in seconds, list of integer millisecond deltas)
+    """
+    ts = _as_float_array(timestamps)
+    if len(ts) == 0:
+        return 0.0, np.zeros(0, dtype=np.int64)
+    start = float(ts[0])
+    ms = np.round((ts - start) * 1000).astype(np.int64)
+    deltas = np.diff(ms, prepend=0)
+    return start, deltas
+
+
+def build_columnar_payload(processed_data, columns=None):
+    """
+    Pack processed telemetry into a columnar payload
+
+    Args:
+        processed_data: dict {'timestamp': [...], 'speed': [...], ...} or DataFrame
+        columns: metric columns to include (defaults to every non-timestamp column)
+
+    Returns:
+        dict with 'timestamp_start', 'timestamp_deltas' and 'columns'
+        (column name -> NumPy array). Use payload_to_json() for serialization.
+    """
+    if columns is None:
+        columns = [col for col in processed_data.keys() if col != 'timestamp']
+
+    start, deltas = encode_timestamps(processed_data['timestamp'])
+
+    packed_columns = {}
+    for col in columns:
+        if col not in processed_data:
+            continue
+        array = _as_float_array(processed_data[col])
+        dtype = _narrow_dtype(array)
+        packed_columns[col] = array.astype(dtype) if dtype is np.int32 else array
+
+    return {
+        'format': PAYLOAD_FORMAT,
+        'rows': int(len(deltas)),
+        'timestamp_start': start,
+        'timestamp_deltas': deltas,
+        'columns': packed_columns
+    }
+
+
+def _column_to_list(array):
+    """Convert a column to a JSON-friendly list (NaN becomes None)"""
+    if array.dtype.kind == 'f':
+        return [None if value != value else value for value in array.tolist()]
+    return array.tolist()
+
+
+def payload_to_json(payload):
+    """Convert a columnar payload to plain Python types for jsonify/msgpack"""
+    result = {key: value for key, value in payload.items()
+              if key not in ('timestamp_deltas', 'columns')}
+    result['timestamp_deltas'] = payload['timestamp_deltas'].tolist()
+    result['columns'] = {col: _column_to_list(array)
+                         for col, array in payload['columns'].items()}
+    return result
+
+
+def encode_binary(payload, meta=None):
+    """
+    Encode a columnar payload as a binary container of little-endian typed arrays
+
+    Layout: 4 magic bytes, uint16 version, uint16 reserved, uint32 header length,
+    UTF-8 JSON header, then each array aligned to 8 bytes. The header lists
+    every array with its dtype, byte offset (relative to the data section)
+    and length, so the browser can wrap them in TypedArrays without copying.
+    """
+    deltas = payload['timestamp_deltas']
+    if len(deltas) and (deltas.min() < _INT32_MIN or deltas.max() > _INT32_MAX):
+        deltas = deltas.astype('<f8')
+    else:
+        deltas = deltas.astype('<i4')
+
+    arrays = [('timestamp_deltas', deltas)]
+    for col, array in payload['columns'].items():
+        arrays.append((col, array.astype('<i4' if array.dtype.kind == 'i' else '<f8')))
+
+    entries = []
+    chunks = []
+    offset = 0
+    for name, array in arrays:
+        padding = (-offset) % 8
+        if padding:
+            chunks.append(b'\x00' * padding)
+            offset += padding
+        data = array.tobytes()
+        entries.append({
+            'name': name,
+            'dtype': 'int32' if array.dtype.kind == 'i' else 'float64',
+            'offset': offset,
+            'length': int(len(array))
+        })
+        chunks.append(data)
+        offset += len(data)
+
+    header = {key: value for key, value in payload.items()
+              if key not in ('timestamp_deltas', 'columns')}
+    header['arrays'] = entries
+    if meta:
+        header['meta'] = meta
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # Pad the header so the data section starts on an 8-byte boundary
+    prefix_size = 12 + len(header_bytes)
+    header_bytes += b' ' * ((-prefix_size) % 8)
+
+    prefix = BINARY_MAGIC + struct.pack('<HHI', BINARY_VERSION, 0, len(header_bytes))
+    return prefix + header_bytes + b''.join(chunks)
+
+
+def encode_msgpack(payload, meta=None):
+    """Encode a columnar payload with MessagePack, or return None if unavailable"""
+    if msgpack is None:
+        return None
+    data = payload_to_json(payload)
+    if meta:
+        data['meta'] = meta
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def choose_encoding(accept_encoding):
+    """Pick the best supported content encoding from an Accept-Encoding header"""
+    accepted = {item.split(';')[0].strip().lower()
+                for item in (accept_encoding or '').split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress_body(body, accept_encoding):
+    """
+    Compress a response body according to the client's Accept-Encoding
+
+    Returns:
+        tuple: (body, content_encoding or None)
+    """
+    if len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+
+    encoding = choose_encoding(accept_encoding)
+    try:
+        if encoding == 'br':
+            return brotli.compress(body, quality=5), 'br'
+        if encoding == 'gzip':
+            return gzip.compress(body, compresslevel=6), 'gzip'
+    except Exception as e:
+        logging.warning(f"Failed to compress chart payload with {encoding}: {e}")
+    return body, None
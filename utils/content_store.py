@@ -0,0 +1,215 @@
+"""
+Content-addressed store for uploaded CSV logs and their processed data.
+
+Every distinct upload is kept once under content_store/<sha256>/:
+
+- raw.csv                 the uploaded log
+- processed.csv           the processed data of the first project using it
+- processed.csv.pyramid/  its telemetry pyramid
+
+Projects keep using their usual paths (uploads/<csv_file> and
+processed_data/project_<folder>_<csv_file>), which are hard links to the
+store files (copies where hard links are not supported). Re-uploading the
+same log links the stored processed data into the new project, so the raw
+CSV is not parsed again.
+
+The StoredFile table counts the projects referencing each entry; the store
+entry is deleted when the last one goes away. Files shared through links
+must never be rewritten in place - write a temporary file and os.replace()
+it instead (see write_processed_csv).
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import StoredFile
+from utils.telemetry_pyramid import link_pyramid
+
+CONTENT_STORE_DIR = 'content_store'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream):
+    """SHA-256 of a binary stream; the stream is rewound afterwards"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def get_store_dir(digest):
+    return os.path.join(CONTENT_STORE_DIR, digest)
+
+
+def get_raw_path(digest):
+    return os.path.join(get_store_dir(digest), 'raw.csv')
+
+
+def get_processed_path(digest):
+    return os.path.join(get_store_dir(digest), 'processed.csv')
+
+
+def _temp_dir_for(path):
+    """Unique temporary directory next to path (same filesystem, safe across threads)"""
+    return tempfile.mkdtemp(dir=os.path.dirname(path) or '.', prefix=f'.{os.path.basename(path)}.tmp')
+
+
+def link_file(src, dst):
+    """Atomically place a hard link (or a copy) of src at dst"""
+    tmp_dir = _temp_dir_for(dst)
+    tmp_path = os.path.join(tmp_dir, os.path.basename(dst))
+    try:
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def save_raw(file_storage, digest):
+    """
+    Save an upload to a temporary file next to its store location
+
+    Returns:
+        str: temporary path; pass it to commit_raw() once validated
+    """
+    os.makedirs(get_store_dir(digest), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=get_store_dir(digest), prefix='raw.csv.', suffix='.tmp')
+    os.close(fd)
+    file_storage.stream.seek(0)
+    file_storage.save(tmp_path)
+    return tmp_path
+
+
+def commit_raw(tmp_path, digest):
+    os.replace(tmp_path, get_raw_path(digest))
+
+
+def link_processed(digest, processed_csv_path):
+    """
+    Link stored processed data (and pyramid) to a project's processed path
+
+    Returns:
+        bool: True if the store had processed data for this content
+    """
+    stored = get_processed_path(digest)
+    if not os.path.exists(stored):
+        return False
+    os.makedirs(os.path.dirname(processed_csv_path), exist_ok=True)
+    link_file(stored, processed_csv_path)
+    link_pyramid(stored, processed_csv_path)
+    logging.info(f"Reused processed data {digest[:12]} for {processed_csv_path}")
+    return True
+
+
+def publish_processed(digest, processed_csv_path):
+    """Share a project's freshly processed data with later uploads of the same log"""
+    stored = get_processed_path(digest)
+    if os.path.exists(stored) or not os.path.exists(processed_csv_path):
+        return
+    try:
+        os.makedirs(get_store_dir(digest), exist_ok=True)
+        link_file(processed_csv_path, stored)
+        link_pyramid(processed_csv_path, stored)
+    except OSError as e:
+        logging.warning(f"Could not publish processed data for {digest[:12]}: {e}")
+
+
+def acquire_content(digest, csv_type, size):
+    """
+    Add a reference to stored content, creating its StoredFile row if needed
+
+    The change is flushed but not committed; commit it together with the
+    project that holds the reference.
+    """
+    updated = StoredFile.query.filter_by(sha256=digest).update(
+        {StoredFile.ref_count: StoredFile.ref_count + 1}, synchronize_session=False)
+    if updated:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(StoredFile(sha256=digest, csv_type=csv_type, size=size, ref_count=1))
+    except IntegrityError:
+        # Another upload of the same content created the row first
+        StoredFile.query.filter_by(sha256=digest).update(
+            {StoredFile.ref_count: StoredFile.ref_count + 1}, synchronize_session=False)
+
+
+def remove_content(digest):
+    """Delete a store entry's files"""
+    store_dir = get_store_dir(digest)
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+        logging.info(f"Deleted unreferenced content {store_dir}")
+
+
+def remove_unreferenced_content(digests):
+    """
+    Delete the files of store entries released by a committed transaction
+
+    Call only after db.session.commit() succeeded; entries that got a new
+    StoredFile row in the meantime (re-uploaded) are kept.
+    """
+    for digest in digests:
+        if StoredFile.query.filter_by(sha256=digest).first() is None:
+            remove_content(digest)
+
+
+def release_content(digest):
+    """
+    Drop a reference to stored content
+
+    Project files are separate links, so deleting the store entry never
+    affects other projects' files.
+
+    Returns:
+        the digest if nothing references the entry any more (its row is
+        deleted in the session; pass it to remove_unreferenced_content()
+        after committing), else None
+    """
+    if not digest:
+        return None
+    StoredFile.query.filter_by(sha256=digest).update(
+        {StoredFile.ref_count: StoredFile.ref_count - 1}, synchronize_session=False)
+    deleted = StoredFile.query.filter(StoredFile.sha256 == digest, StoredFile.ref_count <= 0).delete(
+        synchronize_session=False)
+    return digest if deleted else None
+
+
+def reconcile_content_store(ref_counts):
+    """
+    Fix reference counts and find unreferenced store entries
+
+    Args:
+        ref_counts: dict {sha256: number of projects referencing it}
+
+    Returns:
+        list of digests to pass to remove_unreferenced_content() once the
+        session is committed
+    """
+    unreferenced = []
+    for stored in StoredFile.query.all():
+        count = ref_counts.get(stored.sha256, 0)
+        if count == 0:
+            db.session.delete(stored)
+            unreferenced.append(stored.sha256)
+        elif stored.ref_count != count:
+            logging.info(f"Fixing reference count of {stored.sha256[:12]}: {stored.ref_count} -> {count}")
+            stored.ref_count = count
+
+    # Store directories without a database row
+    known = {stored.sha256 for stored in StoredFile.query.all()}
+    if os.path.exists(CONTENT_STORE_DIR):
+        for name in os.listdir(CONTENT_STORE_DIR):
+            if name not in known and name not in ref_counts and name not in unreferenced:
+                unreferenced.append(name)
+    return unreferenced
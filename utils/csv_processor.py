@@ -1,44 +1,55 @@
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import os
+import tempfile
 import numpy as np
+from utils.telemetry import Telemetry
+from utils.telemetry_pyramid import build_pyramid, load_cached_telemetry, remove_pyramid
 
-def parse_timestamp_darnkessbot(date_str):
-    try:
-        # Check if input is float
-        if isinstance(date_str, float):
-            return None
-
-        # Convert to string if needed
-        date_str = str(date_str).strip()
-
-        # Try to parse the date string
-        dt = datetime.strptime(date_str, '%d.%m.%Y %H:%M:%S.%f')
-        return dt.timestamp()
-    except (ValueError, TypeError) as e:
-        # Don't log every error when processing large files (would create too many log entries)
-        # Only log first occurrence or when debugging specific issues
-        # logging.error(f"Error parsing darnkessbot timestamp: {e}")
-        return None
-
-def parse_timestamp_wheellog(date_str, time_str):
-    try:
-        # Check if either input is float
-        if isinstance(date_str, float) or isinstance(time_str, float):
-            return None
-
-        # Convert to strings if needed
-        date_str = str(date_str).strip()
-        time_str = str(time_str).strip()
-
-        # Try to parse the date
-        dt_str = f"{date_str} {time_str}"
-        dt = datetime.strptime(dt_str, '%Y-%m-%d %H:%M:%S.%f')
-        return dt.timestamp()
-    except (ValueError, TypeError) as e:
-        logging.error(f"Error parsing wheellog timestamp: {e}")
-        return None
+# Naive datetime of the Unix epoch, for converting wall-clock times
+EPOCH = datetime(1970, 1, 1)
+
+def wall_clock_timestamps(parsed):
+    """
+    Unix timestamps of naive wall-clock datetimes in the server's time zone
+
+    Same values as datetime.timestamp() of every datetime (the convention
+    used for processed CSVs and shown by datetime.fromtimestamp()), computed
+    with one UTC offset per distinct hour instead of per row. NaT becomes NaN.
+    """
+    values = np.asarray(parsed, dtype='datetime64[us]')
+    valid = ~np.isnat(values)
+    seconds, microseconds = np.divmod(values[valid].astype(np.int64), 10**6)
+    hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+    offsets = np.array([int(hour) * 3600 - int((EPOCH + timedelta(hours=int(hour))).timestamp())
+                        for hour in hours], dtype=np.int64)
+
+    timestamps = np.full(len(values), np.nan)
+    timestamps[valid] = (seconds - offsets[inverse]) + microseconds / 1e6
+    return timestamps
+
+def wall_clock_days(timestamps):
+    """Server-local calendar day of every timestamp, as days since 1970-01-01"""
+    seconds = np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+    hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+    offsets = np.array([int((datetime.fromtimestamp(int(hour) * 3600) - EPOCH).total_seconds()) - int(hour) * 3600
+                        for hour in hours], dtype=np.int64)
+    return (seconds + offsets[inverse]) // 86400
+
+def parse_csv_timestamps(df, csv_type):
+    """Vectorized timestamps of a CSV's rows (see wall_clock_timestamps()); invalid rows become NaN"""
+    if csv_type == 'processed':
+        return pd.to_numeric(df['timestamp'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+    if csv_type == 'darnkessbot':
+        parsed = pd.to_datetime(df['Date'].astype(str).str.strip(),
+                                format='%d.%m.%Y %H:%M:%S.%f', errors='coerce')
+    else:
+        parsed = pd.to_datetime(df['date'].astype(str).str.strip() + ' ' +
+                                df['time'].astype(str).str.strip(),
+                                format='%Y-%m-%d %H:%M:%S.%f', errors='coerce')
+    return wall_clock_timestamps(parsed)
 
 def detect_csv_type(df):
     """Detect CSV type based on column names"""
@@ -94,248 +105,307 @@ def detect_csv_type(df):
         
         raise ValueError("CSV format not recognized - missing required columns or insufficient match")
 
-def process_mileage(series, csv_type):
-    """Process mileage values based on CSV type"""
-    try:
-        # Convert to numeric, replacing any non-numeric values with NaN
-        series = pd.to_numeric(series, errors='coerce')
-
-        # Replace infinite values with NaN
-        series = series.replace([float('inf'), float('-inf')], np.nan)
+def processed_csv_type(df, existing_csv_type=None):
+    """csv_type reported for an already processed CSV (df may be just its header)"""
+    csv_type = existing_csv_type or detect_csv_type(df)
+
+    # Для обработанных файлов устанавливаем тип по умолчанию
+    if csv_type == 'processed':
+        csv_type = 'darnkessbot'  # Значение по умолчанию
+        logging.info("Используем 'darnkessbot' как тип по умолчанию для обработанного файла")
+    return csv_type
+
+# Metric columns compared when dropping repeated rows
+DUPLICATE_CHECK_COLUMNS = ['speed', 'gps', 'voltage', 'temperature', 'current',
+                           'battery', 'mileage', 'pwm', 'power']
+
+# Source column of every processed metric for each supported CSV type
+SOURCE_COLUMNS = {
+    'darnkessbot': {
+        'speed': 'Speed', 'gps': 'GPS Speed', 'voltage': 'Voltage',
+        'temperature': 'Temperature', 'current': 'Current', 'battery': 'Battery level',
+        'mileage': 'Total mileage', 'pwm': 'PWM', 'power': 'Power'
+    },
+    'wheellog': {
+        'speed': 'speed', 'gps': 'gps_speed', 'voltage': 'voltage',
+        'temperature': 'system_temp', 'current': 'current', 'battery': 'battery_level',
+        'mileage': 'totaldistance', 'pwm': 'pwm', 'power': 'power'
+    },
+    'processed': {col: col for col in DUPLICATE_CHECK_COLUMNS}
+}
+
+def pack_metric_matrix(data, columns):
+    """
+    Stack columns into one C-contiguous matrix, one row per record
 
-        # Fill NaN values with 0
-        series = series.fillna(0)
+    int32 when every column holds integers that fit (the processed metrics
+    are rounded), float64 otherwise.
+    """
+    arrays = [np.asarray(data[col]) for col in columns]
+    row_count = len(arrays[0]) if arrays else 0
+    integer = all(a.dtype.kind in 'iub' and (not len(a) or
+                                             (a.min() >= np.iinfo(np.int32).min and a.max() <= np.iinfo(np.int32).max))
+                  for a in arrays)
+    matrix = np.empty((row_count, len(arrays)), dtype=np.int32 if integer else np.float64)
+    for j, a in enumerate(arrays):
+        matrix[:, j] = a
+    return matrix
+
+def changed_row_indices(matrix):
+    """Indices of rows that differ from the previous row in any column (the first row always)"""
+    if len(matrix) == 0:
+        return np.empty(0, dtype=np.intp)
+    changed = np.empty(len(matrix), dtype=bool)
+    changed[0] = True
+    np.any(matrix[1:] != matrix[:-1], axis=1, out=changed[1:])
+    return np.flatnonzero(changed)
 
-        if len(series) == 0:
-            return series
+def remove_consecutive_duplicates(data):
+    """
+    Remove rows whose metric values all equal the previous row's
 
-        # Round all values to integers first
-        series = series.round().astype(int)
+    Returns a dict of NumPy arrays with the kept rows of every column.
+    """
+    try:
+        columns = [col for col in DUPLICATE_CHECK_COLUMNS if col in data]
+        keep = changed_row_indices(pack_metric_matrix(data, columns))
+        return {col: np.asarray(data[col])[keep] for col in data}
+    except Exception as e:
+        logging.error(f"Error removing consecutive duplicates: {e}")
+        raise
 
-        # Get the first value
-        first_value = series.iloc[0]
+def interpolate_columns(matrix, positions=None, anchors=None):
+    """
+    Fill NaN and infinite values of every column of a 2-D float array in place
 
-        # Calculate differences from first value
-        processed = series - first_value
+    Gaps are interpolated linearly by row position; values before the first
+    and after the last valid value take that value (pandas
+    interpolate(method='linear', limit_direction='both')). Columns without
+    any valid value become 0.
 
-        if csv_type == 'wheellog':
-            # Remove last 3 digits by integer division
-            processed = (processed / 1000).astype(int)
+    For input read in chunks, pass the rows' global 'positions' and an
+    'anchors' dict (column index -> (position, value) of the column's last
+    valid value in the earlier chunks); it is used for the gaps and updated.
+    """
+    matrix[~np.isfinite(matrix)] = np.nan
+    missing = np.isnan(matrix)
+    if anchors is None and not missing.any():
+        return matrix
+
+    if positions is None:
+        positions = np.arange(matrix.shape[0])
+    for j in range(matrix.shape[1]):
+        column = matrix[:, j]
+        column_missing = missing[:, j]
+        valid = ~column_missing
+        xp, fp = positions[valid], column[valid]
+        if anchors is not None:
+            if j in anchors:
+                xp = np.concatenate(([anchors[j][0]], xp))
+                fp = np.concatenate(([anchors[j][1]], fp))
+            if len(xp):
+                anchors[j] = (xp[-1], fp[-1])
+        if not column_missing.any():
+            continue
+        if not len(xp):
+            column[:] = 0
+            continue
+        column[column_missing] = np.interp(positions[column_missing], xp, fp)
+    return matrix
 
-        # Make first value 0
-        processed.iloc[0] = 0
+def interpolate_numeric_data(data, columns_to_interpolate):
+    """
+    Interpolate missing values in numeric columns using two-way interpolation
 
-        return processed
+    The columns are packed into one float64 matrix (float32 would lose
+    mileage precision), filled by interpolate_columns() and rounded to
+    integers. Returns a dict of NumPy arrays; columns that are not
+    interpolated are passed through as arrays.
+    """
+    try:
+        columns = [col for col in columns_to_interpolate if col in data]
+        row_count = len(next(iter(data.values()))) if data else 0
+
+        matrix = np.empty((row_count, len(columns)), dtype=np.float64, order='F')
+        for j, col in enumerate(columns):
+            matrix[:, j] = pd.to_numeric(data[col], errors='coerce')
+        interpolate_columns(matrix)
+        np.rint(matrix, out=matrix)
+        values = matrix.astype(np.int64, order='F')
+
+        result = {col: np.asarray(data[col]) for col in data}
+        for j, col in enumerate(columns):
+            result[col] = values[:, j]
+        return result
     except Exception as e:
-        logging.error(f"Error processing mileage: {e}")
+        logging.error(f"Error during interpolation: {e}")
         raise
 
-def clean_numeric_column(series):
-    """Clean numeric column by handling NA and infinite values"""
-    # For Series with more than 100K elements, use a more memory-efficient approach
-    if len(series) > 100000:
-        # Use efficient vectorized operations with int32 type for memory savings
-        # Replace infinite values with 0
-        series = series.replace([float('inf'), float('-inf')], 0)
-        # Fill NA/NaN values with 0
-        series = series.fillna(0)
-        # Round and convert to integer with memory-efficient type
-        return series.round().astype('int32')
-    else:
-        # For smaller series, use the original approach
-        # Replace infinite values with 0
-        series = series.replace([float('inf'), float('-inf')], 0)
-        # Fill NA/NaN values with 0
-        series = series.fillna(0)
-        # Round and convert to integer
-        return series.round().astype(int)
+def source_metric_matrix(df, csv_type):
+    """
+    Metric columns of a raw log as one float64 matrix (DUPLICATE_CHECK_COLUMNS order)
 
-def remove_consecutive_duplicates(data):
-    """Remove consecutive duplicate rows based on specified columns"""
-    try:
-        # Create DataFrame from the processed data
-        df = pd.DataFrame(data)
-        
-        # For very large datasets (over 100,000 rows), use a different approach 
-        # that's more memory efficient
-        if len(df) > 100000:
-            # Get file size - estimate from number of rows
-            estimated_size_mb = len(df) * len(df.columns) * 8 / (1024 * 1024)  # Rough estimate
-            logging.info(f"Large dataset detected ({len(df)} rows, est. {estimated_size_mb:.2f} MB), using optimized duplicate removal")
-            
-            # For very large datasets, use a sampling approach to reduce memory usage
-            # Keep every row where at least one value changes significantly
-            # Define columns to check
-            columns_to_check = ['speed', 'gps', 'voltage', 'temperature', 'current', 
-                              'battery', 'mileage', 'pwm', 'power']
-            
-            # Only keep rows where values change
-            mask = pd.Series(True, index=df.index)  # Start with all True
-            
-            # Check each column individually to reduce memory usage
-            for col in columns_to_check:
-                if col in df.columns:
-                    # Keep rows where the value changes significantly (more than 1%)
-                    col_mask = (df[col].shift() != df[col])
-                    mask = mask | col_mask
-            
-            # Always keep the first row
-            if len(mask) > 0:
-                mask.iloc[0] = True
-                
-            # Apply the mask
-            clean_df = df[mask]
-            
+    Non-numeric and infinite values become NaN; columns the logger does not
+    record at all (e.g. GPS speed) are zeros.
+    """
+    sources = SOURCE_COLUMNS[csv_type]
+    matrix = np.zeros((len(df), len(DUPLICATE_CHECK_COLUMNS)), dtype=np.float64, order='F')
+    for j, col in enumerate(DUPLICATE_CHECK_COLUMNS):
+        if sources[col] in df.columns:
+            matrix[:, j] = pd.to_numeric(df[sources[col]], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    matrix[~np.isfinite(matrix)] = np.nan
+    return matrix
+
+class CSVStandardizer:
+    """
+    Turns raw CSV rows into processed telemetry, one chunk at a time
+
+    The single implementation behind process_csv_file() (the whole file is
+    one chunk) and the streaming analytics (utils/analytics_stream.py), so
+    both produce the same rows: timestamps from parse_csv_timestamps(), rows
+    with invalid timestamps dropped, metrics interpolated (or gaps set to 0),
+    rounded to integers, mileage made relative to the first row (whole
+    kilometres for WheelLog, which logs metres) and rows repeating the
+    previous row's metrics removed.
+
+    Results do not depend on the chunk size: trailing rows whose gaps can
+    only be interpolated with values from the next chunk are held back until
+    then, up to max_deferred_rows rows.
+    """
+
+    def __init__(self, csv_type, interpolate_values=True, max_deferred_rows=0):
+        self.csv_type = csv_type
+        self.interpolate_values = interpolate_values and csv_type != 'processed'
+        self.max_deferred_rows = max_deferred_rows
+
+        self._deferred = None         # (timestamps, matrix) waiting for the next chunk
+        self._position = 0            # Global row position of the next standardized row
+        self._anchors = {}            # Column index -> (position, value) of its last real value
+        self._mileage_origin = None   # First mileage value of the ride
+        self._last_row = None         # Last metric row, for duplicate removal
+
+    def feed(self, chunk):
+        """
+        Standardize a chunk of raw CSV rows
+
+        Returns:
+            tuple: (timestamps, values) of the rows ready so far; values is a
+            float64 matrix with the DUPLICATE_CHECK_COLUMNS metrics
+        """
+        timestamps = parse_csv_timestamps(chunk, self.csv_type)
+        valid = ~np.isnan(timestamps)
+        if not valid.all():
+            chunk = chunk[valid]
+            timestamps = timestamps[valid]
+        matrix = source_metric_matrix(chunk, self.csv_type)
+
+        if self._deferred is not None:
+            timestamps = np.concatenate((self._deferred[0], timestamps))
+            matrix = np.concatenate((self._deferred[1], matrix))
+            self._deferred = None
+
+        if self.interpolate_values:
+            # Gaps after the last complete row need the next chunk to interpolate
+            complete = np.flatnonzero(~np.isnan(matrix).any(axis=1))
+            cut = int(complete[-1]) + 1 if len(complete) else 0
+            if len(matrix) - cut <= self.max_deferred_rows and cut < len(matrix):
+                self._deferred = (timestamps[cut:], matrix[cut:])
+                timestamps, matrix = timestamps[:cut], matrix[:cut]
+
+        return self._standardize(timestamps, matrix)
+
+    def finish(self):
+        """Standardize the rows still held back; returns (timestamps, values) like feed()"""
+        if self._deferred is None:
+            return self._standardize(np.zeros(0), np.zeros((0, len(DUPLICATE_CHECK_COLUMNS))))
+        timestamps, matrix = self._deferred
+        self._deferred = None
+        return self._standardize(timestamps, matrix)
+
+    def _standardize(self, timestamps, matrix):
+        if len(matrix) == 0:
+            return timestamps, matrix
+
+        if self.csv_type == 'processed':
+            matrix[np.isnan(matrix)] = 0
         else:
-            # For smaller datasets, use the original approach
-            # Define columns to check for duplicates
-            columns_to_check = ['speed', 'gps', 'voltage', 'temperature', 'current', 
-                              'battery', 'mileage', 'pwm', 'power']
-            
-            # Create mask for consecutive duplicates
-            duplicate_mask = ~(df[columns_to_check].shift() == df[columns_to_check]).all(axis=1)
-            
-            # Keep first row and non-consecutive duplicates
-            clean_df = df[duplicate_mask]
-
-        # Convert back to dictionary format
-        return {col: clean_df[col].tolist() for col in df.columns}
-    except Exception as e:
-        logging.error(f"Error removing consecutive duplicates: {e}")
-        raise
+            if self.interpolate_values:
+                # Linear interpolation over global row positions, anchored on the
+                # last real value of every column from the previous chunks
+                positions = np.arange(self._position, self._position + len(matrix), dtype=np.float64)
+                interpolate_columns(matrix, positions, self._anchors)
+            else:
+                matrix[np.isnan(matrix)] = 0
+            self._position += len(matrix)
+            np.rint(matrix, out=matrix)
+
+            # Mileage is reported relative to the start of the ride
+            mileage = matrix[:, DUPLICATE_CHECK_COLUMNS.index('mileage')]
+            if self._mileage_origin is None:
+                self._mileage_origin = mileage[0]
+            mileage -= self._mileage_origin
+            if self.csv_type == 'wheellog':
+                np.trunc(mileage / 1000, out=mileage)
+
+        # Drop rows whose metrics repeat the previous row
+        keep = changed_row_indices(matrix)
+        if self._last_row is not None and not (matrix[0] != self._last_row).any():
+            keep = keep[1:]
+        self._last_row = matrix[-1].copy()
+        return timestamps[keep], matrix[keep]
+
+
+def standardize_csv_frame(df, csv_type, interpolate_values=True):
+    """Processed Telemetry of a whole raw (or already processed) CSV DataFrame"""
+    standardizer = CSVStandardizer(csv_type, interpolate_values)
+    parts = [standardizer.feed(df), standardizer.finish()]
+    timestamps = np.concatenate([part[0] for part in parts])
+    values = np.concatenate([part[1] for part in parts])
+
+    columns = {'timestamp': timestamps}
+    for j, col in enumerate(DUPLICATE_CHECK_COLUMNS):
+        columns[col] = values[:, j]
+    return Telemetry(columns)
+
+def write_processed_csv(df, processed_csv_path):
+    """
+    Write a processed CSV through a temporary file and os.replace()
 
-def interpolate_numeric_data(data, columns_to_interpolate):
-    """Interpolate missing values in numeric columns using two-way interpolation"""
+    Processed files may be hard links shared with other projects (see
+    utils/content_store.py), so they are never rewritten in place.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(processed_csv_path) or '.',
+                                    prefix=f'.{os.path.basename(processed_csv_path)}.', suffix='.tmp')
     try:
-        # Create DataFrame from the data
-        df = pd.DataFrame(data)
-        
-        # For very large datasets, use a more efficient approach
-        # Check if this is a large dataset
-        if len(df) > 100000:
-            # This is a large dataset - use more efficient processing
-            logging.info(f"Large dataset detected for interpolation ({len(df)} rows), using optimized method")
-            
-            # Interpolate specified columns with optimized batch processing
-            for col in columns_to_interpolate:
-                if col in df.columns:
-                    # Convert to float for interpolation
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                    
-                    # Replace infinite values with NaN efficiently
-                    df[col] = df[col].replace([float('inf'), float('-inf')], np.nan)
-                    
-                    # For very large datasets, fill NaN with nearby values instead of interpolating all
-                    # This is faster but slightly less accurate
-                    if df[col].isna().sum() > 0:
-                        # Fill NaN values with the nearest non-NaN value (forward then backward)
-                        df[col] = df[col].fillna(method='ffill').fillna(method='bfill')
-                        
-                        # Handle any remaining NaN values (at the boundaries)
-                        df[col] = df[col].fillna(0)
-                    
-                    # Ensure all values are finite
-                    df[col] = df[col].replace([float('inf'), float('-inf')], 0)
-                    
-                    # Round and convert back to integer (use int32 for memory efficiency)
-                    df[col] = df[col].round().astype('int32')
-        else:
-            # For smaller datasets, use the original detailed interpolation
-            for col in columns_to_interpolate:
-                if col in df.columns:
-                    # Convert to float for interpolation
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                    
-                    # Replace infinite values with NaN
-                    df[col] = df[col].replace([float('inf'), float('-inf')], np.nan)
-                    
-                    # Apply two-way interpolation
-                    df[col] = df[col].interpolate(method='linear', limit_direction='both')
-                    
-                    # Fill any remaining NaN values with 0
-                    df[col] = df[col].fillna(0)
-                    
-                    # Ensure all values are finite after interpolation
-                    df[col] = df[col].replace([float('inf'), float('-inf')], 0)
-                    
-                    # Round and convert back to integer
-                    df[col] = df[col].round().astype(int)
-
-        # Convert back to dictionary format
-        return {col: df[col].tolist() for col in df.columns}
-    except Exception as e:
-        logging.error(f"Error during interpolation: {e}")
+        with os.fdopen(fd, 'w', newline='') as f:
+            df.to_csv(f, index=False)
+        os.replace(tmp_path, processed_csv_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise
 
-def trim_csv_data(file_path, folder_number, start_timestamp, end_timestamp):
-    """
-    Trim the processed CSV data to only include records between the start and end timestamps
-    
-    Args:
-        file_path: Original CSV file path
-        folder_number: Project folder number
-        start_timestamp: Start timestamp in seconds (float)
-        end_timestamp: End timestamp in seconds (float)
-        
-    Returns:
-        Tuple of (csv_type, processed_data)
-    """
+def save_telemetry_pyramid(processed_data, processed_csv_path):
+    """Rebuild the zoom pyramid for a processed CSV; failures are not fatal"""
     try:
-        logging.info(f"Trimming CSV data from {start_timestamp} to {end_timestamp}")
-        
-        # Get processed data path
-        processed_csv_path = os.path.join('processed_data', f'project_{folder_number}_{os.path.basename(file_path)}')
-        
-        # Check if processed file exists
-        if not os.path.exists(processed_csv_path):
-            logging.error(f"Processed CSV file not found: {processed_csv_path}")
-            raise FileNotFoundError(f"Processed CSV file not found: {processed_csv_path}")
-        
-        # Load existing processed data
-        df = pd.read_csv(processed_csv_path)
-        # Определяем тип CSV на основе имени колонок
-        csv_type = detect_csv_type(df)
-        
-        # Для обработанных файлов установим тип по умолчанию
-        if csv_type == 'processed':
-            csv_type = 'darnkessbot'  # Используем как значение по умолчанию
-            logging.info("Using 'darnkessbot' as default type for processed file")
-        
-        # Filter data by timestamp range
-        df = df[(df['timestamp'] >= start_timestamp) & (df['timestamp'] <= end_timestamp)]
-        
-        if len(df) == 0:
-            raise ValueError("No data remains after trimming. Choose a wider time range.")
-        
-        # Save trimmed data back to the processed file
-        df.to_csv(processed_csv_path, index=False)
-        logging.info(f"Saved trimmed CSV with {len(df)} rows to {processed_csv_path}")
-        
-        # Convert DataFrame to dictionary format
-        processed_data = {
-            'timestamp': df['timestamp'].tolist(),
-            'speed': df['speed'].tolist(),
-            'voltage': df['voltage'].tolist(),
-            'temperature': df['temperature'].tolist(),
-            'current': df['current'].tolist(),
-            'battery': df['battery'].tolist(),
-            'mileage': df['mileage'].tolist(),
-            'pwm': df['pwm'].tolist(),
-            'power': df['power'].tolist()
-        }
-        
-        # Add gps data if it exists, otherwise use zeros
-        if 'gps' in df.columns:
-            processed_data['gps'] = df['gps'].tolist()
-        else:
-            processed_data['gps'] = [0] * len(df['timestamp'])
-        
-        return csv_type, processed_data
-        
+        build_pyramid(processed_data, processed_csv_path)
     except Exception as e:
-        logging.error(f"Error trimming CSV data: {e}")
-        raise
+        logging.warning(f"Could not build telemetry pyramid for {processed_csv_path}: {e}")
+        # The old pyramid (and its columnar cache) no longer matches the CSV
+        remove_pyramid(processed_csv_path)
+
 
+def apply_trim(processed_data, trim_range):
+    """
+    Rows of processed Telemetry inside a project's trim range
+
+    Trimming is stored on the project (Project.get_trim_range()) and never
+    rewrites the processed data; the result is a view sorted by timestamp.
+    """
+    processed_data = processed_data.sorted()
+    if not trim_range:
+        return processed_data
+    return processed_data.between(*trim_range)
 
 
 def process_csv_file(file_path, folder_number=None, existing_csv_type=None, interpolate_values=True):
@@ -348,7 +418,7 @@ def process_csv_file(file_path, folder_number=None, existing_csv_type=None, inte
         interpolate_values (bool): Флаг для выполнения интерполяции числовых данных.
 
     Returns:
-        tuple: (csv_type, processed_data) - тип CSV и словарь с обработанными данными.
+        tuple: (csv_type, processed_data) - тип CSV и обработанные данные (Telemetry).
 
     Raises:
         Exception: Если произошла ошибка при обработке файла.
@@ -364,42 +434,32 @@ def process_csv_file(file_path, folder_number=None, existing_csv_type=None, inte
 
         # Проверяем, существует ли обработанный файл
         if processed_csv_path and os.path.exists(processed_csv_path):
+            # Columnar cache next to the processed CSV: already interpolated and deduplicated rows
+            cached = load_cached_telemetry(processed_csv_path)
+            if cached is not None:
+                logging.info(f"Загружаем обработанные данные из кэша для {processed_csv_path}")
+                # Same type as the uncached path below, detected from the CSV header only
+                csv_type = processed_csv_type(pd.read_csv(processed_csv_path, nrows=0), existing_csv_type)
+                return csv_type, cached
+
             logging.info(f"Загружаем существующий обработанный CSV из {processed_csv_path}")
             df = pd.read_csv(processed_csv_path)
-            csv_type = existing_csv_type or detect_csv_type(df)
-
-            # Для обработанных файлов устанавливаем тип по умолчанию
-            if csv_type == 'processed':
-                csv_type = 'darnkessbot'  # Значение по умолчанию
-                logging.info("Используем 'darnkessbot' как тип по умолчанию для обработанного файла")
-
-            # Преобразуем DataFrame в словарь с необходимыми колонками
-            processed_data = {
-                'timestamp': df['timestamp'].tolist(),
-                'speed': df['speed'].tolist(),
-                'voltage': df['voltage'].tolist(),
-                'temperature': df['temperature'].tolist(),
-                'current': df['current'].tolist(),
-                'battery': df['battery'].tolist(),
-                'mileage': df['mileage'].tolist(),
-                'pwm': df['pwm'].tolist(),
-                'power': df['power'].tolist()
-            }
-            
+            csv_type = processed_csv_type(df, existing_csv_type)
+
             # Add GPS data if available, otherwise use zeros
-            if 'gps' in df.columns:
-                processed_data['gps'] = df['gps'].tolist()
-            else:
-                processed_data['gps'] = [0] * len(df['timestamp'])
+            if 'gps' not in df.columns:
+                df['gps'] = 0
+
+            # Колонки DataFrame как массивы NumPy (без копирования в списки)
+            processed_data = {col: df[col].to_numpy() for col in ['timestamp'] + DUPLICATE_CHECK_COLUMNS}
 
             # Применяем интерполяцию, если требуется
             if interpolate_values:
-                columns_to_interpolate = ['speed', 'gps', 'voltage', 'temperature', 'current', 
-                                         'battery', 'mileage', 'pwm', 'power']
-                processed_data = interpolate_numeric_data(processed_data, columns_to_interpolate)
+                processed_data = interpolate_numeric_data(processed_data, DUPLICATE_CHECK_COLUMNS)
 
             # Удаляем последовательные дубликаты
-            processed_data = remove_consecutive_duplicates(processed_data)
+            processed_data = Telemetry(remove_consecutive_duplicates(processed_data))
+            save_telemetry_pyramid(processed_data, processed_csv_path)
             return csv_type, processed_data
 
         # Если файла нет, обрабатываем CSV
@@ -450,146 +510,17 @@ def process_csv_file(file_path, folder_number=None, existing_csv_type=None, inte
             csv_type = detect_csv_type(df)
             logging.info(f"Определённый тип CSV: {csv_type}")
 
+        # Временные метки, интерполяция, очистка, пробег и удаление дубликатов
+        # (тот же код, что и в потоковой аналитике)
+        processed_data = standardize_csv_frame(df, csv_type, interpolate_values)
         if csv_type == 'processed':
-            # Initialize raw_data with required columns
-            raw_data = {
-                'timestamp': df['timestamp'],
-                'speed': df['speed'],
-                'voltage': df['voltage'],
-                'temperature': df['temperature'],
-                'current': df['current'],
-                'battery': df['battery'],
-                'mileage': df['mileage'],
-                'pwm': df['pwm'],
-                'power': df['power']
-            }
-            
-            # Add GPS if available, otherwise use zeros
-            if 'gps' in df.columns:
-                raw_data['gps'] = df['gps']
-            else:
-                # Create a series of zeros with the same length as timestamp
-                raw_data['gps'] = pd.Series([0] * len(df['timestamp']))
-                
-            processed_data = raw_data
             csv_type = 'darnkessbot'
 
-        elif csv_type == 'darnkessbot':
-            # Для больших файлов используем векторизованный парсинг
-            if file_size_mb > 20:
-                df['timestamp'] = pd.to_datetime(
-                    df['Date'], 
-                    format='%d.%m.%Y %H:%M:%S.%f', 
-                    errors='coerce'
-                ).astype('int64') // 10**9
-                invalid_dates = df[df['timestamp'].isna()]['Date']
-                if not invalid_dates.empty:
-                    logging.warning(f"Найдено {len(invalid_dates)} некорректных дат, например: {invalid_dates.iloc[0]}")
-            else:
-                df['timestamp'] = df['Date'].apply(parse_timestamp_darnkessbot)
-
-            # Фильтруем строки с некорректными временными метками
-            valid_timestamp_mask = df['timestamp'].notna()
-            df = df[valid_timestamp_mask]
-
-            # Initialize raw_data with required columns
-            raw_data = {
-                'timestamp': df['timestamp'],
-                'speed': pd.to_numeric(df['Speed'], errors='coerce'),
-                'voltage': pd.to_numeric(df['Voltage'], errors='coerce'),
-                'temperature': pd.to_numeric(df['Temperature'], errors='coerce'),
-                'current': pd.to_numeric(df['Current'], errors='coerce'),
-                'battery': pd.to_numeric(df['Battery level'], errors='coerce'),
-                'mileage': pd.to_numeric(df['Total mileage'], errors='coerce'),
-                'pwm': pd.to_numeric(df['PWM'], errors='coerce'),
-                'power': pd.to_numeric(df['Power'], errors='coerce')
-            }
-            
-            # Add GPS speed if available, otherwise use zeros
-            if 'GPS Speed' in df.columns:
-                raw_data['gps'] = pd.to_numeric(df['GPS Speed'], errors='coerce')
-            else:
-                # Create a series of zeros with the same length as timestamp
-                raw_data['gps'] = pd.Series([0] * len(df['timestamp']))
-
-            if interpolate_values:
-                columns_to_interpolate = ['speed', 'gps', 'voltage', 'temperature', 'current', 
-                                         'battery', 'mileage', 'pwm', 'power']
-                raw_data = interpolate_numeric_data(raw_data, columns_to_interpolate)
-
-            processed_data = {
-                'timestamp': raw_data['timestamp'],
-                'speed': clean_numeric_column(pd.Series(raw_data['speed'])),
-                'gps': clean_numeric_column(pd.Series(raw_data['gps'])),
-                'voltage': clean_numeric_column(pd.Series(raw_data['voltage'])),
-                'temperature': clean_numeric_column(pd.Series(raw_data['temperature'])),
-                'current': clean_numeric_column(pd.Series(raw_data['current'])),
-                'battery': clean_numeric_column(pd.Series(raw_data['battery'])),
-                'mileage': process_mileage(pd.Series(raw_data['mileage']), csv_type),
-                'pwm': clean_numeric_column(pd.Series(raw_data['pwm'])),
-                'power': clean_numeric_column(pd.Series(raw_data['power']))
-            }
-
-        else:  # wheellog
-            if file_size_mb > 20:
-                try:
-                    df['datetime_str'] = df['date'] + ' ' + df['time']
-                    df['timestamp'] = pd.to_datetime(df['datetime_str'], format='%Y-%m-%d %H:%M:%S.%f').astype('int64') // 10**9
-                except Exception as e:
-                    logging.warning(f"Ошибка векторизованного преобразования для wheellog, используем apply: {e}")
-                    df['timestamp'] = df.apply(lambda x: parse_timestamp_wheellog(x['date'], x['time']), axis=1)
-            else:
-                df['timestamp'] = df.apply(lambda x: parse_timestamp_wheellog(x['date'], x['time']), axis=1)
-
-            valid_timestamp_mask = df['timestamp'].notna()
-            df = df[valid_timestamp_mask]
-
-            # Initialize raw_data with required columns
-            raw_data = {
-                'timestamp': df['timestamp'],
-                'speed': pd.to_numeric(df['speed'], errors='coerce'),
-                'voltage': pd.to_numeric(df['voltage'], errors='coerce'),
-                'temperature': pd.to_numeric(df['system_temp'], errors='coerce'),
-                'current': pd.to_numeric(df['current'], errors='coerce'),
-                'battery': pd.to_numeric(df['battery_level'], errors='coerce'),
-                'mileage': pd.to_numeric(df['totaldistance'], errors='coerce'),
-                'pwm': pd.to_numeric(df['pwm'], errors='coerce'),
-                'power': pd.to_numeric(df['power'], errors='coerce')
-            }
-            
-            # Add GPS speed if available, otherwise use zeros
-            if 'gps_speed' in df.columns:
-                raw_data['gps'] = pd.to_numeric(df['gps_speed'], errors='coerce')
-            else:
-                # Create a series of zeros with the same length as timestamp
-                raw_data['gps'] = pd.Series([0] * len(df['timestamp']))
-
-            if interpolate_values:
-                columns_to_interpolate = ['speed', 'gps', 'voltage', 'temperature', 'current', 
-                                         'battery', 'mileage', 'pwm', 'power']
-                raw_data = interpolate_numeric_data(raw_data, columns_to_interpolate)
-
-            processed_data = {
-                'timestamp': raw_data['timestamp'],
-                'speed': clean_numeric_column(pd.Series(raw_data['speed'])),
-                'gps': clean_numeric_column(pd.Series(raw_data['gps'])),
-                'voltage': clean_numeric_column(pd.Series(raw_data['voltage'])),
-                'temperature': clean_numeric_column(pd.Series(raw_data['temperature'])),
-                'current': clean_numeric_column(pd.Series(raw_data['current'])),
-                'battery': clean_numeric_column(pd.Series(raw_data['battery'])),
-                'mileage': process_mileage(pd.Series(raw_data['mileage']), csv_type),
-                'pwm': clean_numeric_column(pd.Series(raw_data['pwm'])),
-                'power': clean_numeric_column(pd.Series(raw_data['power']))
-            }
-
-        # Удаляем последовательные дубликаты
-        processed_data = remove_consecutive_duplicates(processed_data)
-
         # Сохраняем обработанные данные, если указан folder_number
         if processed_csv_path:
-            processed_df = pd.DataFrame(processed_data)
-            processed_df.to_csv(processed_csv_path, index=False)
+            write_processed_csv(processed_data.to_frame(), processed_csv_path)
             logging.info(f"Сохранён обработанный CSV в {processed_csv_path}")
+            save_telemetry_pyramid(processed_data, processed_csv_path)
 
         return csv_type, processed_data
 
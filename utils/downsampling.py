@@ -0,0 +1,158 @@
+"""
+Server-side downsampling of telemetry series for charts.
+
+Charts are drawn at roughly 1-2k pixels wide, so shipping every row is
+wasted bandwidth. Two modes are provided:
+
+- 'lttb'   Largest-Triangle-Three-Buckets on a single primary column. Keeps the
+           visual shape of the line with exactly the requested point count.
+- 'minmax' Keeps the first/last row plus the minimum and maximum of every
+           requested column in each bucket, so peaks such as PWM spikes are
+           never dropped.
+
+All functions return sorted row indices so every column of a dataset can be
+sliced consistently.
+"""
+import logging
+
+import numpy as np
+
+DEFAULT_CHART_POINTS = 2000
+MIN_CHART_POINTS = 10
+MAX_CHART_POINTS = 20000
+DOWNSAMPLE_MODES = ('minmax', 'lttb')
+
+
+def clamp_points(points, default=DEFAULT_CHART_POINTS):
+    """Parse and clamp a requested point count to a sane range"""
+    try:
+        points = int(points)
+    except (TypeError, ValueError):
+        return default
+    return max(MIN_CHART_POINTS, min(MAX_CHART_POINTS, points))
+
+
+def time_range_slice(timestamps, start=None, end=None):
+    """
+    Return the (lo, hi) index range of sorted timestamps within [start, end]
+
+    Either bound may be None to leave that side open.
+    """
+    timestamps = np.asarray(timestamps)
+    lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+    hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+    return lo, max(lo, hi)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Args:
+        x: sorted x values (timestamps)
+        y: values of the primary column
+        threshold: number of points to keep
+
+    Returns:
+        np.ndarray of selected row indices (always includes first and last row)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket edges for the n - 2 inner points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_end = next_start + 1
+
+        # Average point of the next bucket
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Point of the current bucket forming the largest triangle
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs((x[a] - avg_x) * (bucket_y - y[a]) -
+                       (x[a] - bucket_x) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax_indices(columns, threshold):
+    """
+    Min/max-per-bucket downsampling over one or more columns
+
+    Args:
+        columns: list of value arrays of equal length
+        threshold: approximate upper bound of points to keep
+
+    Returns:
+        np.ndarray of sorted, unique row indices
+    """
+    columns = [np.nan_to_num(np.asarray(col, dtype=np.float64)) for col in columns]
+    n = len(columns[0]) if columns else 0
+    if threshold >= n or n == 0:
+        return np.arange(n)
+
+    # Each bucket contributes up to two points per column
+    bucket_count = max(1, (threshold - 2) // (2 * len(columns)))
+    edges = np.linspace(0, n, bucket_count + 1).astype(np.int64)
+
+    picked = [np.array([0, n - 1], dtype=np.int64)]
+    for col in columns:
+        starts = edges[:-1]
+        # Per-bucket min/max values via reduceat, then locate them inside each bucket
+        bucket_ids = np.repeat(np.arange(bucket_count), np.diff(edges))
+        bucket_min = np.minimum.reduceat(col, starts)
+        bucket_max = np.maximum.reduceat(col, starts)
+        is_min = col == bucket_min[bucket_ids]
+        is_max = col == bucket_max[bucket_ids]
+        # First occurrence of the min and max in every bucket
+        min_idx = np.flatnonzero(is_min)
+        max_idx = np.flatnonzero(is_max)
+        _, first_min = np.unique(bucket_ids[min_idx], return_index=True)
+        _, first_max = np.unique(bucket_ids[max_idx], return_index=True)
+        picked.append(min_idx[first_min])
+        picked.append(max_idx[first_max])
+
+    return np.unique(np.concatenate(picked))
+
+
+def downsample_indices(timestamps, columns, threshold, mode='minmax'):
+    """
+    Select row indices to send to a chart
+
+    Args:
+        timestamps: sorted timestamps of the rows
+        columns: dict {name: values} of the charted columns; the first column
+                 is used as the primary series for LTTB
+        threshold: target number of points
+        mode: 'minmax' (default, preserves peaks) or 'lttb'
+
+    Returns:
+        np.ndarray of sorted row indices
+    """
+    n = len(timestamps)
+    if n <= threshold:
+        return np.arange(n)
+
+    if mode not in DOWNSAMPLE_MODES:
+        logging.warning(f"Unknown downsampling mode '{mode}', using 'minmax'")
+        mode = 'minmax'
+
+    values = list(columns.values())
+    if mode == 'lttb':
+        return lttb_indices(timestamps, values[0], threshold)
+    return minmax_indices(values, threshold)
@@ -1,6 +1,8 @@
+import os
 import platform
 import subprocess
 import logging
+import threading
 
 # Global cache for hardware detection
 _is_apple_silicon_cache = None
@@ -53,4 +55,226 @@ def get_hardware_info():
     }
 
     logging.debug(f"Hardware info cached: {_hardware_info_cache}")
-    return _hardware_info_cache
\ No newline at end of file
+    return _hardware_info_cache
+
+# Video encoders in order of preference per codec. Hardware encoders are
+# only used when ffmpeg lists them and a test encode succeeds.
+ENCODER_CANDIDATES = {
+    'h264': ['h264_videotoolbox', 'h264_nvenc', 'h264_qsv', 'h264_vaapi', 'h264_amf', 'libx264'],
+    'h265': ['hevc_videotoolbox', 'hevc_nvenc', 'hevc_qsv', 'hevc_vaapi', 'hevc_amf', 'libx265']
+}
+SOFTWARE_ENCODERS = {'h264': 'libx264', 'h265': 'libx265'}
+
+# Codecs that keep the overlay's alpha channel (frames are rendered without
+# the blue chroma background): encoder, container and output arguments
+ALPHA_CODECS = {
+    'prores4444': {'encoder': 'prores_ks', 'container': 'mov',
+                   'output_args': ['-profile:v', '4444', '-pix_fmt', 'yuva444p10le', '-vendor', 'apl0']},
+    'vp9_alpha': {'encoder': 'libvpx-vp9', 'container': 'webm',
+                  'output_args': ['-pix_fmt', 'yuva420p', '-crf', '30', '-b:v', '0', '-row-mt', '1']},
+    'qtrle': {'encoder': 'qtrle', 'container': 'mov',
+              'output_args': ['-pix_fmt', 'argb']}
+}
+VIDEO_CODECS = list(ENCODER_CANDIDATES) + list(ALPHA_CODECS)
+
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# Bitrates for encoders driven by a target bitrate
+VIDEO_BITRATES = {'fullhd': '8M', '4k': '20M'}
+
+# Hardware encoder settings per resolution: (input args, output args)
+HARDWARE_ENCODER_SETTINGS = {
+    'h264_videotoolbox': lambda bitrate: (
+        ['-hwaccel', 'videotoolbox', '-hwaccel_output_format', 'videotoolbox_vld'],
+        ['-allow_sw', '1', '-b:v', bitrate, '-maxrate', bitrate, '-bufsize', bitrate,
+         '-profile:v', 'main', '-pix_fmt', 'yuv420p', '-tag:v', 'avc1']),
+    'hevc_videotoolbox': lambda bitrate: (
+        ['-hwaccel', 'videotoolbox', '-hwaccel_output_format', 'videotoolbox_vld'],
+        ['-allow_sw', '1', '-b:v', bitrate, '-maxrate', bitrate, '-bufsize', bitrate,
+         '-profile:v', 'main', '-pix_fmt', 'yuv420p', '-tag:v', 'hvc1', '-alpha_quality', '0']),
+    'h264_nvenc': lambda bitrate: (
+        [], ['-preset', 'p5', '-rc', 'vbr', '-cq', '23', '-b:v', bitrate, '-pix_fmt', 'yuv420p']),
+    'hevc_nvenc': lambda bitrate: (
+        [], ['-preset', 'p5', '-rc', 'vbr', '-cq', '28', '-b:v', bitrate, '-pix_fmt', 'yuv420p', '-tag:v', 'hvc1']),
+    'h264_qsv': lambda bitrate: (
+        [], ['-preset', 'medium', '-global_quality', '23', '-pix_fmt', 'nv12']),
+    'hevc_qsv': lambda bitrate: (
+        [], ['-preset', 'medium', '-global_quality', '28', '-pix_fmt', 'nv12', '-tag:v', 'hvc1']),
+    'h264_vaapi': lambda bitrate: (
+        ['-vaapi_device', VAAPI_DEVICE], ['-vf', 'format=nv12,hwupload', '-qp', '23']),
+    'hevc_vaapi': lambda bitrate: (
+        ['-vaapi_device', VAAPI_DEVICE], ['-vf', 'format=nv12,hwupload', '-qp', '28', '-tag:v', 'hvc1']),
+    'h264_amf': lambda bitrate: (
+        [], ['-quality', 'balanced', '-rc', 'cqp', '-qp_i', '23', '-qp_p', '23', '-pix_fmt', 'yuv420p']),
+    'hevc_amf': lambda bitrate: (
+        [], ['-quality', 'balanced', '-rc', 'cqp', '-qp_i', '28', '-qp_p', '28', '-pix_fmt', 'yuv420p',
+             '-tag:v', 'hvc1'])
+}
+
+# Software encoder presets (speed/quality) per codec and resolution for a
+# single job with enough threads, and constant rate factors
+SOFTWARE_PRESETS = {
+    ('libx264', 'fullhd'): 'medium',
+    ('libx264', '4k'): 'medium',
+    ('libx265', 'fullhd'): 'medium',
+    ('libx265', '4k'): 'fast'
+}
+SOFTWARE_CRF = {'libx264': '23', 'libx265': '28'}
+PRESET_LADDER = ['slow', 'medium', 'fast', 'faster', 'veryfast', 'superfast', 'ultrafast']
+
+_ffmpeg_encoders_cache = None
+_verified_encoders_cache = {}
+_selected_encoder_cache = {}
+_encoder_lock = threading.Lock()
+
+
+def get_ffmpeg_encoders():
+    """
+    Names of the encoders the installed ffmpeg supports ('ffmpeg -encoders')
+    Result is cached after first call; empty if ffmpeg cannot be run
+    """
+    global _ffmpeg_encoders_cache
+
+    if _ffmpeg_encoders_cache is not None:
+        return _ffmpeg_encoders_cache
+
+    encoders = set()
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                capture_output=True, text=True, timeout=30)
+        for line in result.stdout.splitlines():
+            parts = line.split()
+            # Encoder lines look like ' V....D libx264  libx264 H.264 / AVC ...'
+            if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS':
+                encoders.add(parts[1])
+    except Exception as e:
+        logging.error(f"Error listing ffmpeg encoders: {e}")
+
+    _ffmpeg_encoders_cache = encoders
+    return encoders
+
+
+def verify_encoder(encoder):
+    """
+    Check that an encoder really works by encoding a few test frames
+    Hardware encoders can be listed without a usable device. Cached per encoder.
+    """
+    if encoder in _verified_encoders_cache:
+        return _verified_encoders_cache[encoder]
+
+    input_args, output_args = _encoder_args(encoder, 'fullhd', 1)
+    command = (['ffmpeg', '-hide_banner', '-loglevel', 'error'] + input_args +
+               ['-f', 'lavfi', '-i', 'color=c=blue:s=320x240:r=10:d=0.3', '-c:v', encoder] +
+               output_args + ['-f', 'null', '-'])
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=30)
+        works = result.returncode == 0
+        if not works:
+            logging.info(f"Encoder {encoder} is listed but failed a test encode: {result.stderr.strip()[-200:]}")
+    except Exception as e:
+        logging.info(f"Encoder {encoder} test failed: {e}")
+        works = False
+
+    _verified_encoders_cache[encoder] = works
+    return works
+
+
+def get_encoder_threads(concurrent_jobs=1):
+    """Encoder threads for one job when 'concurrent_jobs' jobs share the CPU"""
+    return max(1, (os.cpu_count() or 1) // max(1, concurrent_jobs))
+
+
+def _software_preset(encoder, resolution, threads):
+    """Base preset for the codec/resolution, one or two steps faster on few threads"""
+    preset = SOFTWARE_PRESETS.get((encoder, resolution), 'medium')
+    step = 0 if threads >= 4 else 1 if threads >= 2 else 2
+    index = min(PRESET_LADDER.index(preset) + step, len(PRESET_LADDER) - 1)
+    return PRESET_LADDER[index]
+
+
+def _encoder_args(encoder, resolution, concurrent_jobs):
+    """(input args, output args) for an encoder"""
+    if encoder in HARDWARE_ENCODER_SETTINGS:
+        return HARDWARE_ENCODER_SETTINGS[encoder](VIDEO_BITRATES.get(resolution, '8M'))
+
+    threads = get_encoder_threads(concurrent_jobs)
+    output_args = ['-pix_fmt', 'yuv420p',
+                   '-preset', _software_preset(encoder, resolution, threads),
+                   '-crf', SOFTWARE_CRF.get(encoder, '23'),
+                   '-threads', str(threads)]
+    if encoder == 'libx265':
+        output_args += ['-tag:v', 'hvc1', '-x265-params', f'pools={threads}:log-level=error']
+    return [], output_args
+
+
+def select_encoder(codec):
+    """
+    Best working encoder for a codec ('h264' or 'h265')
+    Candidates are tried in ENCODER_CANDIDATES order; the software encoder
+    is the fallback. Result is cached per codec.
+    """
+    with _encoder_lock:
+        if codec in _selected_encoder_cache:
+            return _selected_encoder_cache[codec]
+
+        available = get_ffmpeg_encoders()
+        software = SOFTWARE_ENCODERS.get(codec, 'libx264')
+        selected = software
+        for encoder in ENCODER_CANDIDATES.get(codec, [software]):
+            if encoder == software:
+                break
+            if encoder in available and verify_encoder(encoder):
+                selected = encoder
+                break
+
+        if selected == software and available and not verify_encoder(software):
+            logging.error(f"Software encoder {software} failed a test encode")
+
+        logging.info(f"Selected video encoder for {codec}: {selected}")
+        _selected_encoder_cache[codec] = selected
+        return selected
+
+
+def is_alpha_codec(codec):
+    """True for codecs whose videos keep the overlay transparent"""
+    return codec in ALPHA_CODECS
+
+
+def get_video_container(codec):
+    """File extension of videos encoded with a codec"""
+    return ALPHA_CODECS[codec]['container'] if codec in ALPHA_CODECS else 'mp4'
+
+
+def get_encoder_config(codec, resolution='fullhd', concurrent_jobs=1):
+    """
+    Encoder and ffmpeg arguments for a video job
+
+    Returns:
+        dict with 'encoder', 'hardware', 'input_args' (before -i) and
+        'output_args' (after -c:v)
+    """
+    if codec in ALPHA_CODECS:
+        alpha = ALPHA_CODECS[codec]
+        return {
+            'encoder': alpha['encoder'],
+            'hardware': False,
+            'input_args': [],
+            'output_args': alpha['output_args'] + ['-threads', str(get_encoder_threads(concurrent_jobs))]
+        }
+
+    encoder = select_encoder(codec)
+    input_args, output_args = _encoder_args(encoder, resolution, concurrent_jobs)
+    return {
+        'encoder': encoder,
+        'hardware': encoder in HARDWARE_ENCODER_SETTINGS,
+        'input_args': input_args,
+        'output_args': output_args
+    }
+
+
+def probe_encoders():
+    """Detect and cache the encoders for all codecs (run once at startup)"""
+    if not get_ffmpeg_encoders():
+        logging.warning("ffmpeg encoders could not be detected; using software encoders")
+    for codec in ENCODER_CANDIDATES:
+        select_encoder(codec)
@@ -6,9 +6,11 @@ import logging
 import shutil
 import concurrent.futures
 import threading
+import time
 from functools import lru_cache
 from utils.hardware_detection import is_apple_silicon
 from utils.image_processor import create_speed_indicator
+from utils.render_cache import RenderCache, image_nbytes, font_nbytes
 from concurrent.futures import ThreadPoolExecutor
 import cairosvg
 import io
@@ -17,22 +19,24 @@ _metal_initialized = False
 _metal_context = None
 _metal_device = None
 
+# Memory budgets of the render caches (see utils/render_cache.py)
+ICON_CACHE_BYTES = 16 * 1024 * 1024
+FONT_CACHE_BYTES = 64 * 1024 * 1024
+BOX_CACHE_BYTES = 64 * 1024 * 1024
+
 # Cache for loaded icons - clear cache when restarting
-_icon_cache = {}
+_icon_cache = RenderCache('icons', ICON_CACHE_BYTES, image_nbytes)
 
 def clear_icon_cache():
     """Clear the icon cache to force reload of updated SVG files."""
-    global _icon_cache
     _icon_cache.clear()
     logging.info("Icon cache cleared")
 
 def load_icon(icon_name, size=24, color='white'):
-    """Load and cache an icon from PNG file, return PIL Image with inversion if needed."""
-    cache_key = f"{icon_name}_{size}_{color}"
-    
-    if cache_key in _icon_cache:
-        return _icon_cache[cache_key]
-    
+    """Load and cache an icon from PNG file, return PIL Image with inversion if needed (shared, do not modify)."""
+    return _icon_cache.get_or_create((icon_name, size, color), lambda: _read_icon(icon_name, size, color))
+
+def _read_icon(icon_name, size, color):
     try:
         # Load PNG file
         icon_path = os.path.join('static', 'icons', 'icons_telemetry', f'{icon_name}.png')
@@ -61,34 +65,12 @@ def load_icon(icon_name, size=24, color='white'):
                         # Invert RGB values
                         pixels[x, y] = (255 - r, 255 - g, 255 - b, a)
         
-        # Cache the result
-        _icon_cache[cache_key] = icon_image
-        
         return icon_image
         
     except Exception as e:
         logging.error(f"Error loading icon {icon_name}: {e}")
         return None
 
-def get_icon_name_for_label(label, loc):
-    """Map label text to icon filename."""
-    # Create a mapping from localized labels to icon names
-    label_to_icon = {
-        loc['speed']: 'speed',
-        loc['max_speed']: 'max_speed', 
-        loc['voltage']: 'voltage',
-        loc['temp']: 'temp',
-        loc['battery']: 'battery',
-        loc['gps']: 'gps',
-        loc['mileage']: 'mileage',
-        loc['pwm']: 'pwm',
-        loc['power']: 'power',
-        loc['current']: 'current',
-        loc['time']: 'time'
-    }
-    
-    return label_to_icon.get(label, 'speed')  # Default to speed icon
-
 _LOCALIZATION = {
     'en': {
         'speed': 'Speed',
@@ -160,7 +142,7 @@ def _initialize_metal():
     return False
 
 
-_font_cache = {}
+_font_cache = RenderCache('fonts', FONT_CACHE_BYTES, font_nbytes)
 
 def calculate_max_widths_for_static_boxes(df, text_settings, use_icons=False, locale='en', resolution='fullhd'):
     """Calculate maximum text width for each telemetry parameter to ensure static box sizes"""
@@ -275,32 +257,52 @@ def calculate_max_widths_for_static_boxes(df, text_settings, use_icons=False, lo
 
 
 def _get_font(font_path, size):
-    cache_key = f"{font_path}_{size}"
-    if cache_key not in _font_cache:
-        try:
-            _font_cache[cache_key] = ImageFont.truetype(font_path, size)
-            logging.debug(f"Cached font {font_path} at size {size}")
-        except Exception as e:
-            logging.error(f"Error loading font {font_path}: {e}")
-            raise ValueError(f"Could not load font {font_path}")
-    return _font_cache[cache_key]
+    return _font_cache.get_or_create((font_path, size), lambda: _load_font(font_path, size))
 
 
-_box_cache = {}
+def _load_font(font_path, size):
+    try:
+        font = ImageFont.truetype(font_path, size)
+        logging.debug(f"Loaded font {font_path} at size {size}")
+        return font
+    except Exception as e:
+        logging.error(f"Error loading font {font_path}: {e}")
+        raise ValueError(f"Could not load font {font_path}")
 
 
-def create_rounded_box(width, height, radius):
-    cache_key = f"{width}_{height}_{radius}"
-    if cache_key not in _box_cache:
+_box_cache = RenderCache('boxes', BOX_CACHE_BYTES, image_nbytes)
+
+
+def create_rounded_box(width, height, radius, color=None):
+    """
+    Cached rounded box (shared, do not modify)
+
+    color tints the black box (same edges, cached as its own variant).
+    """
+    return _box_cache.get_or_create((width, height, radius, color),
+                                    lambda: _draw_rounded_box(width, height, radius, color))
+
+
+def _draw_rounded_box(width, height, radius, color):
+    if color is None:
         image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
         draw = ImageDraw.Draw(image)
         draw.rounded_rectangle([(0, 0), (width - 1, height - 1)],
                                radius=radius,
                                fill=(0, 0, 0, 255))
         image = image.filter(ImageFilter.GaussianBlur(radius=0.5))
-        _box_cache[cache_key] = image
-        logging.debug(f"Created and cached rounded box {cache_key}")
-    return _box_cache[cache_key].copy()
+    else:
+        image = Image.new('RGBA', (width, height), color)
+        image.putalpha(create_rounded_box(width, height, radius).getchannel('A'))
+    logging.debug(f"Created and cached rounded box {(width, height, radius, color)}")
+    return image
+
+
+def encode_frame_png(frame, transparent=False):
+    """Encode a rendered frame as PNG bytes (RGBA for transparent frames)"""
+    buffer = io.BytesIO()
+    frame.convert('RGBA' if transparent else 'RGB').save(buffer, format='PNG', quality=95, optimize=True)
+    return buffer.getvalue()
 
 
 def create_frame(values,
@@ -308,317 +310,31 @@ def create_frame(values,
                   output_path=None,
                   text_settings=None,
                   locale='en',
-                  static_box_widths=None):
+                  static_box_widths=None,
+                  transparent=False,
+                  plan=None,
+                  frame=None):
+    """
+    Render one telemetry frame
+
+    By default the overlay is composited onto the blue chroma-key
+    background. With transparent=True the overlay is returned as is (RGBA),
+    for videos encoded with an alpha channel. plan is a RenderPlan from
+    compile_layout(); without one the layout is compiled for this frame,
+    and the other settings arguments are only used for that. frame is the
+    index of the frame when the plan has precomputed colour states.
+    """
     try:
-        # Определяем разрешение и масштаб
-        if resolution == "4k":
-            width, height = 3840, 2160
-            scale_factor = 2.0
-            indicator_size = 1000  # Увеличенный размер для 4K
-        else:  # fullhd
-            width, height = 1920, 1080
-            scale_factor = 1.0
-            indicator_size = 500  # Стандартный размер для Full HD
-
-        # Создаем синий фон и прозрачный оверлей
-        background = Image.new('RGBA', (width, height), (0, 0, 255, 255))
-        overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
-
-        text_settings = text_settings or {}
-
-        # Get visibility settings with defaults
-        show_speed = text_settings.get('show_speed', True)
-        show_max_speed = text_settings.get('show_max_speed', True)
-        show_gps = text_settings.get('show_gps', False)
-        show_voltage = text_settings.get('show_voltage', True)
-        show_temp = text_settings.get('show_temp', True)
-        show_battery = text_settings.get('show_battery', False)
-        show_mileage = text_settings.get('show_mileage', True)
-        show_pwm = text_settings.get('show_pwm', True)
-        show_power = text_settings.get('show_power', True)
-        show_current = text_settings.get('show_current', True)  # Add current visibility setting
-        show_time = text_settings.get('show_time', False)  # Add time visibility setting
-        show_bottom_elements = text_settings.get('show_bottom_elements', True)
-        use_icons = text_settings.get('use_icons', False)  # Add icons setting
-        vertical_layout = text_settings.get('vertical_layout', False)  # Add vertical layout setting
-        horizontal_position = float(text_settings.get('horizontal_position', 50))  # Add horizontal position setting
-
-        # Получаем настройки позиционирования индикатора и текста
-        indicator_x_percent = float(text_settings.get('indicator_x', 50))
-        indicator_y_percent = float(text_settings.get('indicator_y', 80))
-        speed_y_offset = int(text_settings.get('speed_y', 0))
-        unit_y_offset = int(text_settings.get('unit_y', 0))
-        speed_size = float(text_settings.get('speed_size', 100))
-        unit_size = float(text_settings.get('unit_size', 100))
-        indicator_scale = float(text_settings.get('indicator_scale', 100))
-
-        # Only create and paste speed indicator if bottom elements are enabled
-        if show_bottom_elements:
-            loc = _LOCALIZATION.get(locale, _LOCALIZATION['en'])
-            speed_indicator = create_speed_indicator(
-                values['speed'],
-                size=indicator_size,
-                speed_offset=(0, speed_y_offset),
-                unit_offset=(0, unit_y_offset),
-                speed_size=speed_size,
-                unit_size=unit_size,
-                indicator_scale=indicator_scale,
-                resolution=resolution,
-                locale=locale)
-
-            indicator_x = int((width - indicator_size) * indicator_x_percent / 100)
-            indicator_y = int((height - indicator_size) * indicator_y_percent / 100)
-            background.paste(speed_indicator, (indicator_x, indicator_y),
-                              speed_indicator)
-
-        font_size = int(text_settings.get('font_size', 26) * scale_factor)
-        # Icon size scales with font size to maintain proportions
-        icon_size = max(12, int(font_size * 0.8))  # Icon size proportional to font size
-        icon_vertical_offset = int(text_settings.get('icon_vertical_offset', 5))  # Icon vertical offset in pixels
-        icon_horizontal_spacing = int(text_settings.get('icon_horizontal_spacing', 10))  # Icon horizontal spacing in pixels
-        top_padding = int(text_settings.get('top_padding', 14) * scale_factor)
-        box_height = int(text_settings.get('bottom_padding', 47) * scale_factor)
-        spacing = int(text_settings.get('spacing', 10) * scale_factor)
-        vertical_position = int(text_settings.get('vertical_position', 1))
-        border_radius = int(text_settings.get('border_radius', 13) * scale_factor)
+        if plan is None:
+            from utils.overlay_widgets import compile_layout
+            plan = compile_layout(text_settings, resolution, locale, static_box_widths, transparent,
+                                  inputs=values)
 
-        try:
-            regular_font = _get_font("fonts/sf-ui-display-regular.otf", font_size)
-            bold_font = _get_font("fonts/sf-ui-display-bold.otf", font_size)
-        except Exception as e:
-            logging.error(f"Error loading font: {e}")
-            raise
-
-        # Filter params based on visibility settings
-        loc = _LOCALIZATION.get(locale, _LOCALIZATION['en'])
-        params = []
-
-        # Add each parameter only if its visibility is enabled
-        if show_speed:
-            params.append((loc['speed'], f"{values['speed']}", loc['units']['speed']))
-        if show_max_speed:
-            params.append((loc['max_speed'], f"{values['max_speed']}", loc['units']['speed']))
-        if show_gps and 'gps' in values:
-            params.append((loc['gps'], f"{values['gps']}", loc['units']['speed']))
-        if show_voltage:
-            params.append((loc['voltage'], f"{values['voltage']}", loc['units']['voltage']))
-        if show_temp:
-            params.append((loc['temp'], f"{values['temperature']}", loc['units']['temp']))
-        if show_battery and 'battery' in values:
-            params.append((loc['battery'], f"{values['battery']}", loc['units']['battery']))
-        if show_mileage:
-            params.append((loc['mileage'], f"{values['mileage']}", loc['units']['mileage']))
-        if show_pwm:
-            params.append((loc['pwm'], f"{values['pwm']}", loc['units']['pwm']))
-        if show_power:
-            params.append((loc['power'], f"{values['power']}", loc['units']['power']))
-        if show_current:  # Add current display
-            params.append((loc['current'], f"{values['current']}", loc['units']['current']))
-        if show_time and 'timestamp' in values:  # Add time display
-            # Convert timestamp to HH:MM:SS format
-            from datetime import datetime
-            time_str = datetime.fromtimestamp(values['timestamp']).strftime('%H:%M:%S')
-            params.append((loc['time'], time_str, ""))
-
-        if params:  # Only proceed if there are visible elements
-            element_widths = []
-            text_widths = []
-            text_heights = []
-            static_content_widths = []  # List to store static content widths for each element
-            total_width = 0
-
-            for label, value, unit in params:
-                # Determine parameter key for static width lookup
-                param_key = None
-                if label == loc['speed']:
-                    param_key = 'speed'
-                elif label == loc['max_speed']:
-                    param_key = 'max_speed'
-                elif label == loc['voltage']:
-                    param_key = 'voltage'
-                elif label == loc['temp']:
-                    param_key = 'temp'
-                elif label == loc['battery']:
-                    param_key = 'battery'
-                elif label == loc['mileage']:
-                    param_key = 'mileage'
-                elif label == loc['pwm']:
-                    param_key = 'pwm'
-                elif label == loc['power']:
-                    param_key = 'power'
-                elif label == loc['current']:
-                    param_key = 'current'
-                elif label == loc.get('gps'):
-                    param_key = 'gps'
-                elif label == loc.get('time'):
-                    param_key = 'time'
-                
-                # Calculate text width and height dynamically first (for proper spacing)
-                if use_icons:
-                    # For icons, calculate width differently
-                    value_bbox = draw.textbbox((0, 0), value, font=bold_font)
-                    unit_bbox = draw.textbbox((0, 0), f" {unit}", font=regular_font)
-                    
-                    dynamic_text_width = icon_size + icon_horizontal_spacing + (value_bbox[2] - value_bbox[0]) + (unit_bbox[2] - unit_bbox[0])  # Icon + spacing + value + unit
-                    text_height = max(icon_size, value_bbox[3] - value_bbox[1], unit_bbox[3] - unit_bbox[1])
-                else:
-                    # Original text-based layout
-                    label_bbox = draw.textbbox((0, 0), f"{label}: ", font=regular_font)
-                    value_bbox = draw.textbbox((0, 0), value, font=bold_font)
-                    unit_bbox = draw.textbbox((0, 0), f" {unit}", font=regular_font)
-
-                    dynamic_text_width = (label_bbox[2] - label_bbox[0]) + (value_bbox[2] - value_bbox[0]) + (unit_bbox[2] - unit_bbox[0])
-                    text_height = max(label_bbox[3] - label_bbox[1],
-                                      value_bbox[3] - value_bbox[1],
-                                      unit_bbox[3] - unit_bbox[1])
-                
-                # Use static width for both box sizing and content centering if available
-                if static_box_widths and param_key and param_key in static_box_widths:
-                    # Use static width for both element sizing and content centering
-                    static_content_width = static_box_widths[param_key]
-                    text_width = max(dynamic_text_width, static_content_width)  # Use larger of dynamic or static width
-                else:
-                    text_width = dynamic_text_width
-                    static_content_width = None
-
-                element_width = text_width + (2 * top_padding)
-                element_widths.append(element_width)
-                text_widths.append(text_width)
-                text_heights.append(text_height)
-                static_content_widths.append(static_content_width)  # Store static content width for each element
-                total_width += element_width
-
-            if vertical_layout:
-                # Вертикальное расположение плашек
-                total_height = len(params) * box_height + spacing * (len(params) - 1)
-                # Используем vertical_position для позиционирования всего столбца
-                base_y = int((height * vertical_position) / 100)
-                start_y = base_y - (total_height // 2)  # Центрируем относительно позиции
-                # Используем horizontal_position для позиционирования по горизонтали
-                # Фиксируем левый край плашек вместо центрирования
-                x_position = int((width * horizontal_position) / 100)
-                y_position = start_y
-                max_text_height = max(text_heights)
-            else:
-                # Горизонтальное расположение плашек (как было)
-                total_width += spacing * (len(params) - 1)
-                start_x = (width - total_width) // 2
-                y_position = int((height * vertical_position) / 100)
-                max_text_height = max(text_heights)
-                box_vertical_center = y_position + (box_height // 2)
-                text_baseline_y = box_vertical_center - (max_text_height // 2)
-                x_position = start_x
-            for i, ((label, value, unit), element_width, text_width, static_content_width) in enumerate(zip(params, element_widths, text_widths, static_content_widths)):
-                box_color = (0, 0, 0, 255)  # Стандартный черный цвет
-                text_color = (255, 255, 255, 255)  # Стандартный белый цвет
-
-                if label == loc['pwm']:
-                    pwm_value = int(value)
-                    if 80 <= pwm_value <= 90:
-                        box_color = (255, 255, 0, 255)  # Желтый цвет для PWM 80-90
-                        text_color = (0, 0, 0, 255)  # Черный текст
-                    elif pwm_value > 90:
-                        box_color = (255, 0, 0, 255)  # Красный цвет для PWM > 90
-                        text_color = (0, 0, 0, 255)  # Черный текст
-                elif label == loc['battery']:
-                    battery_value = int(value)
-                    if 10 <= battery_value <= 30:
-                        box_color = (255, 255, 0, 255)  # Желтый цвет для Battery 10-30
-                        text_color = (0, 0, 0, 255)  # Черный текст
-                    elif battery_value < 10:
-                        box_color = (255, 0, 0, 255)  # Красный цвет для Battery < 10
-                        text_color = (0, 0, 0, 255)  # Черный текст
-
-                box = create_rounded_box(element_width, box_height, border_radius)
-                if box_color != (0, 0, 0, 255):
-                    colored_box = Image.new('RGBA', box.size, box_color)
-                    colored_box.putalpha(box.split()[3])
-                    box = colored_box
-
-                overlay.paste(box, (x_position, y_position), box)
-
-                # Use static content width for centering if available
-                content_width_for_centering = static_content_width if static_content_width else text_width
-                text_x = x_position + ((element_width - content_width_for_centering) // 2)
-                
-                if vertical_layout:
-                    # В вертикальном режиме текст центрируется в каждой плашке
-                    box_vertical_center = y_position + (box_height // 2)
-                    text_y = box_vertical_center - (max_text_height // 2) - int(max_text_height * 0.2)
-                else:
-                    # В горизонтальном режиме используем общую базовую линию
-                    baseline_offset = int(max_text_height * 0.2)
-                    text_y = text_baseline_y - baseline_offset
-
-                if use_icons:
-                    # Draw with icon instead of text label
-                    icon_name = get_icon_name_for_label(label, loc)
-                    
-                    # Determine icon color based on box color
-                    # If box is colored (yellow/red), use black icon for better visibility
-                    icon_color = 'black' if box_color != (0, 0, 0, 255) else 'white'
-                    icon = load_icon(icon_name, icon_size, icon_color)
-                    
-                    if icon:
-                        # Calculate text metrics for proper alignment
-                        value_bbox = draw.textbbox((0, 0), value, font=bold_font)
-                        
-                        # Get actual text height from bounding box
-                        text_height = value_bbox[3] - value_bbox[1]
-                        
-                        # Position icon to be vertically centered with the text
-                        # Align the center of the icon with the center of the text
-                        text_center_y = text_y + (text_height // 2)
-                        icon_y = text_center_y - (icon_size // 2) + icon_vertical_offset
-                        
-                        overlay.paste(icon, (text_x, icon_y), icon)
-                        
-                        # Draw value after icon
-                        value_x = text_x + icon_size + icon_horizontal_spacing
-                        draw.text((value_x, text_y), value, fill=text_color, font=bold_font)
-                        
-                        # Draw unit after value
-                        value_width = value_bbox[2] - value_bbox[0]
-                        draw.text((value_x + value_width, text_y), f" {unit}", fill=text_color, font=regular_font)
-                    else:
-                        # Fallback to text if icon not found
-                        draw.text((text_x, text_y), f"{label}: {value} {unit}", fill=text_color, font=regular_font)
-                else:
-                    # Original text-based rendering
-                    label_bbox = draw.textbbox((0, 0), f"{label}: ", font=regular_font)
-                    label_width = label_bbox[2] - label_bbox[0]
-                    draw.text((text_x, text_y),
-                              f"{label}: ",
-                              fill=text_color,
-                              font=regular_font)
-
-                    value_bbox = draw.textbbox((0, 0), value, font=bold_font)
-                    value_width = value_bbox[2] - value_bbox[0]
-                    draw.text((text_x + label_width, text_y),
-                              value,
-                              fill=text_color,
-                              font=bold_font)
-
-                    draw.text((text_x + label_width + value_width, text_y),
-                              f" {unit}",
-                              fill=text_color,
-                              font=regular_font)
-
-                if vertical_layout:
-                    # В вертикальном режиме переходим к следующей плашке по вертикали
-                    y_position += box_height + spacing
-                else:
-                    # В горизонтальном режиме переходим к следующей плашке по горизонтали
-                    x_position += element_width + spacing
-
-        result = Image.alpha_composite(background, overlay)
+        result = plan.render(values, frame)
 
         if output_path:
-            result.convert('RGB').save(output_path,
-                                        format='PNG',
-                                        quality=95,
-                                        optimize=True)
+            with open(output_path, 'wb') as f:
+                f.write(encode_frame_png(result, transparent))
             logging.debug(f"Saved frame to {output_path}")
 
         return result
@@ -635,7 +351,24 @@ def generate_frames(csv_file,
                     text_settings=None,
                     progress_callback=None,
                     interpolate_values=True,
-                    locale='en'):
+                    locale='en',
+                    timer=None,
+                    frames_ready=None,
+                    transparent=False,
+                    trim_range=None,
+                    processed_data=None):
+    """
+    Render all frames of a project into frames/project_<folder_number>
+
+    If a PipelineTimer is given, per-frame sample/draw/encode/write times
+    are recorded in it. frames_ready(count, frame_count) is called whenever
+    the first 'count' frames are on disk (used for pipelined encoding); it
+    may block to slow rendering down. transparent=True renders RGBA frames
+    without the chroma-key background. trim_range is the project's
+    (start, end) trim (see Project.get_trim_range()). processed_data is the
+    Telemetry already returned by process_csv_file(); without it the CSV is
+    processed here and timed as the 'ingest' stage.
+    """
     try:
         frames_dir = f'frames/project_{folder_number}'
         if os.path.exists(frames_dir):
@@ -643,12 +376,16 @@ def generate_frames(csv_file,
         os.makedirs(frames_dir, exist_ok=True)
 
         # Process CSV file using the processor
-        from utils.csv_processor import process_csv_file
-        csv_type, processed_data = process_csv_file(csv_file, folder_number)
-        df = pd.DataFrame(processed_data)
-
-        # Sort dataframe by timestamp to ensure proper interpolation
-        df = df.sort_values('timestamp')
+        from utils.csv_processor import process_csv_file, apply_trim
+        if processed_data is None:
+            ingest_started = time.perf_counter()
+            _, processed_data = process_csv_file(csv_file, folder_number)
+            if timer:
+                timer.add_stage('ingest', time.perf_counter() - ingest_started)
+        # Trimmed rows, sorted by timestamp to ensure proper interpolation
+        df = apply_trim(processed_data, trim_range).to_frame()
+        if df.empty:
+            raise ValueError("No data in the trimmed time range")
         
         # Calculate static box widths if enabled
         static_box_widths = None
@@ -656,6 +393,11 @@ def generate_frames(csv_file,
             use_icons = text_settings.get('use_icons', False)
             static_box_widths = calculate_max_widths_for_static_boxes(df, text_settings, use_icons, locale, resolution)
 
+        # Resolve the overlay layout once for all frames
+        from utils.overlay_widgets import compile_layout
+        plan = compile_layout(text_settings, resolution, locale, static_box_widths, transparent,
+                              inputs=set(df.columns) | {'max_speed'})
+
         # Calculate frame timestamps
         T_min = df['timestamp'].min()
         T_max = df['timestamp'].max()
@@ -664,6 +406,8 @@ def generate_frames(csv_file,
             f"Generating {frame_count} frames at {fps} fps with interpolation {'enabled' if interpolate_values else 'disabled'}"
         )
         frame_timestamps = np.linspace(T_min, T_max, frame_count)
+        # Box colour states of all frames at once
+        plan.precompute_tones(lambda column: sample_timeline(df, frame_timestamps, column, interpolate_values))
 
         completed_frames = 0
         lock = threading.Lock()
@@ -678,17 +422,24 @@ def generate_frames(csv_file,
                 raise InterruptedError("Frame generation stopped by user")
 
             try:
+                started = time.perf_counter()
                 # Use interpolated values for frame generation if enabled
                 values = find_nearest_values(df,
                                               timestamp,
                                               interpolate=interpolate_values)
+                sampled = time.perf_counter()
                 output_path = f'{frames_dir}/frame_{i:06d}.png'
-                create_frame(values,
-                               resolution,
-                               output_path,
-                               text_settings,
-                               locale=locale,
-                               static_box_widths=static_box_widths)
+                frame = create_frame(values, plan=plan, frame=i)
+                drawn = time.perf_counter()
+                data = encode_frame_png(frame, transparent)
+                encoded = time.perf_counter()
+                with open(output_path, 'wb') as f:
+                    f.write(data)
+                if timer:
+                    timer.record_frame(sample=sampled - started,
+                                       draw=drawn - sampled,
+                                       encode_frame=encoded - drawn,
+                                       write=time.perf_counter() - encoded)
 
                 with lock:
                     completed_frames += 1
@@ -708,9 +459,12 @@ def generate_frames(csv_file,
                 raise
 
         max_workers = os.cpu_count() or 4
+        if timer:
+            timer.workers = max_workers
         frame_args = list(enumerate(frame_timestamps))
         chunk_size = 100  # Process frames in smaller chunks for better interrupt handling
 
+        render_started = time.perf_counter()
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             try:
                 for i in range(0, len(frame_args), chunk_size):
@@ -733,6 +487,10 @@ def generate_frames(csv_file,
                             executor.shutdown(wait=False)
                             raise
 
+                    # Chunks complete in order, so all frames up to here exist
+                    if frames_ready:
+                        frames_ready(i + len(chunk), frame_count)
+
             except InterruptedError:
                 logging.info("Frame generation interrupted by user")
                 raise
@@ -743,6 +501,8 @@ def generate_frames(csv_file,
                 if stop_event.is_set():
                     executor.shutdown(wait=False)
 
+        if timer:
+            timer.add_stage('render', time.perf_counter() - render_started)
         logging.info(f"Successfully generated {frame_count} frames")
         return frame_count, (T_max - T_min)
 
@@ -860,6 +620,37 @@ def find_nearest_values(df, timestamp, interpolate=True):
     return result
 
 
+def sample_timeline(df, timestamps, column, interpolate=True):
+    """
+    Values of one column at many timestamps at once
+
+    Same results as find_nearest_values(df, timestamp, interpolate)[column]
+    for every timestamp (df sorted by timestamp).
+    """
+    times = df['timestamp'].to_numpy()
+    data = df[column].to_numpy(dtype=np.float64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    result = np.zeros(len(timestamps), dtype=np.int64)  # Before the first data point
+
+    after = np.searchsorted(times, timestamps, side='left')
+    before = np.searchsorted(times, timestamps, side='right') - 1
+    late = (after >= len(times)) & (timestamps >= times[0])
+    result[late] = data[-1]  # After the last data point
+    inside = (timestamps >= times[0]) & ~late
+
+    t = timestamps[inside]
+    before, after = before[inside], after[inside]
+    t0, t1 = times[before], times[after]
+    v0, v1 = data[before], data[after]
+    if interpolate:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            interpolated = v0 + (t - t0) / (t1 - t0) * (v1 - v0)
+        result[inside] = np.rint(np.where(t1 > t0, interpolated, v0))
+    else:
+        result[inside] = np.where(t - t0 > t1 - t, v1, v0)
+    return result
+
+
 def get_column_name(csv_type, base_name):
     column_mapping = {
         'darnkessbot': {
@@ -903,7 +694,7 @@ def create_preview_frame(csv_file,
                          text_settings=None,
                          locale='en'):
     try:
-        from utils.csv_processor import process_csv_file
+        from utils.csv_processor import process_csv_file, apply_trim
         from models import Project
         from flask import current_app
 
@@ -913,7 +704,7 @@ def create_preview_frame(csv_file,
                 raise ValueError(f"Project {project_id} not found")
             csv_type, processed_data = process_csv_file(
                 csv_file, project.folder_number)
-            df = pd.DataFrame(processed_data)
+            df = apply_trim(processed_data, project.get_trim_range()).to_frame()
             
             # Calculate static box widths if enabled
             static_box_widths = None
@@ -0,0 +1,390 @@
+"""
+Overlay widgets and the layout compiler that turns text_settings into a render plan.
+
+A widget declares the sample values it reads (inputs), an optional static
+layer rendered once per job and a dynamic draw() called for every frame.
+compile_layout() resolves text_settings, locale and resolution once per job:
+which widgets are visible, their fonts, label and unit metrics, icons, colour
+rules and fixed positions. RenderPlan.render() then only formats and measures
+the values of a frame and draws.
+
+Box colour states (normal/warning/critical) can be computed for a whole
+timeline at once with RenderPlan.precompute_tones(); frames then look up
+their state by index and paste pre-tinted boxes from the box cache.
+
+Value boxes are declared in VALUE_BOXES; other gauges are Widget subclasses
+added to the plan in compile_layout().
+"""
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from utils.image_generator import _LOCALIZATION, _get_font, create_rounded_box, load_icon
+from utils.image_processor import create_speed_indicator
+
+CHROMA_KEY = (0, 0, 255, 255)
+
+# Colour states of value boxes: (box colour, text/icon colour)
+TONE_NORMAL, TONE_WARNING, TONE_CRITICAL = 0, 1, 2
+TONE_COLORS = (
+    ((0, 0, 0, 255), (255, 255, 255, 255)),
+    ((255, 255, 0, 255), (0, 0, 0, 255)),
+    ((255, 0, 0, 255), (0, 0, 0, 255))
+)
+TONE_ICON_COLORS = ('white', 'black', 'black')
+
+VALUE_BBOX_CACHE_SIZE = 4096  # Measured value strings kept per plan
+
+
+# Colour rules take a value or an array of values and return tone codes
+
+def pwm_tone(pwm):
+    """Yellow box at 80-90% PWM, red above"""
+    pwm = np.asarray(pwm)
+    return np.where(pwm > 90, TONE_CRITICAL, np.where(pwm >= 80, TONE_WARNING, TONE_NORMAL)).astype(np.int8)
+
+
+def battery_tone(battery):
+    """Yellow box at 10-30% battery, red below"""
+    battery = np.asarray(battery)
+    return np.where(battery < 10, TONE_CRITICAL, np.where(battery <= 30, TONE_WARNING, TONE_NORMAL)).astype(np.int8)
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')
+
+
+# Value boxes in display order:
+# (key, visibility setting, its default, sample input, unit key, colour rule, formatter)
+VALUE_BOXES = (
+    ('speed', 'show_speed', True, 'speed', 'speed', None, str),
+    ('max_speed', 'show_max_speed', True, 'max_speed', 'speed', None, str),
+    ('gps', 'show_gps', False, 'gps', 'speed', None, str),
+    ('voltage', 'show_voltage', True, 'voltage', 'voltage', None, str),
+    ('temp', 'show_temp', True, 'temperature', 'temp', None, str),
+    ('battery', 'show_battery', False, 'battery', 'battery', battery_tone, str),
+    ('mileage', 'show_mileage', True, 'mileage', 'mileage', None, str),
+    ('pwm', 'show_pwm', True, 'pwm', 'pwm', pwm_tone, str),
+    ('power', 'show_power', True, 'power', 'power', None, str),
+    ('current', 'show_current', True, 'current', 'current', None, str),
+    ('time', 'show_time', False, 'timestamp', None, None, format_time)
+)
+
+
+class FrameGeometry:
+    """Frame size and resolution scale"""
+
+    def __init__(self, resolution):
+        if resolution == '4k':
+            self.width, self.height = 3840, 2160
+            self.scale_factor = 2.0
+            self.indicator_size = 1000
+        else:  # fullhd
+            self.width, self.height = 1920, 1080
+            self.scale_factor = 1.0
+            self.indicator_size = 500
+        self.size = (self.width, self.height)
+
+
+class Canvas:
+    """Layers of the frame being rendered; background is None for transparent frames"""
+
+    __slots__ = ('overlay', 'background', 'draw')
+
+    def __init__(self, overlay, background):
+        self.overlay = overlay
+        self.background = background
+        self.draw = ImageDraw.Draw(overlay)
+
+
+class Widget:
+    """
+    Base class of overlay widgets
+
+    inputs are the sample value keys the widget reads; compile_layout()
+    leaves a widget out when one of them is not available.
+    """
+
+    inputs = ()
+
+    def static_layer(self, size):
+        """Overlay part that never changes during a job (RGBA image of 'size'), or None"""
+        return None
+
+    def draw(self, canvas, values, frame=None):
+        """Draw one frame; frame is its index in a precomputed timeline, if any"""
+        raise NotImplementedError
+
+
+class SpeedIndicator(Widget):
+    """Speed arc with the current speed (the 'bottom elements'), drawn under the boxes"""
+
+    inputs = ('speed',)
+
+    def __init__(self, geometry, text_settings, resolution, locale):
+        size = geometry.indicator_size
+        self.position = (
+            int((geometry.width - size) * float(text_settings.get('indicator_x', 50)) / 100),
+            int((geometry.height - size) * float(text_settings.get('indicator_y', 80)) / 100)
+        )
+        self.options = {
+            'size': size,
+            'speed_offset': (0, int(text_settings.get('speed_y', 0))),
+            'unit_offset': (0, int(text_settings.get('unit_y', 0))),
+            'speed_size': float(text_settings.get('speed_size', 100)),
+            'unit_size': float(text_settings.get('unit_size', 100)),
+            'indicator_scale': float(text_settings.get('indicator_scale', 100)),
+            'resolution': resolution,
+            'locale': locale
+        }
+
+    def draw(self, canvas, values, frame=None):
+        indicator = create_speed_indicator(values['speed'], **self.options)
+        if canvas.background is None:
+            canvas.overlay.alpha_composite(indicator, self.position)
+        else:
+            canvas.background.paste(indicator, self.position, indicator)
+
+
+class BoxStyle:
+    """Fonts and metrics shared by all value boxes of a layout"""
+
+    def __init__(self, geometry, text_settings):
+        scale_factor = geometry.scale_factor
+        font_size = int(text_settings.get('font_size', 26) * scale_factor)
+        self.regular_font = _get_font('fonts/sf-ui-display-regular.otf', font_size)
+        self.bold_font = _get_font('fonts/sf-ui-display-bold.otf', font_size)
+        self.use_icons = text_settings.get('use_icons', False)
+        self.icon_size = max(12, int(font_size * 0.8))
+        self.icon_vertical_offset = int(text_settings.get('icon_vertical_offset', 5))
+        self.icon_horizontal_spacing = int(text_settings.get('icon_horizontal_spacing', 10))
+        self.padding = int(text_settings.get('top_padding', 14) * scale_factor)
+        self.box_height = int(text_settings.get('bottom_padding', 47) * scale_factor)
+        self.spacing = int(text_settings.get('spacing', 10) * scale_factor)
+        self.border_radius = int(text_settings.get('border_radius', 13) * scale_factor)
+        self._measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+        self._value_bboxes = {}
+
+    def text_bbox(self, text, font):
+        return self._measure.textbbox((0, 0), text, font=font)
+
+    def value_bbox(self, value):
+        """Bounding box of a value in the bold font, cached by string"""
+        bbox = self._value_bboxes.get(value)
+        if bbox is None:
+            bbox = self.text_bbox(value, self.bold_font)
+            if len(self._value_bboxes) < VALUE_BBOX_CACHE_SIZE:
+                self._value_bboxes[value] = bbox
+        return bbox
+
+
+class ValueBox:
+    """One rounded box showing a label (or icon), a value and its unit"""
+
+    def __init__(self, style, key, input_key, label, unit, tone=None, format_value=str, static_width=None):
+        self.style = style
+        self.input = input_key
+        self.label = label
+        self.unit = unit
+        self.tone = tone
+        self.format_value = format_value
+        self.static_width = static_width
+        self.frame_tones = None  # Tone codes of a precomputed timeline
+        self.label_text = f"{label}: "
+        self.unit_text = f" {unit}"
+
+        unit_bbox = style.text_bbox(self.unit_text, style.regular_font)
+        self.unit_width = unit_bbox[2] - unit_bbox[0]
+        self.unit_height = unit_bbox[3] - unit_bbox[1]
+        if style.use_icons:
+            # Icons of every colour state the box can take
+            tones = (TONE_NORMAL, TONE_WARNING, TONE_CRITICAL) if tone else (TONE_NORMAL,)
+            self.icons = {state: load_icon(key, style.icon_size, TONE_ICON_COLORS[state]) for state in tones}
+            self.prefix_width = style.icon_size + style.icon_horizontal_spacing
+            self.prefix_height = style.icon_size
+        else:
+            label_bbox = style.text_bbox(self.label_text, style.regular_font)
+            self.icons = None
+            self.prefix_width = label_bbox[2] - label_bbox[0]
+            self.prefix_height = label_bbox[3] - label_bbox[1]
+
+    def measure(self, values, frame=None):
+        """(value text, tone, value bbox, text width, text height) of a frame"""
+        raw = values[self.input]
+        value = self.format_value(raw)
+        if self.frame_tones is not None and frame is not None:
+            tone = self.frame_tones[frame]
+        elif self.tone:
+            tone = int(self.tone(raw))
+        else:
+            tone = TONE_NORMAL
+        bbox = self.style.value_bbox(value)
+        text_width = self.prefix_width + (bbox[2] - bbox[0]) + self.unit_width
+        text_height = max(self.prefix_height, bbox[3] - bbox[1], self.unit_height)
+        return value, tone, bbox, text_width, text_height
+
+    def element_width(self, text_width):
+        """Box width and the content width it is centred on"""
+        if self.static_width is not None:
+            text_width = max(text_width, self.static_width)
+        return text_width + 2 * self.style.padding, self.static_width or text_width
+
+    def draw(self, canvas, x, y, text_y, element_width, content_width, measured):
+        style = self.style
+        value, tone, bbox, _, _ = measured
+        box_color, text_color = TONE_COLORS[tone]
+
+        box = create_rounded_box(element_width, style.box_height, style.border_radius,
+                                 box_color if tone != TONE_NORMAL else None)
+        canvas.overlay.paste(box, (x, y), box)
+
+        draw = canvas.draw
+        text_x = x + (element_width - content_width) // 2
+        value_width = bbox[2] - bbox[0]
+        if self.icons is not None:
+            icon = self.icons.get(tone)
+            if icon:
+                # Icon centred on the value text
+                icon_y = text_y + (bbox[3] - bbox[1]) // 2 - style.icon_size // 2 + style.icon_vertical_offset
+                canvas.overlay.paste(icon, (text_x, icon_y), icon)
+                value_x = text_x + style.icon_size + style.icon_horizontal_spacing
+                draw.text((value_x, text_y), value, fill=text_color, font=style.bold_font)
+                draw.text((value_x + value_width, text_y), self.unit_text, fill=text_color, font=style.regular_font)
+            else:
+                # Icon file missing: plain text
+                draw.text((text_x, text_y), f"{self.label}: {value} {self.unit}", fill=text_color,
+                          font=style.regular_font)
+        else:
+            draw.text((text_x, text_y), self.label_text, fill=text_color, font=style.regular_font)
+            draw.text((text_x + self.prefix_width, text_y), value, fill=text_color, font=style.bold_font)
+            draw.text((text_x + self.prefix_width + value_width, text_y), self.unit_text, fill=text_color,
+                      font=style.regular_font)
+
+
+class ValueBoxes(Widget):
+    """
+    Value boxes in a centred row, or in a column (vertical_layout)
+
+    Box widths follow the values of each frame (at least the static widths
+    when static_box_size is on), so only the column positions are fixed.
+    """
+
+    def __init__(self, geometry, text_settings, style, boxes):
+        self.style = style
+        self.boxes = boxes
+        self.inputs = tuple(box.input for box in boxes)
+        self.frame_width = geometry.width
+        self.vertical = text_settings.get('vertical_layout', False)
+        vertical_position = int(text_settings.get('vertical_position', 1))
+        if self.vertical:
+            total_height = len(boxes) * style.box_height + style.spacing * (len(boxes) - 1)
+            self.x = int((geometry.width * float(text_settings.get('horizontal_position', 50))) / 100)
+            self.y = int((geometry.height * vertical_position) / 100) - total_height // 2
+        else:
+            self.x = None
+            self.y = int((geometry.height * vertical_position) / 100)
+
+    def draw(self, canvas, values, frame=None):
+        style = self.style
+        measured = [box.measure(values, frame) for box in self.boxes]
+        widths = [box.element_width(m[3]) for box, m in zip(self.boxes, measured)]
+        max_text_height = max(m[4] for m in measured)
+        text_offset = style.box_height // 2 - max_text_height // 2 - int(max_text_height * 0.2)
+
+        if self.vertical:
+            x = self.x
+        else:
+            total_width = sum(width for width, _ in widths) + style.spacing * (len(widths) - 1)
+            x = (self.frame_width - total_width) // 2
+        y = self.y
+
+        for box, m, (element_width, content_width) in zip(self.boxes, measured, widths):
+            box.draw(canvas, x, y, y + text_offset, element_width, content_width, m)
+            if self.vertical:
+                y += style.box_height + style.spacing
+            else:
+                x += element_width + style.spacing
+
+
+class RenderPlan:
+    """Compiled overlay layout: the widgets drawn, in order, for every frame"""
+
+    def __init__(self, geometry, widgets, transparent=False):
+        self.size = geometry.size
+        self.widgets = widgets
+        self.inputs = frozenset(key for widget in widgets for key in widget.inputs)
+        self.background = None if transparent else Image.new('RGBA', self.size, CHROMA_KEY)
+
+        self.static_overlay = None
+        for widget in widgets:
+            layer = widget.static_layer(self.size)
+            if layer is not None:
+                if self.static_overlay is None:
+                    self.static_overlay = Image.new('RGBA', self.size, (0, 0, 0, 0))
+                self.static_overlay.alpha_composite(layer)
+
+    def value_boxes(self):
+        return [box for widget in self.widgets if isinstance(widget, ValueBoxes) for box in widget.boxes]
+
+    def precompute_tones(self, sample):
+        """
+        Colour states of every frame of a timeline
+
+        sample(column) returns the column's value for every frame (as the
+        frames will show it); render() then takes the frame index.
+        """
+        for box in self.value_boxes():
+            if box.tone:
+                box.frame_tones = box.tone(sample(box.input)).tolist()
+
+    def render(self, values, frame=None):
+        """
+        Frame for one sample (RGBA; transparent plans keep the alpha channel)
+
+        frame is the sample's index in the timeline given to precompute_tones().
+        """
+        if self.static_overlay is not None:
+            overlay = self.static_overlay.copy()
+        else:
+            overlay = Image.new('RGBA', self.size, (0, 0, 0, 0))
+        background = self.background.copy() if self.background is not None else None
+
+        canvas = Canvas(overlay, background)
+        for widget in self.widgets:
+            widget.draw(canvas, values, frame)
+        return overlay if background is None else Image.alpha_composite(background, overlay)
+
+
+def compile_layout(text_settings=None, resolution='fullhd', locale='en', static_box_widths=None,
+                   transparent=False, inputs=None):
+    """
+    Resolve overlay settings into a RenderPlan
+
+    inputs are the sample value keys that will be available (all when
+    None); widgets needing others are left out. static_box_widths comes
+    from calculate_max_widths_for_static_boxes().
+    """
+    text_settings = text_settings or {}
+    geometry = FrameGeometry(resolution)
+    loc = _LOCALIZATION.get(locale, _LOCALIZATION['en'])
+
+    def available(keys):
+        return inputs is None or all(key in inputs for key in keys)
+
+    widgets = []
+    if text_settings.get('show_bottom_elements', True) and available(SpeedIndicator.inputs):
+        widgets.append(SpeedIndicator(geometry, text_settings, resolution, locale))
+
+    style = BoxStyle(geometry, text_settings)
+    boxes = []
+    for key, setting, default, input_key, unit_key, tone, format_value in VALUE_BOXES:
+        if not text_settings.get(setting, default) or not available((input_key,)):
+            continue
+        static_width = static_box_widths.get(key) if static_box_widths else None
+        unit = loc['units'][unit_key] if unit_key else ''
+        boxes.append(ValueBox(style, key, input_key, loc[key], unit, tone, format_value, static_width))
+    if boxes:
+        widgets.append(ValueBoxes(geometry, text_settings, style, boxes))
+
+    return RenderPlan(geometry, widgets, transparent)
@@ -0,0 +1,136 @@
+"""
+Per-stage timing for the video processing pipeline.
+
+A PipelineTimer is created for every processing job and passed through the
+pipeline. It records:
+
+- wall time of the job stages: ingest (CSV processing), render (frame
+  generation as a whole) and encode_video (ffmpeg)
+- per-frame time spent sampling values, drawing, PNG encoding and writing
+  the file, with percentiles
+- worker utilization of the frame generation pool
+
+The summary is stored as JSON on the project (Project.timing_stats).
+Optionally a job can be profiled with cProfile, or pyinstrument when it is
+installed; the report is written to profiles/.
+"""
+import cProfile
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+PROFILES_DIR = 'profiles'
+
+FRAME_STAGES = ['sample', 'draw', 'encode_frame', 'write']
+PERCENTILES = [50, 90, 99]
+
+
+class PipelineTimer:
+    """Collects stage and per-frame timings of one processing job (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.frame_times = {stage: [] for stage in FRAME_STAGES}
+        self.workers = 1
+
+    @contextmanager
+    def stage(self, name):
+        """Time a job stage; repeated stages add up"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_frame(self, **durations):
+        """Record the seconds one frame spent in each frame stage"""
+        with self._lock:
+            for stage, seconds in durations.items():
+                self.frame_times[stage].append(seconds)
+
+    def summary(self):
+        """JSON-serializable summary of the collected timings"""
+        with self._lock:
+            stages = {name: round(seconds, 3) for name, seconds in self.stages.items()}
+            frame_times = {stage: np.asarray(times) for stage, times in self.frame_times.items()}
+
+        frames = {}
+        busy = 0.0
+        for stage, times in frame_times.items():
+            if not len(times):
+                continue
+            busy += float(times.sum())
+            frames[stage] = {
+                'total': round(float(times.sum()), 3),
+                **{f'p{p}_ms': round(float(v) * 1000, 2)
+                   for p, v in zip(PERCENTILES, np.percentile(times, PERCENTILES))}
+            }
+
+        frame_count = max((len(times) for times in frame_times.values()), default=0)
+        render_wall = self.stages.get('render', 0.0)
+        utilization = busy / (render_wall * self.workers) if render_wall > 0 else None
+
+        return {
+            'stages': stages,
+            'frames': frames,
+            'frame_count': frame_count,
+            'workers': self.workers,
+            'worker_utilization': round(min(utilization, 1.0), 3) if utilization is not None else None
+        }
+
+
+@contextmanager
+def profile_job(project_id, mode):
+    """
+    Profile the enclosed code when mode is 'cprofile' or 'pyinstrument'
+
+    Only the calling thread is profiled; frame workers show up as waiting
+    on their futures. Yields the report path (None when not profiling).
+    """
+    if mode not in ('cprofile', 'pyinstrument'):
+        yield None
+        return
+
+    if mode == 'pyinstrument' and PyinstrumentProfiler is None:
+        logging.warning("pyinstrument is not installed, falling back to cProfile")
+        mode = 'cprofile'
+
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    if mode == 'pyinstrument':
+        report_path = os.path.join(PROFILES_DIR, f'project_{project_id}.html')
+        profiler = PyinstrumentProfiler()
+        profiler.start()
+        try:
+            yield report_path
+        finally:
+            profiler.stop()
+            with open(report_path, 'w') as f:
+                f.write(profiler.output_html())
+            logging.info(f"Saved pyinstrument profile to {report_path}")
+    else:
+        report_path = os.path.join(PROFILES_DIR, f'project_{project_id}.prof')
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield report_path
+        finally:
+            profiler.disable()
+            profiler.dump_stats(report_path)
+            with open(f'{report_path}.txt', 'w') as f:
+                pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(50)
+            logging.info(f"Saved cProfile profile to {report_path}")
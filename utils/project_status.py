@@ -0,0 +1,123 @@
+"""
+Project status snapshots and change notifications for status polling.
+
+The background processor publishes the status of a running job to
+status_snapshots whenever it commits a status or progress change, so
+/project_status reads of running jobs are answered from memory instead of
+the database, together with a retry_after_ms polling hint derived from the
+job's measured frame rate. Snapshots are dropped when the job ends; reads
+then fall back to the database.
+
+Publishing also bumps status_versions, which long-polling status requests
+wait on. Snapshots and versions only exist in this process, so requests
+handled by other workers read the database and long-poll waiters re-check
+it every STATUS_RECHECK_SECONDS.
+"""
+import threading
+
+from utils.system_metrics import job_rates
+
+STATUS_RECHECK_SECONDS = 2
+STATUS_LONG_POLL_MAX_SECONDS = 25
+
+# Polling hint bounds; a client polls about once per percent of stage progress
+MIN_RETRY_AFTER_MS = 250
+MAX_RETRY_AFTER_MS = 5000
+DEFAULT_RETRY_AFTER_MS = {'pending': 500, 'processing': 1000}
+
+
+def project_status_payload(project):
+    """Status fields of a project as returned by the status endpoints"""
+    return {
+        'status': project.status,
+        'frame_count': project.frame_count,
+        'video_file': project.video_file,
+        'error_message': project.error_message,
+        'progress': project.progress,
+        'processing_time': project.get_processing_time_str()
+    }
+
+
+class StatusVersions:
+    """Per-user change counters that status requests can wait on"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = {}
+
+    def version(self, user_id):
+        with self._condition:
+            return self._versions.get(user_id, 0)
+
+    def notify(self, user_id):
+        with self._condition:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._condition.notify_all()
+
+    def wait(self, user_id, version, timeout):
+        """Block until the user's version differs from 'version' or timeout; True if it changed"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._versions.get(user_id, 0) != version, timeout)
+
+
+status_versions = StatusVersions()
+
+
+class StatusSnapshots:
+    """Latest status of running jobs, published by the background processor"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}  # project_id -> snapshot dict
+
+    def publish(self, project, stage=None, current=None, total=None):
+        """
+        Store the committed state of a running project and wake up its watchers
+
+        stage/current/total is the progress report that caused the update;
+        the latest report of every stage is kept, as frames and video
+        segments can be in progress at the same time.
+        """
+        with self._lock:
+            previous = self._snapshots.get(project.id)
+            stages = dict(previous['stages']) if previous else {}
+            if stage is not None:
+                stages[stage] = (current, total)
+            self._snapshots[project.id] = {
+                'user_id': project.user_id,
+                'payload': project_status_payload(project),
+                'stages': stages
+            }
+        status_versions.notify(project.user_id)
+
+    def discard(self, project_id):
+        with self._lock:
+            self._snapshots.pop(project_id, None)
+
+    def get(self, project_id):
+        """Return (user_id, payload with polling hints), or None when the job does not run here"""
+        with self._lock:
+            snapshot = self._snapshots.get(project_id)
+        if snapshot is None:
+            return None
+
+        # Rendering paces the job until all frames exist, then encoding does
+        stages = snapshot['stages']
+        current, total = stages.get('frames', (0, None))
+        stage = 'frames'
+        if 'video' in stages and total and current >= total:
+            current, total = stages['video']
+            stage = 'video'
+
+        payload = dict(snapshot['payload'], stage=stage, eta_seconds=None)
+        rate = job_rates.rate(project_id, stage)
+        if rate and total:
+            payload['eta_seconds'] = round(max(total - current, 0) / rate, 1)
+            retry_after_ms = total / 100 / rate * 1000
+            payload['retry_after_ms'] = int(min(max(retry_after_ms, MIN_RETRY_AFTER_MS), MAX_RETRY_AFTER_MS))
+        else:
+            payload['retry_after_ms'] = DEFAULT_RETRY_AFTER_MS.get(payload['status'])
+        return snapshot['user_id'], payload
+
+
+status_snapshots = StatusSnapshots()
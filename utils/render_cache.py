@@ -0,0 +1,114 @@
+"""
+Bounded caches for frame rendering resources (icons, fonts, boxes).
+
+A RenderCache is a thread-safe LRU cache limited by the estimated size of
+its entries in bytes, so long-running workers serving many different
+overlay settings keep a fixed memory budget. Cached images are shared
+between frames and threads and must not be modified by callers.
+
+Every cache registers itself; render_cache_stats() reports entries, bytes,
+hits, misses and evictions for the admin dashboard.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+_caches = []
+
+
+def image_nbytes(image):
+    """Approximate memory size of a PIL image"""
+    return image.width * image.height * len(image.getbands())
+
+
+def font_nbytes(font):
+    """Approximate memory size of a FreeType font (its font file)"""
+    try:
+        return os.path.getsize(font.path)
+    except (AttributeError, OSError, TypeError):
+        return 0
+
+
+class RenderCache:
+    """LRU cache bounded by total entry size in bytes"""
+
+    def __init__(self, name, max_bytes, sizeof):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _caches.append(self)
+
+    def get(self, key):
+        """Cached value (marked as recently used), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries beyond max_bytes"""
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            logging.debug(f"{self.name} cache: {key} ({size} bytes) exceeds the cache size, not cached")
+            return value
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def get_or_create(self, key, create):
+        """
+        Cached value, or create() stored under key
+
+        create() runs outside the lock (two threads may both create a
+        missing entry); a None result is returned without being cached.
+        """
+        value = self.get(key)
+        if value is None:
+            value = create()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+def render_cache_stats():
+    """Stats of every RenderCache in this process"""
+    return [cache.stats() for cache in _caches]
@@ -0,0 +1,192 @@
+"""
+System and job metrics for the admin dashboard.
+
+Every metric keeps its samples in a fixed-size NumPy ring buffer, so adding
+a sample is O(1) and reading a time range is a vectorized mask over at most
+'capacity' rows. A background thread samples CPU, memory, disk and GPU usage
+together with job metrics (render fps, encode fps, queue depth) reported by
+the processing pipeline, and keeps the latest values for cheap requests.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import psutil
+
+try:
+    import GPUtil
+except ImportError:
+    GPUtil = None
+
+# Sampling interval and retention, configurable through the environment
+STATS_INTERVAL = float(os.environ.get('SYSTEM_STATS_INTERVAL', 60))  # seconds
+STATS_RETENTION = float(os.environ.get('SYSTEM_STATS_RETENTION', 24 * 3600))  # seconds
+
+SYSTEM_METRICS = ['cpu', 'memory', 'disk', 'gpu']
+JOB_METRICS = ['render_fps', 'encode_fps', 'queue_depth']
+
+# Job rates older than this are considered stale (job finished or stalled)
+JOB_RATE_TIMEOUT = 30  # seconds
+
+
+class RingBuffer:
+    """Fixed-size buffer of (timestamp, value) samples"""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.times = np.zeros(self.capacity, dtype=np.float64)
+        self.values = np.zeros(self.capacity, dtype=np.float32)
+        self.head = 0  # Next write position
+        self.size = 0
+
+    def append(self, timestamp, value):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def read(self, since=None):
+        """Return (times, values) in chronological order, optionally from 'since' on"""
+        if self.size < self.capacity:
+            times, values = self.times[:self.size], self.values[:self.size]
+        else:
+            order = np.roll(np.arange(self.capacity), -self.head)
+            times, values = self.times[order], self.values[order]
+        if since is not None:
+            mask = times >= since
+            times, values = times[mask], values[mask]
+        return times.copy(), values.copy()
+
+
+class JobRates:
+    """
+    Frames per second of running jobs
+
+    Derived from the frame counts of progress callbacks, or taken as reported
+    by the worker (the encode rate ffmpeg reports for the video stage).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = {}  # (project_id, stage) -> (time, frames)
+        self._rates = {}  # (project_id, stage) -> (time, fps)
+
+    def update(self, project_id, stage, frames, rate=None):
+        now = time.monotonic()
+        key = (project_id, stage)
+        with self._lock:
+            last = self._last.get(key)
+            self._last[key] = (now, frames)
+            if rate is not None:
+                self._rates[key] = (now, rate)
+            elif last and now > last[0] and frames >= last[1]:
+                self._rates[key] = (now, (frames - last[1]) / (now - last[0]))
+
+    def finish(self, project_id):
+        with self._lock:
+            for store in (self._last, self._rates):
+                for key in [key for key in store if key[0] == project_id]:
+                    del store[key]
+
+    def rate(self, project_id, stage):
+        """Current frames per second of one job stage (None until measured)"""
+        with self._lock:
+            measured = self._rates.get((project_id, stage))
+        if measured and time.monotonic() - measured[0] < JOB_RATE_TIMEOUT:
+            return measured[1]
+        return None
+
+    def total(self, stage):
+        """Sum of current rates of all jobs in a stage"""
+        now = time.monotonic()
+        with self._lock:
+            return sum(rate for (_, job_stage), (updated, rate) in self._rates.items()
+                       if job_stage == stage and now - updated < JOB_RATE_TIMEOUT)
+
+
+job_rates = JobRates()
+
+
+def read_system_stats():
+    """Sample system resource usage (percent values)"""
+    gpu_percent = 0
+    if GPUtil is not None:
+        try:
+            gpus = GPUtil.getGPUs()
+            if gpus:
+                gpu_percent = gpus[0].load * 100
+        except Exception:
+            pass
+
+    return {
+        # Non-blocking: usage since the previous call
+        'cpu_percent': psutil.cpu_percent(interval=None),
+        'memory_percent': psutil.virtual_memory().percent,
+        'disk_percent': psutil.disk_usage('/').percent,
+        'gpu_percent': gpu_percent
+    }
+
+
+class MetricsCollector:
+    """Samples all metrics into ring buffers and caches the latest values"""
+
+    def __init__(self, interval=STATS_INTERVAL, retention=STATS_RETENTION, queue_depth=None):
+        """
+        Args:
+            interval: seconds between samples
+            retention: seconds of history to keep
+            queue_depth: callable returning the number of running jobs
+        """
+        self.interval = interval
+        capacity = int(retention // interval) + 1
+        self.buffers = {name: RingBuffer(capacity) for name in SYSTEM_METRICS + JOB_METRICS}
+        self.queue_depth = queue_depth or (lambda: 0)
+        self._lock = threading.Lock()
+        self._latest = {}
+
+    def sample(self):
+        stats = read_system_stats()
+        stats['render_fps'] = round(job_rates.total('frames'), 2)
+        stats['encode_fps'] = round(job_rates.total('video'), 2)
+        stats['queue_depth'] = self.queue_depth()
+
+        now = time.time()
+        with self._lock:
+            for name in SYSTEM_METRICS:
+                self.buffers[name].append(now, stats[f'{name}_percent'])
+            for name in JOB_METRICS:
+                self.buffers[name].append(now, stats[name])
+            self._latest = stats
+        return stats
+
+    def latest(self):
+        """Latest sampled values (samples once if nothing was collected yet)"""
+        with self._lock:
+            latest = dict(self._latest)
+        return latest or self.sample()
+
+    def history(self, since=None):
+        """
+        Samples of every metric as lists of [ISO UTC timestamp, value]
+
+        Args:
+            since: unix timestamp; only newer samples are returned
+        """
+        with self._lock:
+            series = {name: buffer.read(since) for name, buffer in self.buffers.items()}
+        history = {}
+        for name, (times, values) in series.items():
+            labels = np.datetime_as_string(times.astype('datetime64[s]'), unit='s')
+            history[name] = [[label, round(float(value), 2)] for label, value in zip(labels, values)]
+        return history
+
+    def run(self):
+        """Background thread loop"""
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error(f"Error collecting system stats: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,169 @@
+"""
+Processed ride telemetry as a struct of NumPy arrays.
+
+A Telemetry holds one array per column with a fixed dtype (timestamps in
+float64 seconds, metrics in int32) and is what process_csv_file() and the
+analytics stream return. It behaves like the old dict of columns
+(telemetry['speed'], 'gps' in telemetry, iteration over column names), so
+code taking a dict or DataFrame of columns accepts it.
+
+Slicing by time range returns views when the timestamps are sorted, and
+to_frame() builds a DataFrame on top of the arrays without copying them.
+
+save()/load() use the columnar cache next to a processed CSV: one .npy file
+per column inside the ride's pyramid directory (see telemetry_pyramid),
+written together with the pyramid and memory-mapped on load.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_DTYPE = np.float64
+METRIC_DTYPE = np.int32
+
+COLUMN_DTYPES = {
+    'timestamp': TIMESTAMP_DTYPE,
+    'speed': METRIC_DTYPE,
+    'gps': METRIC_DTYPE,
+    'voltage': METRIC_DTYPE,
+    'temperature': METRIC_DTYPE,
+    'current': METRIC_DTYPE,
+    'battery': METRIC_DTYPE,
+    'mileage': METRIC_DTYPE,
+    'pwm': METRIC_DTYPE,
+    'power': METRIC_DTYPE
+}
+
+COLUMNS_META = 'columns.json'
+
+
+def _column_path(directory, name):
+    return os.path.join(directory, f'column_{name}.npy')
+
+
+def _as_column(name, values):
+    """Array of values with the column's dtype; no copy when it already has it"""
+    dtype = COLUMN_DTYPES.get(name, np.float64)
+    array = np.asarray(values)
+    if array.dtype == dtype:
+        return array
+    if np.issubdtype(dtype, np.integer) and array.dtype.kind == 'f':
+        array = np.rint(np.nan_to_num(array, posinf=0, neginf=0))
+    return array.astype(dtype)
+
+
+class Telemetry:
+    """Columns of a processed ride, each a NumPy array of equal length"""
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns: mapping of column name -> array-like; must contain
+                'timestamp'. Values are converted to the column dtypes.
+        """
+        if 'timestamp' not in columns:
+            raise ValueError("Telemetry requires a 'timestamp' column")
+        self.columns = {name: _as_column(name, values) for name, values in columns.items()}
+        lengths = {len(values) for values in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Telemetry columns differ in length: {sorted(lengths)}")
+        self._sorted = None
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls({name: df[name].to_numpy() for name in df.columns})
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def keys(self):
+        return self.columns.keys()
+
+    def values(self):
+        return self.columns.values()
+
+    def items(self):
+        return self.columns.items()
+
+    @property
+    def timestamps(self):
+        return self.columns['timestamp']
+
+    def is_sorted(self):
+        """True if timestamps never decrease (computed once)"""
+        if self._sorted is None:
+            self._sorted = bool(len(self) < 2 or np.all(self.timestamps[1:] >= self.timestamps[:-1]))
+        return self._sorted
+
+    def sorted(self):
+        """Rows ordered by timestamp; self when they already are"""
+        if self.is_sorted():
+            return self
+        return self.take(np.argsort(self.timestamps, kind='stable'))
+
+    def take(self, indices):
+        """New Telemetry with the rows at 'indices' (copies)"""
+        return Telemetry({name: values[indices] for name, values in self.columns.items()})
+
+    def slice_rows(self, start, stop):
+        """New Telemetry with rows start:stop as views of these arrays"""
+        telemetry = Telemetry({name: values[start:stop] for name, values in self.columns.items()})
+        telemetry._sorted = self._sorted
+        return telemetry
+
+    def between(self, start=None, end=None):
+        """
+        Rows with start <= timestamp <= end (either bound may be None)
+
+        Views found with a binary search when the timestamps are sorted,
+        a filtered copy otherwise.
+        """
+        timestamps = self.timestamps
+        if self.is_sorted():
+            lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+            hi = len(self) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+            return self.slice_rows(lo, max(lo, hi))
+
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps <= end
+        return self.take(np.flatnonzero(mask))
+
+    def to_frame(self):
+        """DataFrame whose columns are views of the telemetry arrays"""
+        return pd.DataFrame(self.columns, copy=False)
+
+    def to_dict(self):
+        return dict(self.columns)
+
+    def save(self, directory):
+        """Write the columns to a columnar cache directory (one .npy per column)"""
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(_column_path(directory, name), np.ascontiguousarray(values))
+        with open(os.path.join(directory, COLUMNS_META), 'w') as f:
+            json.dump({'columns': list(self.columns), 'rows': len(self)}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a columnar cache written by save(); returns None if there is none"""
+        meta_path = os.path.join(directory, COLUMNS_META)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        mode = 'r' if mmap else None
+        return cls({name: np.load(_column_path(directory, name), mmap_mode=mode) for name in meta['columns']})
@@ -0,0 +1,373 @@
+"""
+Multi-resolution telemetry pyramid for zoomable ride charts.
+
+For every processed ride a directory '<processed csv>.pyramid' is stored next
+to the processed CSV. Every build is written to its own version directory
+inside it, and the 'current' pointer file names the complete version readers
+use; it is replaced atomically (os.replace) once a build is finished. A
+version directory contains:
+
+- level_0.npy  the processed rows (timestamp + metric values)
+- level_K.npy  min/max/mean aggregates over buckets of 2**K rows
+- level_0_timestamp.npy, level_K_t_start.npy, level_K_t_end.npy
+               the bucket bounds of each level as contiguous arrays
+- meta.json    row counts, columns and overall time range
+- column_<name>.npy / columns.json
+               the processed rows in file order, one array per column
+               (the columnar cache read by load_cached_telemetry)
+
+All arrays are memory-mapped on read. A zoom window is located by binary
+search on the bound arrays, level by level from the coarsest, so a request
+touches O(log n) rows per level and O(points) rows to return the window.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.telemetry import Telemetry
+
+PYRAMID_SUFFIX = '.pyramid'
+PYRAMID_VERSION = 3
+CURRENT_POINTER = 'current'
+LOCK_FILE = '.lock'
+
+METRIC_COLUMNS = ['speed', 'gps', 'voltage', 'temperature', 'current',
+                  'battery', 'mileage', 'pwm', 'power']
+
+# Stop building coarser levels once a level has this many buckets or fewer
+MIN_LEVEL_ROWS = 64
+
+
+def get_pyramid_dir(processed_csv_path):
+    """Return the pyramid directory stored next to a processed CSV file"""
+    return f'{processed_csv_path}{PYRAMID_SUFFIX}'
+
+
+def _level_path(version_dir, level):
+    return os.path.join(version_dir, f'level_{level}.npy')
+
+
+def _bounds_path(version_dir, level, field):
+    return os.path.join(version_dir, f'level_{level}_{field}.npy')
+
+
+def _save_level(version_dir, level, array):
+    """Save a level and its bucket bounds (contiguous, for binary search)"""
+    np.save(_level_path(version_dir, level), array)
+    fields = ['timestamp'] if level == 0 else ['t_start', 't_end']
+    for field in fields:
+        np.save(_bounds_path(version_dir, level, field), np.ascontiguousarray(array[field]))
+
+
+def _base_dtype(columns):
+    return np.dtype([('timestamp', '<f8')] + [(col, '<f4') for col in columns])
+
+
+def _aggregate_dtype(columns):
+    fields = [('t_start', '<f8'), ('t_end', '<f8'), ('count', '<i4')]
+    for col in columns:
+        fields += [(f'{col}_min', '<f4'), (f'{col}_max', '<f4'), (f'{col}_mean', '<f4')]
+    return np.dtype(fields)
+
+
+def _first_level(base, columns):
+    """Aggregate raw rows into buckets of two rows"""
+    n = len(base)
+    starts = np.arange(0, n, 2)
+    level = np.empty(len(starts), dtype=_aggregate_dtype(columns))
+    counts = np.diff(np.append(starts, n))
+    level['t_start'] = base['timestamp'][starts]
+    level['t_end'] = base['timestamp'][np.minimum(starts + 1, n - 1)]
+    level['count'] = counts
+    for col in columns:
+        values = base[col].astype(np.float64)
+        level[f'{col}_min'] = np.minimum.reduceat(values, starts)
+        level[f'{col}_max'] = np.maximum.reduceat(values, starts)
+        level[f'{col}_mean'] = np.add.reduceat(values, starts) / counts
+    return level
+
+
+def _next_level(previous, columns):
+    """Merge pairs of buckets of the previous level"""
+    n = len(previous)
+    starts = np.arange(0, n, 2)
+    ends = np.minimum(starts + 1, n - 1)
+    level = np.empty(len(starts), dtype=previous.dtype)
+    counts = np.add.reduceat(previous['count'], starts)
+    level['t_start'] = previous['t_start'][starts]
+    level['t_end'] = previous['t_end'][ends]
+    level['count'] = counts
+    weights = previous['count'].astype(np.float64)
+    for col in columns:
+        level[f'{col}_min'] = np.minimum.reduceat(previous[f'{col}_min'], starts)
+        level[f'{col}_max'] = np.maximum.reduceat(previous[f'{col}_max'], starts)
+        weighted = previous[f'{col}_mean'].astype(np.float64) * weights
+        level[f'{col}_mean'] = np.add.reduceat(weighted, starts) / counts
+    return level
+
+
+def build_pyramid(processed_data, processed_csv_path):
+    """
+    Build and store the pyramid for a processed ride
+
+    Args:
+        processed_data: Telemetry, dict {'timestamp': [...], 'speed': [...], ...} or DataFrame
+        processed_csv_path: path of the processed CSV the pyramid belongs to
+
+    Returns:
+        str: pyramid directory path
+    """
+    if not isinstance(processed_data, Telemetry):
+        if hasattr(processed_data, 'to_numpy'):
+            processed_data = Telemetry.from_frame(processed_data)
+        else:
+            processed_data = Telemetry(processed_data)
+    columns = [col for col in METRIC_COLUMNS if col in processed_data]
+    timestamps = np.asarray(processed_data['timestamp'], dtype=np.float64)
+    order = np.argsort(timestamps, kind='stable')
+
+    base = np.empty(len(timestamps), dtype=_base_dtype(columns))
+    base['timestamp'] = timestamps[order]
+    for col in columns:
+        base[col] = np.nan_to_num(np.asarray(processed_data[col], dtype=np.float64))[order]
+
+    pyramid_dir = get_pyramid_dir(processed_csv_path)
+    os.makedirs(pyramid_dir, exist_ok=True)
+    # Unique per build: concurrent builds of the same pyramid (threads share a pid)
+    version_dir = tempfile.mkdtemp(dir=pyramid_dir, prefix='v')
+    try:
+        processed_data.save(version_dir)
+        levels = [{'level': 0, 'bucket_size': 1, 'rows': int(len(base))}]
+        _save_level(version_dir, 0, base)
+
+        if len(base) > MIN_LEVEL_ROWS:
+            level = _first_level(base, columns)
+            k = 1
+            while True:
+                _save_level(version_dir, k, level)
+                levels.append({'level': k, 'bucket_size': 2 ** k, 'rows': int(len(level))})
+                if len(level) <= MIN_LEVEL_ROWS:
+                    break
+                level = _next_level(level, columns)
+                k += 1
+
+        meta = {
+            'version': PYRAMID_VERSION,
+            'columns': columns,
+            'levels': levels,
+            'min_timestamp': float(base['timestamp'][0]) if len(base) else None,
+            'max_timestamp': float(base['timestamp'][-1]) if len(base) else None
+        }
+        with open(os.path.join(version_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        _publish_version(pyramid_dir, os.path.basename(version_dir))
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    logging.info(f"Built telemetry pyramid with {len(levels)} levels in {version_dir}")
+    return pyramid_dir
+
+
+@contextmanager
+def _pyramid_lock(pyramid_dir):
+    """Serialize pointer updates of one pyramid across threads and processes"""
+    with open(os.path.join(pyramid_dir, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_pointer(pyramid_dir):
+    """{'version': ..., 'previous': ...} of a pyramid, or None before the first build"""
+    try:
+        with open(os.path.join(pyramid_dir, CURRENT_POINTER)) as f:
+            return json.load(f)
+    except (FileNotFoundError, NotADirectoryError, ValueError):
+        return None
+
+
+def _publish_version(pyramid_dir, version):
+    """
+    Make a complete version directory the current pyramid
+
+    The pointer file is replaced atomically, so readers see either the old or
+    the new version. The version replaced by the previous publish is deleted
+    (the one just replaced is kept for readers that already opened it).
+    """
+    with _pyramid_lock(pyramid_dir):
+        pointer = _read_pointer(pyramid_dir)
+        if pointer is None:
+            _remove_legacy_files(pyramid_dir)
+            current, stale = None, None
+        else:
+            current, stale = pointer.get('version'), pointer.get('previous')
+
+        fd, tmp_path = tempfile.mkstemp(dir=pyramid_dir, prefix=f'.{CURRENT_POINTER}.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': version, 'previous': current}, f)
+        os.replace(tmp_path, os.path.join(pyramid_dir, CURRENT_POINTER))
+
+        if stale and stale not in (version, current):
+            shutil.rmtree(os.path.join(pyramid_dir, stale), ignore_errors=True)
+
+
+def _remove_legacy_files(pyramid_dir):
+    """Delete files of pyramids written before version directories existed"""
+    for name in os.listdir(pyramid_dir):
+        path = os.path.join(pyramid_dir, name)
+        if name != LOCK_FILE and os.path.isfile(path):
+            os.remove(path)
+
+
+def link_pyramid(src_csv_path, dst_csv_path):
+    """
+    Publish the current pyramid of one processed CSV as the pyramid of another
+
+    Files are hard links (copies where links are not supported).
+
+    Returns:
+        bool: True if the source had a pyramid
+    """
+    src_dir = _current_version_dir(src_csv_path)
+    if src_dir is None:
+        return False
+    pyramid_dir = get_pyramid_dir(dst_csv_path)
+    os.makedirs(pyramid_dir, exist_ok=True)
+    version_dir = tempfile.mkdtemp(dir=pyramid_dir, prefix='v')
+    try:
+        for name in os.listdir(src_dir):
+            try:
+                os.link(os.path.join(src_dir, name), os.path.join(version_dir, name))
+            except OSError:
+                shutil.copy2(os.path.join(src_dir, name), os.path.join(version_dir, name))
+        _publish_version(pyramid_dir, os.path.basename(version_dir))
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    return True
+
+
+def _current_version_dir(processed_csv_path):
+    """Directory of the current pyramid version, or None if none is published"""
+    pyramid_dir = get_pyramid_dir(processed_csv_path)
+    pointer = _read_pointer(pyramid_dir)
+    if pointer is None:
+        return None
+    return os.path.join(pyramid_dir, pointer['version'])
+
+
+def _read_current(processed_csv_path, read):
+    """
+    read(version_dir, meta) on the current pyramid, or None if there is none
+
+    Retried once if the version is deleted underneath (two rebuilds finished
+    between reading the pointer and opening the files).
+    """
+    for attempt in range(2):
+        version_dir = _current_version_dir(processed_csv_path)
+        if version_dir is None:
+            return None
+        try:
+            with open(os.path.join(version_dir, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('version') != PYRAMID_VERSION:
+                return None
+            return read(version_dir, meta)
+        except FileNotFoundError:
+            if attempt:
+                raise
+
+
+def load_pyramid_meta(processed_csv_path):
+    """Load pyramid metadata, or return None if the pyramid has not been built"""
+    return _read_current(processed_csv_path, lambda version_dir, meta: meta)
+
+
+def load_cached_telemetry(processed_csv_path):
+    """Telemetry of a processed CSV from its columnar cache, or None if not built"""
+    return _read_current(processed_csv_path, lambda version_dir, meta: Telemetry.load(version_dir))
+
+
+def remove_pyramid(processed_csv_path):
+    """Delete the pyramid stored next to a processed CSV file, if any"""
+    pyramid_dir = get_pyramid_dir(processed_csv_path)
+    if os.path.exists(pyramid_dir):
+        shutil.rmtree(pyramid_dir)
+        logging.info(f"Deleted telemetry pyramid: {pyramid_dir}")
+
+
+def _window(starts, ends, start, end):
+    """Index range of buckets overlapping [start, end] (both arrays sorted)"""
+    lo = 0 if start is None else int(np.searchsorted(ends, start, side='left'))
+    hi = len(starts) if end is None else int(np.searchsorted(starts, end, side='right'))
+    return lo, max(lo, hi)
+
+
+def _level_window(version_dir, level, start, end):
+    """Index range of a level's buckets overlapping [start, end]"""
+    if level == 0:
+        timestamps = np.load(_bounds_path(version_dir, 0, 'timestamp'), mmap_mode='r')
+        return _window(timestamps, timestamps, start, end)
+    starts = np.load(_bounds_path(version_dir, level, 't_start'), mmap_mode='r')
+    ends = np.load(_bounds_path(version_dir, level, 't_end'), mmap_mode='r')
+    return _window(starts, ends, start, end)
+
+
+def query_pyramid(processed_csv_path, start=None, end=None, points=2000):
+    """
+    Answer a zoom window from the finest level that still fits in 'points'
+
+    Returns:
+        dict with 'level', 'bucket_size' and 'data'; data holds 'timestamp'
+        and, per metric, the value (level 0) or the bucket mean plus
+        '<metric>_min' / '<metric>_max' columns (aggregated levels).
+        Returns None if the pyramid does not exist.
+    """
+    return _read_current(processed_csv_path,
+                         lambda version_dir, meta: _query_version(version_dir, meta, start, end, points))
+
+
+def _query_version(version_dir, meta, start, end, points):
+    columns = meta['columns']
+
+    # From the coarsest level down: windows only grow on finer levels, so
+    # stop at the first one that no longer fits
+    levels = sorted(meta['levels'], key=lambda info: info['level'], reverse=True)
+    info = levels[0]
+    lo, hi = _level_window(version_dir, info['level'], start, end)
+    for finer in levels[1:]:
+        finer_lo, finer_hi = _level_window(version_dir, finer['level'], start, end)
+        if finer_hi - finer_lo > points:
+            break
+        info, lo, hi = finer, finer_lo, finer_hi
+
+    array = np.load(_level_path(version_dir, info['level']), mmap_mode='r')
+    rows = np.array(array[lo:hi])  # Copies only the requested window
+
+    if info['level'] == 0:
+        data = {'timestamp': rows['timestamp']}
+        for col in columns:
+            data[col] = rows[col]
+    else:
+        data = {'timestamp': (rows['t_start'] + rows['t_end']) / 2}
+        for col in columns:
+            data[col] = rows[f'{col}_mean']
+            data[f'{col}_min'] = rows[f'{col}_min']
+            data[f'{col}_max'] = rows[f'{col}_max']
+
+    return {
+        'level': info['level'],
+        'bucket_size': info['bucket_size'],
+        'min_timestamp': meta['min_timestamp'],
+        'max_timestamp': meta['max_timestamp'],
+        'data': data
+    }
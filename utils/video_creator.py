@@ -3,146 +3,219 @@ import logging
 from extensions import db
 from models import Project
 import subprocess
-import re
-from utils.hardware_detection import is_apple_silicon
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.hardware_detection import get_encoder_config, get_video_container
 
-def create_video(folder_number, fps=29.97, codec='h264', resolution='fullhd', progress_callback=None):
+# Segmented encoding: the timeline is cut into independent segments that are
+# encoded by parallel ffmpeg processes and joined with the concat demuxer.
+SEGMENT_SECONDS = 10
+MIN_SEGMENTED_SECONDS = 60  # Shorter videos are encoded in one piece
+MAX_HARDWARE_SESSIONS = 2  # Consumer GPUs limit concurrent encode sessions
+
+# ffmpeg reports progress as key=value blocks on stdout (-progress pipe:1);
+# only the end of its log on stderr is kept, for error messages
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+STDERR_TAIL_LINES = 50
+
+
+def _frame_size(resolution):
+    if resolution == '4k':
+        return 3840, 2160
+    return 1920, 1080  # fullhd
+
+
+def get_video_path(folder_number, codec='h264'):
+    return f'videos/project_{folder_number}.{get_video_container(codec)}'
+
+
+def _count_frames(frames_dir):
+    return len([f for f in os.listdir(frames_dir) if f.startswith('frame_') and f.endswith('.png')])
+
+
+def _encode_command(frames_dir, output_file, fps, resolution, config, start_frame=0, frame_count=None):
+    """ffmpeg command encoding frames (optionally a range of them) with an encoder config"""
+    width, height = _frame_size(resolution)
+    command = ['ffmpeg', '-y']  # Overwrite output file
+    command.extend(config['input_args'])
+    command.extend(['-r', str(fps)])
+    if start_frame:
+        command.extend(['-start_number', str(start_frame)])
+    command.extend([
+        '-i', f'{frames_dir}/frame_%06d.png',
+        '-c:v', config['encoder']
+    ])
+    if frame_count is not None:
+        command.extend(['-frames:v', str(frame_count)])
+    command.extend(config['output_args'])
+    if '-vf' not in config['output_args']:
+        command.extend(['-s', f'{width}x{height}'])
+    command.append(output_file)
+    return command
+
+
+def _progress_number(value, cast=float):
+    """Number from a progress value such as '12', '31.5' or '1.02x'; None for 'N/A'"""
+    try:
+        return cast(value.strip().rstrip('x'))
+    except ValueError:
+        return None
+
+
+def parse_progress(fields):
+    """
+    Progress of one -progress block (dict of its key=value lines)
+
+    Returns frame, fps, speed (multiple of real time), out_time (seconds of
+    output encoded), rate (encoded frames per second) and done. ffmpeg
+    reports fps=0 for the first seconds of an encode; rate then falls back
+    to speed times the output frame rate.
+    """
+    frame = _progress_number(fields.get('frame', '0'), int) or 0
+    fps = _progress_number(fields.get('fps', '0')) or 0.0
+    speed = _progress_number(fields.get('speed', 'N/A'))
+    # out_time_ms is in microseconds as well; newer ffmpeg adds out_time_us
+    out_time_us = _progress_number(fields.get('out_time_us', fields.get('out_time_ms', 'N/A')), int)
+    out_time = out_time_us / 1_000_000 if out_time_us and out_time_us > 0 else None
+
+    rate = fps or None
+    if rate is None and speed and out_time:
+        rate = speed * frame / out_time
+    return {
+        'frame': frame,
+        'fps': fps,
+        'speed': speed,
+        'out_time': out_time,
+        'rate': rate,
+        'done': fields.get('progress') == 'end'
+    }
+
+
+def read_progress(stream):
+    """Yield parse_progress() of every block ffmpeg writes with -progress"""
+    fields = {}
+    for line in stream:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            continue
+        fields[key] = value
+        if key == 'progress':  # Last line of a block
+            yield parse_progress(fields)
+            fields = {}
+
+
+def _read_tail(stream, tail):
+    for line in stream:
+        tail.append(line)
+
+
+def run_ffmpeg(command, on_progress=None):
+    """
+    Run ffmpeg, passing each parse_progress() report to on_progress
+
+    Raises:
+        Exception: if ffmpeg fails (message contains the end of its output)
+    """
+    command = command[:1] + PROGRESS_ARGS + command[1:]
+    logging.info(f"FFmpeg command: {' '.join(command)}")
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        errors='replace',
+        bufsize=1
+    )
+
+    # stderr is drained in the background so neither pipe can fill up
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    stderr_reader = threading.Thread(target=_read_tail, args=(process.stderr, stderr_tail), daemon=True)
+    stderr_reader.start()
+
+    try:
+        for progress in read_progress(process.stdout):
+            logging.debug(f"FFmpeg progress: {progress}")
+            if on_progress:
+                on_progress(progress)
+    except Exception:
+        # Stop requested (or progress failed): don't leave ffmpeg running
+        process.kill()
+        raise
+    finally:
+        process.wait()
+        stderr_reader.join()
+
+    # Check process return code
+    if process.returncode != 0:
+        error_msg = ''.join(stderr_tail)
+        logging.error(f"FFmpeg error output: {error_msg}")
+        raise Exception(f"FFmpeg encoding failed: {error_msg}")
+
+
+def concat_segments(segment_files, output_file):
+    """Join encoded segments into one video without re-encoding"""
+    list_path = f'{output_file}.segments.txt'
+    with open(list_path, 'w') as f:
+        for segment in segment_files:
+            f.write(f"file '{os.path.abspath(segment)}'\n")
+    command = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy']
+    if output_file.endswith(('.mp4', '.mov')):
+        command.extend(['-movflags', '+faststart'])
+    try:
+        run_ffmpeg(command + [output_file])
+    finally:
+        os.remove(list_path)
+
+
+def get_segment_workers(config, concurrent_jobs=1):
+    """Number of segments to encode in parallel for one job"""
+    cpus = os.cpu_count() or 1
+    workers = max(1, cpus // max(1, concurrent_jobs))
+    if config['hardware']:
+        workers = min(workers, MAX_HARDWARE_SESSIONS)
+    return workers
+
+
+def create_video(folder_number, fps=29.97, codec='h264', resolution='fullhd', progress_callback=None,
+                 concurrent_jobs=1, segmented=None):
+    """
+    Encode frames/project_<folder_number> into videos/project_<folder_number>.<container>
+
+    concurrent_jobs is the number of jobs sharing the CPU; it sets the
+    thread count and preset of software encoders. segmented=None encodes
+    long videos in parallel segments when more than one worker is
+    available; True/False forces the mode.
+    """
     try:
         frames_dir = f'frames/project_{folder_number}'
-        output_file = f'videos/project_{folder_number}.mp4'
+        output_file = get_video_path(folder_number, codec)
 
         # Ensure the videos directory exists
         os.makedirs('videos', exist_ok=True)
 
-        # Map codec names to FFmpeg encoder names
-        codec_map = {
-            'h264': 'libx264',
-            'h265': 'libx265'
-        }
-
-        # Get the correct encoder name
-        encoder = codec_map.get(codec, 'libx264')
-
-        # Set video parameters based on resolution
-        if resolution == '4k':
-            width, height = 3840, 2160
-            bitrate = '20M'  # Higher bitrate for 4K
-        else:  # fullhd
-            width, height = 1920, 1080
-            bitrate = '8M'  # Standard bitrate for 1080p
-
-        logging.info(f"Creating video with fps={fps}, codec={codec}, resolution={resolution}")
-
-        # Build ffmpeg command with hardware acceleration if available
-        command = ['ffmpeg', '-y']  # Overwrite output file
-
-        # Check for Apple Silicon and configure hardware acceleration
-        if is_apple_silicon():
-            logging.info("Using Apple Silicon hardware acceleration (VideoToolbox)")
-            if codec == 'h264':
-                command.extend([
-                    '-hwaccel', 'videotoolbox',
-                    '-hwaccel_output_format', 'videotoolbox_vld'
-                ])
-                encoder = 'h264_videotoolbox'  # Use VideoToolbox hardware encoder
-            elif codec == 'h265':
-                command.extend([
-                    '-hwaccel', 'videotoolbox',
-                    '-hwaccel_output_format', 'videotoolbox_vld'
-                ])
-                encoder = 'hevc_videotoolbox'  # Use VideoToolbox hardware encoder for HEVC
-
-            # Configure hardware encoder settings
-            command.extend([
-                '-r', str(fps),
-                '-i', f'{frames_dir}/frame_%06d.png',
-                '-c:v', encoder,
-                '-allow_sw', '1',  # Allow software fallback if needed
-                '-b:v', bitrate,
-                '-maxrate', bitrate,
-                '-bufsize', bitrate,
-                '-profile:v', 'main',  # Use main profile for better compatibility
-                '-pix_fmt', 'yuv420p',
-                '-s', f'{width}x{height}'
-            ])
-
-            # Add specific settings for HEVC/H265
-            if codec == 'h265':
-                command.extend([
-                    '-tag:v', 'hvc1',  # Use proper HEVC tag for better compatibility
-                    '-alpha_quality', '0',  # Disable alpha channel encoding
-                    '-vtag', 'hvc1'  # Additional tag for HEVC
-                ])
-            else:
-                command.extend([
-                    '-tag:v', 'avc1'  # Use proper H.264 tag
-                ])
-        else:
-            # Software encoding configuration
-            command.extend([
-                '-r', str(fps),
-                '-i', f'{frames_dir}/frame_%06d.png',
-                '-c:v', encoder,
-                '-pix_fmt', 'yuv420p',
-                '-s', f'{width}x{height}'
-            ])
-
-            # Add codec-specific quality settings for software encoding
-            if codec == 'h264':
-                command.extend([
-                    '-preset', 'medium',  # Balance between speed and quality
-                    '-crf', '23'  # Constant Rate Factor (lower = better quality)
-                ])
-            else:  # h265
-                command.extend([
-                    '-preset', 'medium',
-                    '-crf', '28',  # HEVC typically uses higher CRF values
-                    '-tag:v', 'hvc1'  # Use proper HEVC tag
-                ])
-
-        # Add output file
-        command.append(output_file)
-
-        # Log the complete ffmpeg command for debugging
-        logging.info(f"FFmpeg command: {' '.join(command)}")
-
         # Get total frame count for progress calculation
-        frame_files = [f for f in os.listdir(frames_dir) if f.startswith('frame_') and f.endswith('.png')]
-        total_frames = len(frame_files)
-
-        # Run ffmpeg with progress monitoring
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            bufsize=1
-        )
-
-        # Track progress
-        frame_pattern = re.compile(r'frame=\s*(\d+)')
-        current_frame = 0
-        error_output = []
-
-        # Read stderr line by line
-        while True:
-            line = process.stderr.readline()
-            if not line and process.poll() is not None:
-                break
+        total_frames = _count_frames(frames_dir)
+
+        # Pick the best available encoder (hardware if it works) and its settings
+        config = get_encoder_config(codec, resolution, concurrent_jobs)
+        workers = get_segment_workers(config, concurrent_jobs)
+        if segmented is None:
+            segmented = workers > 1 and total_frames >= MIN_SEGMENTED_SECONDS * fps
+        logging.info(f"Creating video with fps={fps}, codec={codec}, resolution={resolution}, "
+                     f"encoder={config['encoder']}, segmented={segmented}")
 
-            error_output.append(line)
-            frame_match = frame_pattern.search(line)
-            if frame_match:
-                current_frame = int(frame_match.group(1))
+        if segmented:
+            create_video_segmented(frames_dir, output_file, fps, codec, resolution, total_frames,
+                                   progress_callback, concurrent_jobs, workers)
+        else:
+            def on_progress(progress):
                 if progress_callback:
-                    progress_callback(current_frame, total_frames, 'video')
-            logging.debug(f"FFmpeg output: {line.strip()}")
+                    progress_callback(progress['frame'], total_frames, 'video', rate=progress['rate'])
 
-        # Check process return code
-        if process.returncode != 0:
-            error_msg = ''.join(error_output)
-            logging.error(f"FFmpeg error output: {error_msg}")
-            raise Exception(f"FFmpeg encoding failed: {error_msg}")
+            run_ffmpeg(_encode_command(frames_dir, output_file, fps, resolution, config), on_progress)
 
         # Ensure 100% progress for video encoding
         if progress_callback:
@@ -151,4 +224,193 @@ def create_video(folder_number, fps=29.97, codec='h264', resolution='fullhd', pr
         return output_file
     except Exception as e:
         logging.error(f"Error creating video: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def create_video_segmented(frames_dir, output_file, fps, codec, resolution, total_frames,
+                           progress_callback=None, concurrent_jobs=1, workers=None):
+    """
+    Encode fixed-length segments in parallel and join them with -c copy
+
+    Every segment is an independent encode starting with a keyframe, so the
+    joined stream has correct timestamps and the full duration.
+    """
+    if workers is None:
+        workers = get_segment_workers(get_encoder_config(codec, resolution, concurrent_jobs), concurrent_jobs)
+    # Share the CPU between the parallel encoders
+    config = get_encoder_config(codec, resolution, concurrent_jobs * workers)
+
+    segment_frames = max(1, int(round(SEGMENT_SECONDS * fps)))
+    segments_dir = f'{output_file}.segments'
+    if os.path.exists(segments_dir):
+        shutil.rmtree(segments_dir)
+    os.makedirs(segments_dir)
+
+    starts = list(range(0, total_frames, segment_frames))
+    extension = os.path.splitext(output_file)[1]
+    segment_files = [os.path.join(segments_dir, f'segment_{i:05d}{extension}') for i in range(len(starts))]
+    encoded = [0] * len(starts)
+    rates = {}  # index -> frames per second of running segment encodes
+    lock = threading.Lock()
+
+    def encode_segment(index):
+        start = starts[index]
+        count = min(segment_frames, total_frames - start)
+
+        def on_progress(progress):
+            with lock:
+                encoded[index] = min(progress['frame'], count)
+                rates[index] = progress['rate'] or 0
+                done = sum(encoded)
+                rate = sum(rates.values())
+            if progress_callback:
+                progress_callback(done, total_frames, 'video', rate=rate or None)
+
+        try:
+            run_ffmpeg(_encode_command(frames_dir, segment_files[index], fps, resolution, config,
+                                       start_frame=start, frame_count=count), on_progress)
+        finally:
+            with lock:
+                rates.pop(index, None)
+
+    try:
+        logging.info(f"Encoding {len(starts)} segments of {segment_frames} frames with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(encode_segment, i) for i in range(len(starts))]
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+        concat_segments(segment_files, output_file)
+    finally:
+        shutil.rmtree(segments_dir, ignore_errors=True)
+
+
+# Pipelined mode: segments are encoded while later frames are still rendering
+PIPELINE_ENCODE_WORKERS = 2
+MAX_PENDING_SEGMENTS = 4  # Rendering waits when this many segments are queued or encoding
+
+
+class PipelinedVideoEncoder:
+    """
+    Encode a project's video segment by segment while frames are rendered
+
+    Call frames_ready() whenever the first 'ready' frames exist (in order),
+    then finish() once rendering is done, or abort() on failure.
+    frames_ready() blocks while MAX_PENDING_SEGMENTS segments are waiting,
+    so rendering cannot run arbitrarily far ahead of encoding.
+    """
+
+    def __init__(self, folder_number, fps=29.97, codec='h264', resolution='fullhd', progress_callback=None,
+                 concurrent_jobs=1):
+        self.frames_dir = f'frames/project_{folder_number}'
+        self.output_file = get_video_path(folder_number, codec)
+        self.fps = fps
+        self.resolution = resolution
+        self.progress_callback = progress_callback
+
+        base_config = get_encoder_config(codec, resolution, concurrent_jobs)
+        self.workers = min(PIPELINE_ENCODE_WORKERS, get_segment_workers(base_config, concurrent_jobs))
+        self.config = get_encoder_config(codec, resolution, concurrent_jobs * self.workers)
+        self.segment_frames = max(1, int(round(SEGMENT_SECONDS * fps)))
+
+        os.makedirs('videos', exist_ok=True)
+        self.segments_dir = f'{self.output_file}.segments'
+        if os.path.exists(self.segments_dir):
+            shutil.rmtree(self.segments_dir)
+        os.makedirs(self.segments_dir)
+
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.futures = []
+        self.segment_files = []
+        self.encoded = []
+        self.rates = {}  # segment index -> frames per second of running encodes
+        self.next_start = 0
+        self.total_frames = None
+        self.lock = threading.Lock()
+        self.aborted = threading.Event()
+        logging.info(f"Pipelined encoding with {self.config['encoder']}, {self.workers} workers, "
+                     f"{self.segment_frames} frames per segment")
+
+    def _report(self):
+        if self.progress_callback and self.total_frames:
+            with self.lock:
+                done = sum(self.encoded)
+                rate = sum(self.rates.values())
+            self.progress_callback(done, self.total_frames, 'video', rate=rate or None)
+
+    def _encode_segment(self, index, start, count):
+        def on_progress(progress):
+            if self.aborted.is_set():
+                raise InterruptedError("Video encoding aborted")
+            with self.lock:
+                self.encoded[index] = min(progress['frame'], count)
+                self.rates[index] = progress['rate'] or 0
+            self._report()
+
+        try:
+            run_ffmpeg(_encode_command(self.frames_dir, self.segment_files[index], self.fps, self.resolution,
+                                       self.config, start_frame=start, frame_count=count), on_progress)
+        finally:
+            with self.lock:
+                self.rates.pop(index, None)
+        with self.lock:
+            self.encoded[index] = count
+
+    def _wait_for_slot(self):
+        """Back-pressure: wait until fewer than MAX_PENDING_SEGMENTS are unfinished"""
+        while True:
+            pending = [future for future in self.futures if not future.done()]
+            for future in self.futures:
+                if future.done():
+                    future.result()  # Raise encoding errors right away
+            if len(pending) < MAX_PENDING_SEGMENTS:
+                return
+            wait(pending, return_when=FIRST_COMPLETED)
+
+    def frames_ready(self, ready, total_frames):
+        """Queue every complete segment within the first 'ready' frames"""
+        self.total_frames = total_frames
+        while self.next_start < total_frames:
+            count = min(self.segment_frames, total_frames - self.next_start)
+            if ready < self.next_start + count:
+                break
+            self._wait_for_slot()
+            index = len(self.segment_files)
+            extension = os.path.splitext(self.output_file)[1]
+            self.segment_files.append(os.path.join(self.segments_dir, f'segment_{index:05d}{extension}'))
+            self.encoded.append(0)
+            self.futures.append(self.executor.submit(self._encode_segment, index, self.next_start, count))
+            self.next_start += count
+
+    def finish(self, total_frames=None):
+        """Encode the remaining frames, join the segments and return the video path"""
+        try:
+            if total_frames is None:
+                total_frames = _count_frames(self.frames_dir)
+            self.frames_ready(total_frames, total_frames)
+            if not self.futures:
+                raise ValueError("No frames to encode")
+            for future in self.futures:
+                future.result()
+            self.executor.shutdown()
+            concat_segments(self.segment_files, self.output_file)
+            if self.progress_callback:
+                self.progress_callback(total_frames, total_frames, 'video')
+            return self.output_file
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            shutil.rmtree(self.segments_dir, ignore_errors=True)
+
+    def abort(self):
+        """Drop queued segments; running ffmpeg processes are killed at their next progress report"""
+        self.aborted.set()
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        shutil.rmtree(self.segments_dir, ignore_errors=True)